@@ -0,0 +1,311 @@
+"""Times data generation and every audit check at several data scales on a throwaway database.
+
+    python benchmarks/end_to_end.py run --tiers 1k,100k --output bench_new.json
+    python benchmarks/end_to_end.py compare bench_old.json bench_new.json --threshold 0.2
+
+`run` creates a fresh database next to BANKING_DB_NAME (same host and
+credentials, the user needs CREATEDB), loads sql/schema.sql, then for each
+tier seeds it with generate_data and times each audit check task on its own.
+The database is dropped afterwards unless --keep-db is given.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+# Số giao dịch mục tiêu cho mỗi tier
+TIERS = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '10m': 10_000_000,
+}
+# Đo trên generator: ~20 giao dịch mỗi khách hàng với cấu hình mặc định (10-25 giao dịch/tài khoản)
+TXN_PER_CUSTOMER = 20
+DEVICES_PER_CUSTOMER = 0.75
+
+AS_OF = '2025-01-01T00:00:00'
+ROW_COUNT_TABLES = ('customers', 'accounts', 'devices', 'transactions', 'authlogs', 'risktags', 'dailylimittrackers')
+
+
+def admin_connection():
+    conn = psycopg2.connect(
+        host=os.getenv("BANKING_DB_HOST", "localhost"),
+        port=os.getenv("BANKING_DB_PORT", "5432"),
+        dbname=os.getenv("BENCH_ADMIN_DB", "postgres"),
+        user=os.getenv("BANKING_DB_USER", "db_user"),
+        password=os.getenv("BANKING_DB_PASSWORD", "db_password"),
+    )
+    conn.autocommit = True
+    return conn
+
+
+def create_database(name):
+    conn = admin_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+            cur.execute(sql.SQL("CREATE DATABASE {} TEMPLATE template0 ENCODING 'UTF8'").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+
+def drop_database(name):
+    conn = admin_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+
+def apply_schema(conn):
+    with open(os.path.join(ROOT, 'sql', 'schema.sql'), encoding='utf-8') as f:
+        schema = f.read()
+    with conn.cursor() as cur:
+        cur.execute(schema)
+    conn.commit()
+
+
+def row_counts(conn):
+    counts = {}
+    with conn.cursor() as cur:
+        for table in ROW_COUNT_TABLES:
+            cur.execute(f"SELECT COUNT(*) FROM {table};")
+            counts[table] = cur.fetchone()[0]
+    return counts
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+
+def run_generation(generate_data, transactions, args):
+    customers = max(1, round(transactions / TXN_PER_CUSTOMER))
+    argv = [
+        '--customers', str(customers),
+        '--devices', str(max(2, round(customers * DEVICES_PER_CUSTOMER))),
+        '--seed', str(args.seed),
+        '--as-of', AS_OF,
+        '--engine', args.engine,
+        '--shards', str(args.shards),
+        '--workers', str(args.workers),
+    ]
+    generate_data.LOAD_STATS.clear()
+    generate_data.PHASE_STATS.clear()
+    started = time.perf_counter()
+    with quiet(args.verbose):
+        ok = generate_data.main(argv)
+    elapsed = time.perf_counter() - started
+    if not ok:
+        raise RuntimeError(f"generate_data failed for {transactions:,} transactions (rerun with --verbose)")
+    return {
+        'customers': customers,
+        'argv': argv,
+        'total_seconds': round(elapsed, 4),
+        'phases': {phase: round(seconds, 4) for phase, seconds in generate_data.PHASE_STATS.items()},
+        'load': {table: dict(values) for table, values in generate_data.LOAD_STATS.items()},
+    }
+
+
+def run_audit(monitoring_audit, repeat):
+    """Runs every check task alone (one worker) `repeat` times and keeps the median per task."""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = monitoring_audit.run_checks_concurrently(monitoring_audit.build_check_tasks(), 1)
+        runs.append((time.perf_counter() - started, results))
+
+    tasks = {}
+    for run_index, (_, results) in enumerate(runs):
+        for result in results:
+            task = tasks.setdefault(result['task'], {'samples': {}, 'rows_scanned': 0, 'checks': {}})
+            # Các check gộp chung một truy vấn có cùng thời gian, chỉ tính một mẫu mỗi lần chạy
+            task['samples'][run_index] = result.get('duration_seconds', 0.0)
+            task['rows_scanned'] = result.get('rows_scanned', 0)
+            task['checks'][result['check_name']] = result['status']
+
+    return {
+        'total_seconds': round(statistics.median(elapsed for elapsed, _ in runs), 4),
+        'repeat': repeat,
+        'tasks': {
+            name: {
+                'seconds': round(statistics.median(task['samples'].values()), 4),
+                'rows_scanned': task['rows_scanned'],
+                'checks': task['checks'],
+            }
+            for name, task in tasks.items()
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    tiers = [tier.strip() for tier in args.tiers.split(',') if tier.strip()]
+    unknown = [tier for tier in tiers if tier not in TIERS]
+    if unknown:
+        raise SystemExit(f"Unknown tier(s) {unknown}; choose from {list(TIERS)}.")
+
+    db_name = args.database or f"banking_bench_{os.getpid()}"
+    create_database(db_name)
+    # Các module đọc cấu hình kết nối khi import, nên phải đặt biến môi trường trước
+    os.environ['BANKING_DB_NAME'] = db_name
+    import generate_data
+    import monitoring_audit
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'params': {'seed': args.seed, 'engine': args.engine, 'shards': args.shards,
+                   'workers': args.workers, 'repeat': args.repeat, 'as_of': AS_OF},
+        'tiers': {},
+    }
+    try:
+        conn = psycopg2.connect(**monitoring_audit.CONN_PARAMS)
+        try:
+            apply_schema(conn)
+            with conn.cursor() as cur:
+                cur.execute("SHOW server_version;")
+                report['postgres'] = cur.fetchone()[0]
+            conn.commit()
+
+            for tier in tiers:
+                transactions = TIERS[tier]
+                print(f"[{tier}] generating ~{transactions:,} transactions...")
+                generation = run_generation(generate_data, transactions, args)
+
+                started = time.perf_counter()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute("VACUUM ANALYZE;")
+                conn.autocommit = False
+                generation['phases']['vacuum_analyze'] = round(time.perf_counter() - started, 4)
+
+                print(f"[{tier}] generated in {generation['total_seconds']:.1f}s; timing checks...")
+                with quiet(args.verbose):
+                    audit = run_audit(monitoring_audit, args.repeat)
+                print(f"[{tier}] audit took {audit['total_seconds']:.2f}s per pass.")
+
+                counts = row_counts(conn)
+                # Không giữ transaction mở: TRUNCATE của tier tiếp theo sẽ bị khoá
+                conn.commit()
+                report['tiers'][tier] = {
+                    'target_transactions': transactions,
+                    'row_counts': counts,
+                    'generate': generation,
+                    'audit': audit,
+                }
+        finally:
+            conn.close()
+    finally:
+        if args.keep_db:
+            print(f"Kept database {db_name}.")
+        else:
+            drop_database(db_name)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+
+def comparable_metrics(tier_result):
+    """Flattens one tier into {metric name: seconds}."""
+    metrics = {'generate.total': tier_result['generate']['total_seconds']}
+    for phase, seconds in tier_result['generate']['phases'].items():
+        metrics[f'generate.{phase}'] = seconds
+    metrics['audit.total'] = tier_result['audit']['total_seconds']
+    for task, values in tier_result['audit']['tasks'].items():
+        metrics[f'audit.{task}'] = values['seconds']
+    return metrics
+
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    regressions = []
+    for tier in baseline['tiers']:
+        if tier not in candidate['tiers']:
+            continue
+        old = comparable_metrics(baseline['tiers'][tier])
+        new = comparable_metrics(candidate['tiers'][tier])
+        print(f"\nTier {tier}: {baseline.get('git_commit')} -> {candidate.get('git_commit')}")
+        print(f"| {'METRIC':<52} | {'BEFORE':>9} | {'AFTER':>9} | {'CHANGE':>8} |")
+        print("-" * 92)
+        for metric in sorted(set(old) & set(new)):
+            before, after = old[metric], new[metric]
+            change = (after - before) / before if before > 0 else 0.0
+            # Bỏ qua dao động nhỏ hơn ngưỡng tuyệt đối để tránh nhiễu ở các check rất nhanh
+            regressed = change > args.threshold and after - before > args.min_seconds
+            flag = " REGRESSION" if regressed else ""
+            print(f"| {metric:<52} | {before:>9.3f} | {after:>9.3f} | {change:>+8.1%} |{flag}")
+            if regressed:
+                regressions.append((tier, metric, before, after, change))
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for tier, metric, before, after, change in regressions:
+            print(f"  [{tier}] {metric}: {before:.3f}s -> {after:.3f}s ({change:+.1%})")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="benchmark generation and audit on a throwaway database")
+    run_parser.add_argument('--tiers', default='1k,100k', help=f"comma separated tiers from {list(TIERS)}")
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--engine', choices=('python', 'numpy'), default='python')
+    run_parser.add_argument('--shards', type=int, default=1)
+    run_parser.add_argument('--workers', type=int, default=1)
+    run_parser.add_argument('--repeat', type=int, default=3, help="audit passes per tier; the median is kept")
+    run_parser.add_argument('--database', default=None, help="name of the throwaway database (default: banking_bench_<pid>)")
+    run_parser.add_argument('--keep-db', action='store_true', help="do not drop the database afterwards")
+    run_parser.add_argument('--verbose', action='store_true', help="show generator and audit output")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser('compare', help="flag metrics that got slower between two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown to flag (default: 0.2)")
+    compare_parser.add_argument('--min-seconds', type=float, default=0.05,
+                                help="ignore slowdowns smaller than this many seconds (default: 0.05)")
+    compare_parser.set_defaults(func=compare)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(args.func(args) or 0)
@@ -0,0 +1,96 @@
+"""Compares rows/s of the Python and NumPy transaction engines without a database.
+
+    python benchmarks/transaction_engines.py --transactions 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import generate_data  # noqa: E402
+from vectorized_transactions import iter_transaction_rows_numpy  # noqa: E402
+
+# Trung bình: 1.5 tài khoản/khách hàng, 17.5 giao dịch/tài khoản với khoảng 10-25
+AVG_TXN_PER_CUSTOMER = 1.5 * 17.5
+
+
+def build_fixture(transactions, seed):
+    rng = random.Random(seed)
+    customers = max(1, int(transactions / AVG_TXN_PER_CUSTOMER))
+    device_ids = list(range(1, max(customers, 2) + 1))
+    customer_accounts_map, limits, devices = {}, {}, {}
+    account_id = 1
+    for customer_id in range(1, customers + 1):
+        accounts = rng.randint(1, 2)
+        customer_accounts_map[customer_id] = list(range(account_id, account_id + accounts))
+        account_id += accounts
+        limits[customer_id] = {'PER_TRANSACTION': rng.choice([100_000_000.0, 500_000_000.0, 1_000_000_000.0])}
+        linked = rng.sample(device_ids, 2)
+        devices[customer_id] = ([linked[0]], linked[1] if rng.random() < 0.2 else None)
+    return customer_accounts_map, limits, devices
+
+
+def summarise(rows):
+    summary = {'rows': 0, 'amount_sum': 0.0, 'status': Counter(), 'category': Counter(),
+               'type': Counter(), 'no_destination': 0}
+    for _, _, destination, _, txn_type, amount, status, category, _ in rows:
+        summary['rows'] += 1
+        summary['amount_sum'] += amount
+        summary['status'][status] += 1
+        summary['category'][category] += 1
+        summary['type'][txn_type] += 1
+        summary['no_destination'] += destination is None
+    return summary
+
+
+def run_engine(name, rows_factory):
+    started = time.perf_counter()
+    summary = summarise(rows_factory())
+    elapsed = time.perf_counter() - started
+    summary['seconds'] = elapsed
+    print(f"{name:<8} {summary['rows']:>10,} rows in {elapsed:7.2f}s -> {summary['rows'] / elapsed:>12,.0f} rows/s")
+    return summary
+
+
+def print_distribution(results):
+    print(f"\n{'METRIC':<24}" + "".join(f"{name:>12}" for name in results))
+    rows = {name: r['rows'] for name, r in results.items()}
+    print(f"{'mean amount (M VND)':<24}" + "".join(f"{r['amount_sum'] / rows[n] / 1e6:>12.2f}" for n, r in results.items()))
+    for key, values in (('status', ['completed', 'pending', 'failed']),
+                        ('category', ['B', 'C', 'D']),
+                        ('type', ['P2P_TRANSFER', 'BILL_PAYMENT'])):
+        for value in values:
+            label = f"{key}={value}"
+            print(f"{label:<24}" + "".join(f"{r[key][value] / rows[n]:>12.2%}" for n, r in results.items()))
+    print(f"{'no destination':<24}" + "".join(f"{r['no_destination'] / rows[n]:>12.2%}" for n, r in results.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    customer_accounts_map, limits, devices = build_fixture(args.transactions, args.seed)
+    generate_data.seed_generators(args.seed)
+    as_of = datetime(2025, 8, 1)
+    generate_data.AS_OF = as_of
+    txn_range, days = generate_data.TXN_PER_ACCOUNT, generate_data.TXN_HISTORY_DAYS
+
+    results = {
+        'python': run_engine('python', lambda: generate_data.iter_transaction_rows(
+            customer_accounts_map, limits, devices.get, 1, txn_range, days)),
+        'numpy': run_engine('numpy', lambda: iter_transaction_rows_numpy(
+            customer_accounts_map, limits, devices.get, 1, txn_range, days, as_of=as_of, seed=args.seed)),
+    }
+    print(f"\nSpeed-up: {results['python']['seconds'] / results['numpy']['seconds']:.1f}x")
+    print_distribution(results)
+
+
+if __name__ == '__main__':
+    main()
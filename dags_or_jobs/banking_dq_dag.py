@@ -1,24 +1,74 @@
 from __future__ import annotations
 import pendulum
+from datetime import timedelta
 from airflow.models.dag import DAG
 from airflow.operators.bash import BashOperator
+from airflow.utils.task_group import TaskGroup
+
+GENERATE = "python -u /opt/airflow/src/generate_data.py --advance-day"
+AUDIT = "python -u /opt/airflow/src/monitoring_audit.py"
+# Các nhóm check độc lập, chạy song song (mỗi nhóm một task, thử lại riêng khi lỗi)
+CHECK_GROUPS = ["null", "unique", "fk", "format", "risk"]
+
+# BashOperator đẩy dòng cuối của stdout vào XCom: plan của phase reference, đường dẫn báo cáo của mỗi nhóm check
+PLAN_XCOM = "'{{ ti.xcom_pull(task_ids=\"generation.reference_data\") }}'"
 
 with DAG(
     dag_id="banking_data_quality_dag",
     schedule="0 0 * * *",  # Chạy vào lúc 00:00 mỗi ngày
     start_date=pendulum.datetime(2023, 1, 1, tz="Asia/Ho_Chi_Minh"),
     catchup=False,
+    default_args={"retries": 2, "retry_delay": timedelta(minutes=2)},
     tags=["banking", "data_quality"],
 ) as dag:
-    
-    generate_data_task = BashOperator(
-        task_id="run_data_generation",
-        bash_command="python -u /opt/airflow/src/generate_data.py",
+
+    ensure_partitions_task = BashOperator(
+        task_id="ensure_partitions",
+        bash_command="python -u /opt/airflow/src/partition_maintenance.py ensure",
+    )
+
+    # Mỗi phase là một transaction riêng; database trống thì phase reference tự sinh dữ liệu đầy đủ
+    with TaskGroup(group_id="generation") as generation_group:
+        reference_data_task = BashOperator(
+            task_id="reference_data",
+            bash_command=f"{GENERATE} --phase reference",
+        )
+        transactions_task = BashOperator(
+            task_id="transactions",
+            bash_command=f"{GENERATE} --phase transactions --plan {PLAN_XCOM}",
+        )
+        derived_tables_task = BashOperator(
+            task_id="derived_tables",
+            bash_command=f"{GENERATE} --phase derived --plan {PLAN_XCOM}",
+        )
+        reference_data_task >> transactions_task >> derived_tables_task
+
+    provision_indexes_task = BashOperator(
+        task_id="provision_check_indexes",
+        bash_command="python -u /opt/airflow/src/check_indexes.py apply",
+    )
+
+    # Bảng trạng thái/cache dùng chung được tạo một lần, tránh các nhóm song song cùng CREATE TABLE
+    prepare_audit_state_task = BashOperator(
+        task_id="prepare_audit_state",
+        bash_command=f"{AUDIT} --prepare-state",
     )
 
-    quality_audit_task = BashOperator(
-        task_id="run_data_quality_checks",
-        bash_command="python -u /opt/airflow/src/monitoring_audit.py",
+    with TaskGroup(group_id="quality_checks") as quality_checks_group:
+        for group in CHECK_GROUPS:
+            BashOperator(
+                task_id=f"{group}_checks",
+                bash_command=f"{AUDIT} --incremental --group {group}",
+            )
+
+    report_paths = " ".join(
+        "'{{ ti.xcom_pull(task_ids=\"quality_checks.%s_checks\") }}'" % group for group in CHECK_GROUPS
+    )
+    merge_report_task = BashOperator(
+        task_id="merge_audit_report",
+        bash_command=f"{AUDIT} --merge-reports {report_paths}",
+        # Vẫn gộp báo cáo của các nhóm đã xong khi có nhóm lỗi
+        trigger_rule="all_done",
     )
 
-    generate_data_task >> quality_audit_task
\ No newline at end of file
+    ensure_partitions_task >> generation_group >> provision_indexes_task >> prepare_audit_state_task >> quality_checks_group >> merge_report_task
@@ -0,0 +1,62 @@
+-- Phát sự kiện cho engine rủi ro theo luồng (src/risk_stream.py) qua LISTEN/NOTIFY.
+-- Không nằm trong schema.sql: mỗi dòng INSERT sẽ phát một NOTIFY, làm chậm việc nạp dữ liệu hàng loạt.
+-- Cài đặt: python src/risk_stream.py install-triggers; gỡ bỏ: python src/risk_stream.py uninstall-triggers
+
+CREATE OR REPLACE FUNCTION notify_risk_event()
+RETURNS TRIGGER AS $$
+DECLARE
+    payload JSON;
+BEGIN
+    -- Thời gian gửi theo múi giờ của phiên, không kèm offset, luôn đủ 6 chữ số micro giây
+    IF TG_ARGV[0] = 'transaction' THEN
+        payload := json_build_object(
+            'type', 'transaction',
+            'transaction_id', NEW.transaction_id,
+            'customer_id', (SELECT customer_id FROM Accounts WHERE account_id = NEW.source_account_id),
+            'device_id', NEW.device_id,
+            'transaction_type', NEW.transaction_type,
+            'amount', NEW.amount,
+            'status', NEW.status,
+            'regulation_category', NEW.regulation_category,
+            'created_at', to_char(NEW.created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+        );
+    ELSIF TG_ARGV[0] = 'auth' THEN
+        payload := json_build_object(
+            'type', 'auth',
+            'transaction_id', NEW.transaction_id,
+            'customer_id', NEW.customer_id,
+            'device_id', NEW.device_id,
+            'auth_method', NEW.auth_method,
+            'result', NEW.result,
+            'created_at', to_char(NEW.created_at, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+        );
+    ELSE
+        payload := json_build_object(
+            'type', 'device_link',
+            'customer_id', NEW.customer_id,
+            'device_id', NEW.device_id,
+            'trust_status', NEW.trust_status
+        );
+    END IF;
+    PERFORM pg_notify('risk_events', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_risk_stream_transactions ON Transactions;
+CREATE TRIGGER trg_risk_stream_transactions
+AFTER INSERT ON Transactions
+FOR EACH ROW
+EXECUTE FUNCTION notify_risk_event('transaction');
+
+DROP TRIGGER IF EXISTS trg_risk_stream_authlogs ON AuthLogs;
+CREATE TRIGGER trg_risk_stream_authlogs
+AFTER INSERT ON AuthLogs
+FOR EACH ROW
+EXECUTE FUNCTION notify_risk_event('auth');
+
+DROP TRIGGER IF EXISTS trg_risk_stream_device_links ON CustomerDeviceLinks;
+CREATE TRIGGER trg_risk_stream_device_links
+AFTER INSERT OR UPDATE OF trust_status ON CustomerDeviceLinks
+FOR EACH ROW
+EXECUTE FUNCTION notify_risk_event('device_link');
@@ -1,3 +1,12 @@
+-- Giờ nghiệp vụ: Asia/Ho_Chi_Minh (risk_rules.BUSINESS_TIMEZONE). Ranh giới phân vùng theo tháng, created_at::date
+-- và EXTRACT(HOUR) đều phụ thuộc session time zone, nên đặt làm mặc định của database và của phiên hiện tại.
+SET timezone TO 'Asia/Ho_Chi_Minh';
+DO $$
+BEGIN
+    EXECUTE format('ALTER DATABASE %I SET timezone TO %L', current_database(), 'Asia/Ho_Chi_Minh');
+END;
+$$;
+
 CREATE TYPE enum_status_customer AS ENUM ('active', 'inactive', 'suspended');
 CREATE TYPE enum_account_type AS ENUM ('payment', 'savings');
 CREATE TYPE enum_status_account AS ENUM ('active', 'inactive', 'closed', 'frozen');
@@ -113,8 +122,12 @@ CREATE TABLE DailyLimitTrackers (
 );
 
 -- Bảng 9: Transactions
+-- Phân vùng theo tháng trên created_at; khóa chính phải chứa cột phân vùng.
+-- ID lấy từ sequence riêng (DEFAULT nextval) thay vì IDENTITY: bulk_loader ghi thẳng vào từng phân vùng,
+-- mà IDENTITY của bảng cha không áp dụng khi INSERT/COPY trực tiếp vào phân vùng.
+CREATE SEQUENCE transactions_transaction_id_seq;
 CREATE TABLE Transactions (
-    transaction_id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    transaction_id BIGINT NOT NULL DEFAULT nextval('transactions_transaction_id_seq'),
     source_account_id BIGINT NOT NULL REFERENCES Accounts(account_id),
     destination_account_id BIGINT REFERENCES Accounts(account_id),
     device_id BIGINT NOT NULL REFERENCES Devices(device_id),
@@ -122,25 +135,33 @@ CREATE TABLE Transactions (
     amount DECIMAL(18, 2) NOT NULL CHECK (amount > 0),
     status enum_transaction_status NOT NULL,
     regulation_category enum_regulation_category,
-    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (transaction_id, created_at)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE transactions_transaction_id_seq OWNED BY Transactions.transaction_id;
 
 -- Bảng 10: AuthLogs
+-- transaction_id không còn là khóa ngoại (Transactions chỉ duy nhất theo (transaction_id, created_at)):
+-- schema không còn chặn log mồ côi, toàn vẹn chỉ được phát hiện sau khi ghi bởi check_fk_authlogs_transaction_id.
+CREATE SEQUENCE authlogs_log_id_seq;
 CREATE TABLE AuthLogs (
-    log_id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    log_id BIGINT NOT NULL DEFAULT nextval('authlogs_log_id_seq'),
     customer_id BIGINT NOT NULL REFERENCES Customers(customer_id),
     device_id BIGINT NOT NULL REFERENCES Devices(device_id),
-    transaction_id BIGINT REFERENCES Transactions(transaction_id),
+    transaction_id BIGINT,
     auth_method enum_auth_method NOT NULL,
     result enum_auth_result NOT NULL,
-    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-);
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (log_id, created_at)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE authlogs_log_id_seq OWNED BY AuthLogs.log_id;
 
 -- Bảng 11: RiskTags
+-- transaction_id không phải khóa ngoại, cùng lý do với AuthLogs (check_fk_risktags_transaction_id).
 CREATE TABLE RiskTags (
     risk_tag_id BIGINT PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
     customer_id BIGINT NOT NULL REFERENCES Customers(customer_id),
-    transaction_id BIGINT REFERENCES Transactions(transaction_id),
+    transaction_id BIGINT,
     tag_type VARCHAR(100) NOT NULL,
     description TEXT,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
@@ -180,3 +201,104 @@ BEFORE INSERT OR UPDATE ON CustomerDeviceLinks
 FOR EACH ROW
 EXECUTE FUNCTION enforce_single_active_session();
 
+-- Tạo các phân vùng theo tháng còn thiếu của Transactions/AuthLogs cho khoảng [from_ts, to_ts]
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, from_ts TIMESTAMPTZ, to_ts TIMESTAMPTZ)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_ts)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_ts LOOP
+        partition_name := format('%s_%s', lower(parent), to_char(month_start, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, lower(parent), month_start, (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_monthly_partitions('transactions', NOW() - INTERVAL '12 months', NOW() + INTERVAL '3 months');
+SELECT create_monthly_partitions('authlogs', NOW() - INTERVAL '12 months', NOW() + INTERVAL '3 months');
+
+-- Tổng chi tiêu theo khách hàng/ngày/nhóm giao dịch (chỉ giao dịch completed).
+-- running_total_amount là Tksth: cộng dồn từ sau giao dịch cuối cùng đã yêu cầu xác thực mạnh (nhóm C/D).
+-- Dùng chung cho DailyLimitTrackers và quy tắc >20M; làm mới bằng REFRESH MATERIALIZED VIEW CONCURRENTLY.
+-- Chi tiêu theo ngày của các giao dịch tạo trong [from_ts, to_ts): dùng cho materialized view bên dưới
+-- và để cập nhật DailyLimitTrackers cho riêng một ngày (generate_data.py --advance-day).
+-- Khoảng nên gồm trọn các ngày, vì Tksth được tính lại từ đầu mỗi ngày.
+CREATE FUNCTION daily_customer_spend_between(from_ts TIMESTAMPTZ, to_ts TIMESTAMPTZ)
+RETURNS TABLE (
+    customer_id BIGINT,
+    spend_date DATE,
+    transaction_type_group transaction_group_enum,
+    transaction_count BIGINT,
+    total_amount NUMERIC,
+    running_total_amount NUMERIC,
+    has_strong_auth BOOLEAN,
+    last_transaction_id BIGINT
+)
+LANGUAGE sql STABLE AS $$
+    WITH strong_auth_txns AS (
+        SELECT DISTINCT transaction_id
+        FROM AuthLogs
+        WHERE result = 'success' AND auth_method IN ('sms_otp', 'soft_otp', 'biometric_faceid')
+          -- Auth log luôn đến sau giao dịch
+          AND created_at >= from_ts
+    ),
+    completed AS (
+        SELECT
+            a.customer_id,
+            t.transaction_id,
+            t.created_at,
+            t.created_at::date AS spend_date,
+            (CASE t.transaction_type
+                WHEN 'P2P_TRANSFER' THEN 'NHOM_I.3'
+                WHEN 'BILL_PAYMENT' THEN 'NHOM_I.2'
+                ELSE 'NHOM_I.1'
+            END)::transaction_group_enum AS transaction_type_group,
+            t.amount,
+            COALESCE(t.regulation_category IN ('C', 'D'), FALSE) AS requires_strong_auth,
+            sat.transaction_id IS NOT NULL AS strong_auth
+        FROM Transactions t
+        JOIN Accounts a ON a.account_id = t.source_account_id
+        LEFT JOIN strong_auth_txns sat ON sat.transaction_id = t.transaction_id
+        WHERE t.status = 'completed' AND t.created_at >= from_ts AND t.created_at < to_ts
+    ),
+    segmented AS (
+        SELECT
+            c.*,
+            SUM(requires_strong_auth::int) OVER (
+                PARTITION BY customer_id, spend_date, transaction_type_group
+                ORDER BY created_at, transaction_id
+            ) AS resets_so_far,
+            SUM(requires_strong_auth::int) OVER (
+                PARTITION BY customer_id, spend_date, transaction_type_group
+            ) AS resets_total
+        FROM completed c
+    )
+    SELECT
+        customer_id,
+        spend_date,
+        transaction_type_group,
+        COUNT(*) AS transaction_count,
+        SUM(amount) AS total_amount,
+        COALESCE(SUM(amount) FILTER (WHERE resets_so_far = resets_total AND NOT requires_strong_auth), 0) AS running_total_amount,
+        bool_or(strong_auth) AS has_strong_auth,
+        MAX(transaction_id) AS last_transaction_id
+    FROM segmented
+    GROUP BY customer_id, spend_date, transaction_type_group;
+$$;
+
+CREATE MATERIALIZED VIEW daily_customer_spend AS
+SELECT * FROM daily_customer_spend_between('-infinity', 'infinity');
+
+-- REFRESH ... CONCURRENTLY cần một unique index
+CREATE UNIQUE INDEX idx_daily_spend_customer_date_group ON daily_customer_spend (customer_id, spend_date, transaction_type_group);
+CREATE INDEX idx_daily_spend_date ON daily_customer_spend (spend_date);
@@ -0,0 +1,289 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Lịch sử các lần audit trong một file SQLite riêng: dashboard chỉ đọc file này, không chạm vào banking_db
+LOG_DIR = os.getenv("AUDIT_LOG_DIR", "/opt/airflow/logs")
+HISTORY_DB = os.getenv("AUDIT_HISTORY_DB", os.path.join(LOG_DIR, "audit_history.sqlite3"))
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    mode TEXT,
+    wall_seconds REAL,
+    total_checks INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_runs_run_date ON audit_runs (run_date);
+
+CREATE TABLE IF NOT EXISTS check_results (
+    run_id TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    run_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    failed_count INTEGER,
+    duration_seconds REAL,
+    rows_scanned INTEGER,
+    PRIMARY KEY (run_id, check_name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_check_results_check_date ON check_results (check_name, run_date);
+
+-- Bảng xu hướng tổng hợp sẵn theo ngày, cập nhật mỗi khi ghi một lần chạy
+CREATE TABLE IF NOT EXISTS daily_run_trend (
+    run_date TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL,
+    checks INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    violations INTEGER NOT NULL,
+    avg_wall_seconds REAL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS daily_check_trend (
+    run_date TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    failed_runs INTEGER NOT NULL,
+    last_status TEXT NOT NULL,
+    violations INTEGER,
+    avg_duration_seconds REAL,
+    max_duration_seconds REAL,
+    PRIMARY KEY (run_date, check_name)
+) WITHOUT ROWID;
+"""
+
+# Số liệu của ngày lấy theo lần chạy cuối cùng trong ngày
+REFRESH_CHECK_TREND_SQL = """
+INSERT INTO daily_check_trend
+SELECT run_date, check_name, runs, failed_runs, status, failed_count, avg_duration, max_duration
+FROM (
+    SELECT c.run_date, c.check_name, c.status, c.failed_count,
+           COUNT(*) OVER w AS runs,
+           SUM(c.status != 'PASS') OVER w AS failed_runs,
+           AVG(c.duration_seconds) OVER w AS avg_duration,
+           MAX(c.duration_seconds) OVER w AS max_duration,
+           ROW_NUMBER() OVER (PARTITION BY c.run_date, c.check_name ORDER BY r.started_at DESC) AS latest
+    FROM check_results c
+    JOIN audit_runs r ON r.run_id = c.run_id
+    WHERE c.run_date IN ({dates})
+    WINDOW w AS (PARTITION BY c.run_date, c.check_name)
+)
+WHERE latest = 1;
+"""
+
+REFRESH_RUN_TREND_SQL = """
+INSERT INTO daily_run_trend
+SELECT t.run_date, r.runs, COUNT(*),
+       SUM(t.last_status = 'PASS'), SUM(t.last_status != 'PASS'), SUM(t.last_status = 'ERROR'),
+       COALESCE(SUM(t.violations), 0), r.avg_wall_seconds
+FROM daily_check_trend t
+JOIN (
+    SELECT run_date, COUNT(*) AS runs, AVG(wall_seconds) AS avg_wall_seconds
+    FROM audit_runs
+    WHERE run_date IN ({dates})
+    GROUP BY run_date
+) r ON r.run_date = t.run_date
+GROUP BY t.run_date;
+"""
+
+
+def connect(path: str = HISTORY_DB) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(HISTORY_SCHEMA)
+    return conn
+
+
+def refresh_trends(conn: sqlite3.Connection, run_dates: List[str]):
+    """Recomputes the trend rows of the given days from the raw per-check rows."""
+    run_dates = sorted(set(run_dates))
+    if not run_dates:
+        return
+    dates = ", ".join("?" * len(run_dates))
+    conn.execute(f"DELETE FROM daily_check_trend WHERE run_date IN ({dates});", run_dates)
+    conn.execute(f"DELETE FROM daily_run_trend WHERE run_date IN ({dates});", run_dates)
+    conn.execute(REFRESH_CHECK_TREND_SQL.format(dates=dates), run_dates)
+    conn.execute(REFRESH_RUN_TREND_SQL.format(dates=dates), run_dates)
+
+
+def _store_run(conn: sqlite3.Connection, run_id: str, started_at: datetime, results: List[Dict[str, Any]],
+               mode: Optional[str], wall_seconds: Optional[float], source: str) -> str:
+    run_date = started_at.date().isoformat()
+    passed = sum(1 for r in results if r.get('status') == 'PASS')
+    # Ghi đè khi nhập lại cùng một lần chạy
+    conn.execute("DELETE FROM check_results WHERE run_id = ?;", (run_id,))
+    conn.execute("INSERT OR REPLACE INTO audit_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);", (
+        run_id, started_at.isoformat(), run_date, mode, wall_seconds,
+        len(results), passed, len(results) - passed, source,
+    ))
+    conn.executemany("INSERT OR REPLACE INTO check_results VALUES (?, ?, ?, ?, ?, ?, ?);", [
+        (run_id, r.get('check_name', 'N/A'), run_date, r.get('status', 'ERROR'),
+         r.get('failed_count', 0 if r.get('status') == 'PASS' else None),
+         r.get('duration_seconds'), r.get('rows_scanned'))
+        for r in results
+    ])
+    return run_date
+
+
+def record_run(results: List[Dict[str, Any]], run_id: str, started_at: datetime, mode: Optional[str] = None,
+               wall_seconds: Optional[float] = None, source: Optional[str] = None, path: str = HISTORY_DB):
+    """Stores one audit run and updates the trend rows of its day, in one transaction."""
+    conn = connect(path)
+    try:
+        with conn:
+            run_date = _store_run(conn, run_id, started_at, results, mode, wall_seconds, source)
+            refresh_trends(conn, [run_date])
+    finally:
+        conn.close()
+
+
+def run_id_from_path(log_path: str) -> str:
+    # audit_log_20250801_105931_123456.txt -> 20250801_105931_123456
+    return os.path.splitext(os.path.basename(log_path))[0].replace("audit_log_", "", 1)
+
+
+def parse_json_report(path: str) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    return {
+        "started_at": datetime.fromisoformat(report['started_at']),
+        "mode": report.get('mode'),
+        "wall_seconds": report.get('wall_seconds'),
+        "results": report.get('checks', []),
+    }
+
+
+LOG_FIELD_RE = re.compile(r"^(Check Name|Status|Violations|Duration|Scanned):\s+(.*)$")
+
+
+def parse_text_log(path: str) -> Dict[str, Any]:
+    """Reads a text audit log, for runs that predate the JSON report."""
+    started_at, results, current = None, [], None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if started_at is None and line.startswith("DATA QUALITY AUDIT LOG - "):
+                started_at = datetime.fromisoformat(line[len("DATA QUALITY AUDIT LOG - "):].strip())
+                continue
+            match = LOG_FIELD_RE.match(line)
+            if not match:
+                continue
+            field, value = match.groups()
+            if field == "Check Name":
+                current = {"check_name": value.strip()}
+                results.append(current)
+            elif current is None:
+                continue
+            elif field == "Status":
+                current['status'] = value.strip()
+            elif field == "Violations":
+                current['failed_count'] = int(value)
+            elif field == "Duration":
+                current['duration_seconds'] = float(value.split("s", 1)[0])
+            elif field == "Scanned":
+                current['rows_scanned'] = int(value.split(" ", 1)[0].replace(",", ""))
+    if started_at is None:
+        raise ValueError(f"{path} is not an audit log")
+    return {"started_at": started_at, "mode": None, "wall_seconds": None, "results": results}
+
+
+def import_logs(paths: List[str], path: str = HISTORY_DB) -> int:
+    """Backfills the history from audit logs; the JSON report wins over the text log of the same run."""
+    by_run = {}
+    for log_path in sorted(paths):
+        run_id = run_id_from_path(log_path)
+        if log_path.endswith(".json") or run_id not in by_run:
+            by_run[run_id] = log_path
+
+    conn = connect(path)
+    imported = 0
+    try:
+        with conn:
+            run_dates = []
+            for run_id, log_path in sorted(by_run.items()):
+                try:
+                    run = parse_json_report(log_path) if log_path.endswith(".json") else parse_text_log(log_path)
+                except (ValueError, KeyError) as e:
+                    print(f"-> Skipped {log_path}: {e}")
+                    continue
+                run_dates.append(_store_run(conn, run_id, run['started_at'], run['results'],
+                                            run['mode'], run['wall_seconds'], os.path.basename(log_path)))
+                imported += 1
+            refresh_trends(conn, run_dates)
+    finally:
+        conn.close()
+    return imported
+
+
+def load_run_trend(conn: sqlite3.Connection, since: str) -> List[tuple]:
+    return conn.execute(
+        "SELECT * FROM daily_run_trend WHERE run_date >= ? ORDER BY run_date;", (since,)
+    ).fetchall()
+
+
+def load_check_trend(conn: sqlite3.Connection, since: str) -> List[tuple]:
+    return conn.execute(
+        "SELECT * FROM daily_check_trend WHERE run_date >= ? ORDER BY run_date, check_name;", (since,)
+    ).fetchall()
+
+
+def load_latest_run(conn: sqlite3.Connection) -> List[tuple]:
+    return conn.execute("""
+        SELECT c.check_name, c.status, c.failed_count, c.duration_seconds
+        FROM check_results c
+        WHERE c.run_id = (SELECT run_id FROM audit_runs ORDER BY started_at DESC LIMIT 1)
+        ORDER BY c.status = 'PASS', c.check_name;
+    """).fetchall()
+
+
+def import_command(args):
+    paths = args.paths or glob.glob(os.path.join(LOG_DIR, "audit_log_*.json")) + glob.glob(os.path.join(LOG_DIR, "audit_log_*.txt"))
+    started = time.perf_counter()
+    imported = import_logs(paths, args.db)
+    print(f"Imported {imported} audit runs into {args.db} in {time.perf_counter() - started:.2f}s.")
+
+
+def rebuild_command(args):
+    conn = connect(args.db)
+    try:
+        with conn:
+            run_dates = [row[0] for row in conn.execute("SELECT DISTINCT run_date FROM audit_runs;")]
+            conn.execute("DELETE FROM daily_check_trend;")
+            conn.execute("DELETE FROM daily_run_trend;")
+            refresh_trends(conn, run_dates)
+        print(f"Rebuilt trend tables for {len(run_dates)} days.")
+    finally:
+        conn.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the audit history store read by the dashboard.")
+    parser.add_argument('--db', default=HISTORY_DB, help="SQLite history file (default: %(default)s)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    import_parser = sub.add_parser('import', help="backfill runs from audit_log_*.json/.txt files")
+    import_parser.add_argument('paths', nargs='*', help=f"log files (default: every audit log in {LOG_DIR})")
+    import_parser.set_defaults(func=import_command)
+    sub.add_parser('rebuild-trends', help="recompute the daily trend tables").set_defaults(func=rebuild_command)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extensions import cursor as _BaseCursor
+
+# Đo lường cho từng check: thời gian, số dòng đã quét và EXPLAIN cho các check chậm
+
+EXPLAINABLE_PREFIXES = ("select", "with")
+
+
+class InstrumentedCursor(_BaseCursor):
+    """Cursor that remembers every statement it runs together with its wall time."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries: List[Dict[str, Any]] = []
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self.queries.append({
+                "sql": self.query.decode() if self.query else str(query),
+                "seconds": round(time.perf_counter() - started, 4),
+            })
+
+
+def table_scan_counters(cur) -> Dict[str, int]:
+    """Rows read so far in the current transaction, per user table (sequential + index fetches)."""
+    cur.execute("""
+        SELECT relname, COALESCE(seq_tup_read, 0) + COALESCE(idx_tup_fetch, 0)
+        FROM pg_stat_xact_user_tables;
+    """)
+    return dict(cur.fetchall())
+
+
+def rows_scanned_since(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    deltas = {table: after[table] - before.get(table, 0) for table in after}
+    return {table: rows for table, rows in sorted(deltas.items()) if rows > 0}
+
+
+def explain_queries(cur, queries: List[Dict[str, Any]]) -> List[str]:
+    """Re-runs the read-only statements under EXPLAIN (ANALYZE, BUFFERS) and returns the plans."""
+    plans = []
+    for query in queries:
+        sql = query["sql"].strip().rstrip(";")
+        if not sql.lower().startswith(EXPLAINABLE_PREFIXES):
+            continue
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")
+        plans.append("\n".join(row[0] for row in cur.fetchall()))
+    return plans
+
+
+def instrument_check(cur, run, explain_threshold: Optional[float] = None):
+    """Runs `run(cur)` on an InstrumentedCursor and returns (results, metrics)."""
+    before = table_scan_counters(cur)
+    cur.queries.clear()
+
+    started = time.perf_counter()
+    results = run(cur)
+    elapsed = time.perf_counter() - started
+
+    queries = list(cur.queries)
+    scanned = rows_scanned_since(before, table_scan_counters(cur))
+    metrics = {
+        "duration_seconds": round(elapsed, 4),
+        "rows_scanned": sum(scanned.values()),
+        "rows_scanned_by_table": scanned,
+        "queries": queries,
+    }
+    if explain_threshold is not None and elapsed >= explain_threshold:
+        metrics["explain"] = explain_queries(cur, queries)
+    return results, metrics
+
+
+def slowest_tasks(results: List[Dict[str, Any]], limit: int = 5) -> List[Dict[str, Any]]:
+    """One entry per task that ran a query (batched checks share one), slowest first.
+
+    Results reused from the cache or guaranteed by a constraint ran nothing and are left out.
+    """
+    tasks = {}
+    for result in results:
+        if result.get('cached') or result.get('constraint_enforced'):
+            continue
+        task = tasks.setdefault(result.get('task', result.get('check_name')), {
+            "task": result.get('task', result.get('check_name')),
+            "checks": 0,
+            "duration_seconds": result.get('duration_seconds', 0.0),
+            "rows_scanned": result.get('rows_scanned', 0),
+            "worker": result.get('worker'),
+            "explained": bool(result.get('explain')),
+        })
+        task["checks"] += 1
+    return sorted(tasks.values(), key=lambda t: t["duration_seconds"], reverse=True)[:limit]
+
+
+def print_slowest_checks(results: List[Dict[str, Any]], limit: int = 5):
+    slowest = slowest_tasks(results, limit)
+    if not slowest:
+        return
+    print("\n" + "SLOWEST CHECKS".center(100))
+    print("-" * 100)
+    print(f"| {'TASK':<42} | {'CHECKS':>6} | {'SECONDS':>8} | {'ROWS SCANNED':>14} | {'WORKER':<14} |")
+    print("-" * 100)
+    for task in slowest:
+        name = task["task"] + (" *" if task["explained"] else "")
+        print(
+            f"| {name:<42} | {task['checks']:>6} | {task['duration_seconds']:>8.3f} "
+            f"| {task['rows_scanned']:>14,} | {str(task['worker']):<14} |"
+        )
+    print("-" * 100)
+    if any(task["explained"] for task in slowest):
+        print("* EXPLAIN (ANALYZE, BUFFERS) output saved in the JSON report.")
+
+
+def write_json_report(results: List[Dict[str, Any]], path: str, run_info: Dict[str, Any]):
+    report = {
+        **run_info,
+        "summary": {
+            "total": len(results),
+            "passed": sum(1 for r in results if r.get('status') == 'PASS'),
+            "failed_or_warning": sum(1 for r in results if r.get('status') != 'PASS'),
+        },
+        "slowest": slowest_tasks(results),
+        "checks": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str, ensure_ascii=False)
+    print(f"JSON audit report saved to: {path}")
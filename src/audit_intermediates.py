@@ -0,0 +1,67 @@
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from data_quality_standards import INTERMEDIATE_RELATIONS, DateWindow
+
+# Quan hệ trung gian của một lần audit: bảng UNLOGGED (không ghi WAL) để mọi connection trong pool
+# đều đọc được, tên gắn với lần chạy, comment lưu PID của backend đã tạo để dọn bảng sót lại
+RELATION_PREFIX = "audit_tmp_"
+
+
+def drop_orphaned_intermediates(cur) -> List[str]:
+    """Drops intermediates left by audits whose connection no longer exists (e.g. a killed run)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        WHERE c.relkind = 'r' AND c.relname LIKE %s
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_stat_activity a
+              WHERE a.pid::text = obj_description(c.oid, 'pg_class')
+          );
+    """, (RELATION_PREFIX + "%",))
+    orphaned = [row[0] for row in cur.fetchall()]
+    for relation in orphaned:
+        cur.execute(f"DROP TABLE IF EXISTS {relation};")
+    return orphaned
+
+
+def build_intermediates(conn, names: List[str], window: DateWindow = None,
+                        run_tag: Optional[str] = None) -> Dict[str, str]:
+    """Materializes the named intermediates in one transaction and returns {name: relation}.
+
+    A failure rolls the whole build back and leaves no tables behind.
+    """
+    run_tag = run_tag or uuid.uuid4().hex[:8]
+    relations = {}
+    try:
+        with conn.cursor() as cur:
+            for relation in drop_orphaned_intermediates(cur):
+                print(f"-> Dropped orphaned intermediate {relation}")
+            cur.execute("SELECT pg_backend_pid();")
+            backend_pid = cur.fetchone()[0]
+            for name in names:
+                spec = INTERMEDIATE_RELATIONS[name]
+                relation = f"{RELATION_PREFIX}{run_tag}_{name}"
+                sql, params = spec['sql'](window)
+                started = time.perf_counter()
+                cur.execute(f"CREATE UNLOGGED TABLE {relation} AS {sql};", params or None)
+                rows = cur.rowcount
+                cur.execute(f"CREATE INDEX ON {relation} {spec['index']};")
+                cur.execute(f"ANALYZE {relation};")
+                cur.execute(f"COMMENT ON TABLE {relation} IS '{backend_pid}';")
+                relations[name] = relation
+                print(f"-> Built intermediate {name}: {rows:,} rows in {time.perf_counter() - started:.2f}s "
+                      f"(used by {', '.join(spec['used_by'])})")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return relations
+
+
+def drop_intermediates(conn, relations: Dict[str, str]):
+    with conn.cursor() as cur:
+        for relation in relations.values():
+            cur.execute(f"DROP TABLE IF EXISTS {relation};")
+    conn.commit()
@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from psycopg2.extras import Json
+
+# Trạng thái của chế độ audit incremental: watermark và tổng đã cộng dồn cho từng check
+STATE_TABLE = "audit_watermarks"
+
+Totals = Dict[str, int]
+# Mốc của các dòng nằm ngoài khoảng ID nhưng vẫn làm đổi kết quả (vd. auth log đến muộn)
+Marks = Dict[str, Any]
+
+
+def ensure_state_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            check_name VARCHAR(150) PRIMARY KEY,
+            source_table VARCHAR(100) NOT NULL,
+            watermark BIGINT NOT NULL,
+            totals JSONB NOT NULL,
+            dependencies JSONB NOT NULL DEFAULT '{{}}',
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+    cur.execute(f"ALTER TABLE {STATE_TABLE} ADD COLUMN IF NOT EXISTS dependencies JSONB NOT NULL DEFAULT '{{}}';")
+
+
+def reset_state(cur):
+    """Forgets every watermark; used whenever the audited tables are rebuilt from scratch."""
+    cur.execute("SELECT to_regclass(%s);", (STATE_TABLE,))
+    if cur.fetchone()[0] is not None:
+        cur.execute(f"TRUNCATE TABLE {STATE_TABLE};")
+
+
+def load_states(cur, check_names: List[str]) -> Dict[str, Tuple[int, Totals, Marks]]:
+    cur.execute(
+        f"SELECT check_name, watermark, totals, dependencies FROM {STATE_TABLE} WHERE check_name = ANY(%s);",
+        (list(check_names),),
+    )
+    return {name: (watermark, totals, marks) for name, watermark, totals, marks in cur.fetchall()}
+
+
+def save_states(cur, source_table: str, watermark: int, totals_by_check: Dict[str, Totals], marks: Marks = None):
+    for check_name, totals in totals_by_check.items():
+        cur.execute(f"""
+            INSERT INTO {STATE_TABLE} (check_name, source_table, watermark, totals, dependencies, updated_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (check_name) DO UPDATE
+            SET source_table = EXCLUDED.source_table,
+                watermark = EXCLUDED.watermark,
+                totals = EXCLUDED.totals,
+                dependencies = EXCLUDED.dependencies,
+                updated_at = EXCLUDED.updated_at;
+        """, (check_name, source_table, watermark, Json(totals), Json(marks or {})))
+
+
+def current_high_water_mark(cur, table: str, id_column: str) -> int:
+    cur.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {table};")
+    return cur.fetchone()[0]
+
+
+def _merge_totals(cached: Totals, delta: Totals) -> Totals:
+    keys = set(cached) | set(delta)
+    return {key: cached.get(key, 0) + delta.get(key, 0) for key in keys}
+
+
+def refresh_totals(cur, table: str, id_column: str, check_names: List[str],
+                   count_range: Callable[[Any, Tuple[int, int]], Dict[str, Totals]],
+                   full_rebuild: bool = False,
+                   count_all: Optional[Callable[[Any], Dict[str, Totals]]] = None,
+                   dependencies: Optional[Callable[[Any, int, Marks], Tuple[Marks, bool]]] = None,
+                   ) -> Tuple[Dict[str, Totals], Tuple[int, int]]:
+    """Brings the cached totals of `check_names` up to the table's current maximum ID.
+
+    `count_range(cur, (low, high))` must return additive per-check deltas for
+    the rows with low < id <= high. The checks of one call share a watermark;
+    if any is missing, out of step or ahead of the table (e.g. after the data
+    was regenerated), everything is recounted from zero, with `count_all(cur)`
+    when given. `dependencies(cur, watermark, marks)` returns the new marks and
+    whether rows outside the ID range changed an already-counted result since
+    `marks` were stored; if so, everything is recounted too. Rows must become
+    visible in ID order, so the audit should not overlap a running load.
+    """
+    high = current_high_water_mark(cur, table, id_column)
+    states = {} if full_rebuild else load_states(cur, check_names)
+    watermarks = {states[name][0] for name in check_names if name in states}
+
+    low, cached, marks = 0, {}, {}
+    if len(states) == len(check_names) and len(watermarks) == 1:
+        watermark = watermarks.pop()
+        if watermark <= high:
+            low = watermark
+            cached = {name: states[name][1] for name in check_names}
+    if dependencies is not None:
+        marks, stale = dependencies(cur, low, states[check_names[0]][2] if low else {})
+        if stale:
+            low, cached = 0, {}
+
+    delta = {}
+    if high > low:
+        delta = count_all(cur) if low == 0 and count_all is not None else count_range(cur, (low, high))
+    totals = {name: _merge_totals(cached.get(name, {}), delta.get(name, {})) for name in check_names}
+    save_states(cur, table, high, totals, marks)
+    return totals, (low, high)
@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import json
+from typing import Any, Dict, List
+
+import psycopg2
+
+from psycopg2.extensions import cursor as _BaseCursor
+
+from audit_instrumentation import EXPLAINABLE_PREFIXES
+from data_quality_standards import CHECK_INDEXES
+from monitoring_audit import CONN_PARAMS, build_check_tasks
+
+# Bảng có ít hơn số dòng này được coi là nhỏ: seq scan trên chúng không đáng lo
+LARGE_TABLE_ROWS = 10000
+
+# Các nhóm check vốn phải đọc toàn bộ bảng (NOT NULL, UNIQUE, FK, định dạng)
+FULL_SCAN_GROUPS = ('null', 'unique', 'fk', 'format')
+
+# Risk check vốn phải đọc mọi giao dịch: mỗi giao dịch cần đối chiếu với liên kết thiết bị của khách hàng.
+# idx_links_unverified_device_customer phục vụ bản incremental (tra theo từng giao dịch trong khoảng mới).
+FULL_SCAN_CHECKS = ('risk_untrusted_device_transactions',)
+
+
+class PlanCaptureCursor(_BaseCursor):
+    """Cursor that EXPLAINs read-only statements instead of running them.
+
+    Each SELECT/WITH records its plan and yields one all-zero row shaped like
+    the query's output, so a check reads "no violations" and issues no
+    follow-up queries. Other statements run normally.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.plans: List[Dict[str, Any]] = []
+        self._row = None
+
+    def execute(self, query, vars=None):
+        sql = self.mogrify(query, vars).decode().strip().rstrip(';')
+        if not sql.lower().startswith(EXPLAINABLE_PREFIXES):
+            self._row = None
+            return super().execute(query, vars)
+        super().execute(f"EXPLAIN (VERBOSE, FORMAT JSON) {sql}")
+        plan = super().fetchone()[0]
+        plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+        self.plans.append(plan)
+        self._row = tuple(0 for _ in plan.get('Output', []))
+
+    def fetchone(self):
+        return self._row if self._row is not None else super().fetchone()
+
+    def fetchall(self):
+        return [self._row] if self._row is not None else super().fetchall()
+
+
+def index_state(cur, name: str):
+    """None if the index does not exist, otherwise whether it is valid."""
+    cur.execute("""
+        SELECT i.indisvalid
+        FROM pg_class c
+        JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s AND c.relkind IN ('i', 'I');
+    """, (name,))
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p');", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def partitions_of(cur, table: str) -> List[str]:
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+        ORDER BY c.relname;
+    """, (table,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def attached_partitions(cur, parent_index: str) -> set:
+    """Partitions whose index is already attached to `parent_index`."""
+    cur.execute("""
+        SELECT t.relname
+        FROM pg_inherits i
+        JOIN pg_class pi ON pi.oid = i.inhparent
+        JOIN pg_index x ON x.indexrelid = i.inhrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        WHERE pi.relname = %s;
+    """, (parent_index,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def partition_index_name(index_name: str, partition: str) -> str:
+    suffix = index_name[len('idx_'):] if index_name.startswith('idx_') else index_name
+    name = f"{partition}_{suffix}"
+    if len(name) <= 63:
+        return name
+    # Tên định danh PostgreSQL tối đa 63 byte
+    return f"{name[:54]}_{hashlib.md5(name.encode()).hexdigest()[:8]}"
+
+
+def _create_index_concurrently(cur, name: str, table: str, definition: str) -> str:
+    state = index_state(cur, name)
+    if state is True:
+        return 'exists'
+    if state is False:
+        print(f"Dropping INVALID index {name}...")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    print(f"Creating index {name} on {table}...")
+    cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition};")
+    return 'rebuilt' if state is False else 'created'
+
+
+def _create_partitioned_index(cur, index: Dict[str, Any]) -> str:
+    """CONCURRENTLY is not supported on a partitioned parent.
+
+    The parent index is created ON ONLY the parent (instant, INVALID until
+    complete); each partition is indexed concurrently and attached. PostgreSQL
+    marks the parent valid once every partition is attached, and partitions
+    created afterwards inherit the index.
+    """
+    name, table = index['name'], index['table']
+    if index_state(cur, name) is True:
+        return 'exists'
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {index['definition']};")
+    attached = attached_partitions(cur, name)
+    for partition in partitions_of(cur, table):
+        if partition in attached:
+            continue
+        child = partition_index_name(name, partition)
+        _create_index_concurrently(cur, child, partition, index['definition'])
+        cur.execute(f"ALTER INDEX {name} ATTACH PARTITION {child};")
+    return 'created' if index_state(cur, name) else 'incomplete'
+
+
+def apply_check_indexes(conn, indexes: List[Dict[str, Any]] = CHECK_INDEXES) -> Dict[str, str]:
+    """Creates every missing index without blocking writers; safe to run repeatedly.
+
+    An interrupted CREATE INDEX CONCURRENTLY leaves an INVALID index behind
+    that IF NOT EXISTS would skip, so those are dropped and rebuilt.
+    """
+    conn.autocommit = True
+    outcome = {}
+    with conn.cursor() as cur:
+        for index in indexes:
+            if is_partitioned(cur, index['table']):
+                outcome[index['name']] = _create_partitioned_index(cur, index)
+            else:
+                outcome[index['name']] = _create_index_concurrently(cur, index['name'], index['table'], index['definition'])
+    return outcome
+
+
+def _seq_scans(plan: Dict[str, Any]) -> List[str]:
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def table_row_estimates(cur):
+    """({relation: estimated rows}, {relation: parent table}); a partition is judged by its own size."""
+    cur.execute("""
+        SELECT c.relname, COALESCE(parent.relname, c.relname), GREATEST(c.reltuples, 0)::bigint
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE c.relkind IN ('r', 'p') AND n.nspname = 'public';
+    """)
+    sizes, logical = {}, {}
+    for relname, table, rows in cur.fetchall():
+        logical[relname] = table
+        sizes[relname] = rows
+    return sizes, logical
+
+
+def explain_checks(conn, large_table_rows: int = LARGE_TABLE_ROWS) -> List[Dict[str, Any]]:
+    """EXPLAINs each registered check's statements without running them and reports their seq scans."""
+    report = []
+    with conn.cursor() as cur:
+        sizes, logical = table_row_estimates(cur)
+    with conn.cursor(cursor_factory=PlanCaptureCursor) as cur:
+        for task in build_check_tasks():
+            cur.plans.clear()
+            task['run'](cur)
+            seq_scans = []
+            for plan in cur.plans:
+                seq_scans.extend(_seq_scans(plan))
+            large = sorted({logical.get(t, t) for t in seq_scans if sizes.get(t, 0) >= large_table_rows})
+            report.append({
+                'task': task['name'],
+                'group': task['group'],
+                'large_seq_scans': large,
+                'expected': task['group'] in FULL_SCAN_GROUPS or task['name'] in FULL_SCAN_CHECKS,
+            })
+    conn.rollback()
+    return report
+
+
+def print_explain_report(report: List[Dict[str, Any]], large_table_rows: int):
+    print(f"\nSequential scans over tables with >= {large_table_rows:,} rows:")
+    print(f"| {'CHECK TASK':<44} | {'RESULT':<18} | {'SEQ SCANNED TABLES':<28} |")
+    print("-" * 100)
+    for entry in report:
+        if not entry['large_seq_scans']:
+            result = 'OK'
+        elif entry['expected']:
+            result = 'full-table check'
+        else:
+            result = 'SEQ SCAN'
+        print(f"| {entry['task']:<44} | {result:<18} | {', '.join(entry['large_seq_scans']):<28} |")
+    print("-" * 100)
+    flagged = [e['task'] for e in report if e['large_seq_scans'] and not e['expected']]
+    if flagged:
+        print(f"{len(flagged)} check(s) still scan large tables sequentially: {', '.join(flagged)}")
+    else:
+        print("No unexpected sequential scans over large tables.")
+    return flagged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Provision the indexes the audit checks rely on, or inspect their plans.")
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('apply', help="create missing check indexes with CREATE INDEX CONCURRENTLY (default)")
+    explain = sub.add_parser('explain', help="EXPLAIN every registered check and report sequential scans")
+    explain.add_argument('--large-table-rows', type=int, default=LARGE_TABLE_ROWS,
+                         help="only report seq scans over tables estimated at least this large")
+    explain.add_argument('--fail-on-seq-scan', action='store_true',
+                         help="exit with status 1 when a check that should use an index scans sequentially")
+    args = parser.parse_args(argv)
+    args.command = args.command or 'apply'
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        if args.command == 'apply':
+            outcome = apply_check_indexes(conn)
+            for name, status in outcome.items():
+                print(f"{name}: {status}")
+            return 0
+        flagged = print_explain_report(explain_checks(conn, args.large_table_rows), args.large_table_rows)
+        return 1 if flagged and args.fail_on_seq_scan else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
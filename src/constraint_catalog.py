@@ -0,0 +1,89 @@
+from typing import Any, Dict, List, Tuple
+
+# Đọc catalog lúc bắt đầu audit: check nào đã được một ràng buộc hợp lệ của schema bảo đảm thì không quét dữ liệu.
+# - NOT NULL: pg_attribute.attnotnull, luôn được kiểm tra khi ghi.
+# - UNIQUE: unique index hợp lệ trên đúng một cột (không partial, không biểu thức) và cột đó NOT NULL,
+#   vì check đếm trùng bằng GROUP BY nên nhiều NULL cũng bị tính là trùng.
+# - FK: FOREIGN KEY một cột đúng cặp cột, đã VALIDATE (không NOT VALID) và không có trigger RI nào bị tắt.
+
+Enforced = Dict[str, Dict[Tuple[str, ...], str]]
+
+_TABLE_OIDS_SQL = "SELECT to_regclass(name) FROM unnest(%s::text[]) AS name"
+
+
+def not_null_columns(cur, tables: List[str]) -> Dict[Tuple[str, str], str]:
+    cur.execute(f"""
+        SELECT c.relname, a.attname
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        WHERE c.oid IN ({_TABLE_OIDS_SQL})
+          AND a.attnum > 0 AND NOT a.attisdropped AND a.attnotnull;
+    """, (list(tables),))
+    return {(table, column): "NOT NULL" for table, column in cur.fetchall()}
+
+
+def unique_columns(cur, tables: List[str]) -> Dict[Tuple[str, str], str]:
+    cur.execute(f"""
+        SELECT c.relname, a.attname,
+               CASE con.contype WHEN 'p' THEN 'PRIMARY KEY ' WHEN 'u' THEN 'UNIQUE constraint ' ELSE 'unique index ' END
+               || COALESCE(con.conname, ic.relname)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indrelid
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        LEFT JOIN pg_constraint con ON con.conindid = i.indexrelid AND con.contype IN ('p', 'u')
+        WHERE c.oid IN ({_TABLE_OIDS_SQL})
+          AND i.indisunique AND i.indisvalid AND i.indnkeyatts = 1
+          AND i.indpred IS NULL AND i.indexprs IS NULL
+          AND a.attnotnull;
+    """, (list(tables),))
+    return {(table, column): constraint for table, column, constraint in cur.fetchall()}
+
+
+def foreign_keys(cur, tables: List[str]) -> Dict[Tuple[str, str, str, str], str]:
+    cur.execute(f"""
+        SELECT c.relname, a.attname, pc.relname, pa.attname, 'FOREIGN KEY ' || con.conname
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_class pc ON pc.oid = con.confrelid
+        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+        JOIN pg_attribute pa ON pa.attrelid = con.confrelid AND pa.attnum = con.confkey[1]
+        WHERE c.oid IN ({_TABLE_OIDS_SQL})
+          AND con.contype = 'f' AND con.convalidated AND con.conparentid = 0
+          AND array_length(con.conkey, 1) = 1
+          -- ALTER TABLE ... DISABLE TRIGGER ALL tắt cả trigger RI: ràng buộc vẫn VALID nhưng không còn được kiểm tra
+          AND NOT EXISTS (
+              SELECT 1
+              FROM pg_trigger tg
+              JOIN pg_constraint cc ON cc.oid = tg.tgconstraint
+              WHERE (cc.oid = con.oid OR cc.conparentid = con.oid) AND tg.tgenabled = 'D'
+          );
+    """, (list(tables),))
+    return {(table, fk_column, parent_table, pk_column): constraint
+            for table, fk_column, parent_table, pk_column, constraint in cur.fetchall()}
+
+
+def enforced_constraints(cur, not_null_checks: Dict[str, List[str]], unique_checks: Dict[str, List[str]],
+                         fk_checks: List[Dict[str, str]]) -> Enforced:
+    """Returns the configured checks guaranteed by a valid constraint, per kind:
+    {"null": {(table, column): constraint}, "unique": {...}, "fk": {(table, fk_column, parent_table, pk_column): constraint}}.
+    """
+    not_null = not_null_columns(cur, list(set(not_null_checks) | set(unique_checks)))
+    unique = unique_columns(cur, list(unique_checks))
+    fks = foreign_keys(cur, list({fk["table"] for fk in fk_checks}))
+    return {
+        "null": {(table, column): not_null[(table, column)]
+                 for table, columns in not_null_checks.items() for column in columns if (table, column) in not_null},
+        "unique": {(table, column): unique[(table, column)]
+                   for table, columns in unique_checks.items() for column in columns if (table, column) in unique},
+        "fk": {key: fks[key] for key in
+               ((fk["table"], fk["fk_column"], fk["parent_table"], fk["pk_column"]) for fk in fk_checks) if key in fks},
+    }
+
+
+def constraint_enforced_result(subject: str, constraint: str) -> Dict[str, Any]:
+    return {
+        "status": "PASS",
+        "message": f"{subject} PASS (constraint-enforced): guaranteed by {constraint}, not scanned.",
+        "constraint_enforced": constraint,
+    }
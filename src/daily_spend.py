@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from psycopg2.extras import Json
+
+import result_cache
+
+# Bảng tổng hợp chi tiêu theo ngày (materialized view trong sql/schema.sql),
+# dùng chung cho DailyLimitTrackers và quy tắc tổng ngày >20M
+DAILY_SPEND_VIEW = "daily_customer_spend"
+# Cùng phép tính với view nhưng chỉ trên giao dịch trong một khoảng thời gian
+DAILY_SPEND_FUNCTION = "daily_customer_spend_between"
+# Các bảng view đọc từ đó; dấu vân tay của chúng (như result_cache) được lưu mỗi lần làm mới
+DAILY_SPEND_SOURCES = ['transactions', 'accounts', 'authlogs']
+REFRESH_STATE_TABLE = "daily_spend_refresh_state"
+
+
+def ensure_refresh_state_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REFRESH_STATE_TABLE} (
+            view_name VARCHAR(100) PRIMARY KEY,
+            source_fingerprint JSONB NOT NULL,
+            refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """)
+
+
+def refresh_daily_spend(cur, concurrently: bool = True):
+    """Recomputes the rollup from Transactions/AuthLogs and records the sources' fingerprint.
+
+    CONCURRENTLY keeps the view readable while it refreshes; a plain refresh
+    is faster when nothing is reading it (e.g. right after a full reload).
+    """
+    # Lấy trước khi làm mới: thay đổi xen giữa chỉ khiến lần sau làm mới thừa một lần
+    fingerprint = result_cache.table_fingerprints(cur, DAILY_SPEND_SOURCES)
+    cur.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{DAILY_SPEND_VIEW};")
+    ensure_refresh_state_table(cur)
+    cur.execute(f"""
+        INSERT INTO {REFRESH_STATE_TABLE} (view_name, source_fingerprint, refreshed_at)
+        VALUES (%s, %s, NOW())
+        ON CONFLICT (view_name) DO UPDATE
+        SET source_fingerprint = EXCLUDED.source_fingerprint,
+            refreshed_at = EXCLUDED.refreshed_at;
+    """, (DAILY_SPEND_VIEW, Json(fingerprint)))
+
+
+def daily_spend_is_stale(cur) -> bool:
+    """True when Transactions, Accounts or AuthLogs changed since the last recorded refresh.
+
+    Compares the pg_stat fingerprints used by the result cache, so late
+    strong-auth logs and status updates below the highest transaction ID are
+    noticed as well as new rows. A view never refreshed through
+    refresh_daily_spend counts as stale.
+    """
+    ensure_refresh_state_table(cur)
+    cur.execute(f"SELECT source_fingerprint FROM {REFRESH_STATE_TABLE} WHERE view_name = %s;", (DAILY_SPEND_VIEW,))
+    row = cur.fetchone()
+    return row is None or row[0] != result_cache.table_fingerprints(cur, DAILY_SPEND_SOURCES)
+
+
+def refresh_daily_spend_if_stale(cur) -> bool:
+    if not daily_spend_is_stale(cur):
+        return False
+    refresh_daily_spend(cur)
+    return True
+
+
+def populate_daily_limit_trackers(cur, window: Optional[Tuple[datetime, datetime]] = None) -> int:
+    """Upserts one DailyLimitTrackers row per rollup row (T = total, Tksth = running total).
+
+    With a `window` of whole days, the rows are computed straight from the
+    transactions of those days instead of the (possibly stale) view.
+    """
+    source, params = (f"{DAILY_SPEND_FUNCTION}(%s, %s)", tuple(window)) if window else (DAILY_SPEND_VIEW, ())
+    cur.execute(f"""
+        INSERT INTO DailyLimitTrackers (customer_id, transaction_type_group, total_daily_amount, running_total_amount, tracking_date)
+        SELECT customer_id, transaction_type_group, total_amount, running_total_amount, spend_date
+        FROM {source}
+        ON CONFLICT (customer_id, transaction_type_group, tracking_date) DO UPDATE
+        SET total_daily_amount = EXCLUDED.total_daily_amount,
+            running_total_amount = EXCLUDED.running_total_amount,
+            last_updated_at = NOW()
+        WHERE (DailyLimitTrackers.total_daily_amount, DailyLimitTrackers.running_total_amount)
+              IS DISTINCT FROM (EXCLUDED.total_daily_amount, EXCLUDED.running_total_amount);
+    """, params or None)
+    return cur.rowcount
+
+
+def daily_spend_summary(cur) -> Dict[str, Any]:
+    cur.execute(f"SELECT COUNT(*), COALESCE(SUM(transaction_count), 0) FROM {DAILY_SPEND_VIEW};")
+    rows, transactions = cur.fetchone()
+    return {"rows": rows, "transactions": transactions}
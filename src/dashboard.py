@@ -0,0 +1,79 @@
+import os
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+import audit_history
+
+# Dashboard xu hướng audit: chỉ đọc các bảng tổng hợp trong file lịch sử SQLite
+# Chạy: streamlit run src/dashboard.py
+CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL", "300"))
+DEFAULT_DAYS = 365
+TOP_FAILING_CHECKS = 10
+
+RUN_TREND_COLUMNS = ['run_date', 'runs', 'checks', 'passed', 'failed', 'errors', 'violations', 'avg_wall_seconds']
+CHECK_TREND_COLUMNS = ['run_date', 'check_name', 'runs', 'failed_runs', 'last_status', 'violations',
+                       'avg_duration_seconds', 'max_duration_seconds']
+LATEST_RUN_COLUMNS = ['check_name', 'status', 'failed_count', 'duration_seconds']
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS)
+def load_history(db_path: str, since: str):
+    conn = audit_history.connect(db_path)
+    try:
+        runs = pd.DataFrame(audit_history.load_run_trend(conn, since), columns=RUN_TREND_COLUMNS)
+        checks = pd.DataFrame(audit_history.load_check_trend(conn, since), columns=CHECK_TREND_COLUMNS)
+        latest = pd.DataFrame(audit_history.load_latest_run(conn), columns=LATEST_RUN_COLUMNS)
+    finally:
+        conn.close()
+    runs['run_date'] = pd.to_datetime(runs['run_date'])
+    checks['run_date'] = pd.to_datetime(checks['run_date'])
+    return runs, checks, latest
+
+
+def main():
+    st.set_page_config(page_title="Banking Data Quality", layout="wide")
+    st.title("Banking Data Quality Audit History")
+
+    days = st.sidebar.slider("Days of history", 7, 730, DEFAULT_DAYS)
+    if st.sidebar.button("Reload now"):
+        load_history.clear()
+
+    started = time.perf_counter()
+    since = (date.today() - timedelta(days=days)).isoformat()
+    runs, checks, latest = load_history(audit_history.HISTORY_DB, since)
+    st.sidebar.caption(f"Loaded in {time.perf_counter() - started:.3f}s (cached for {CACHE_TTL_SECONDS}s)")
+    st.sidebar.caption(f"History: {audit_history.HISTORY_DB}")
+
+    if runs.empty:
+        st.info("No audit runs recorded yet. Run monitoring_audit.py or `python src/audit_history.py import`.")
+        return
+
+    last_day = runs.iloc[-1]
+    col_checks, col_failed, col_violations, col_wall = st.columns(4)
+    col_checks.metric("Checks (last day)", int(last_day['checks']))
+    col_failed.metric("Failed / warning", int(last_day['failed']))
+    col_violations.metric("Violations", f"{int(last_day['violations']):,}")
+    col_wall.metric("Audit wall time", f"{last_day['avg_wall_seconds'] or 0:.1f}s")
+
+    st.subheader("Check status per day")
+    status = runs.melt(id_vars='run_date', value_vars=['passed', 'failed', 'errors'], var_name='status', value_name='count')
+    st.plotly_chart(px.area(status, x='run_date', y='count', color='status'), use_container_width=True)
+
+    failing = checks[checks['last_status'] != 'PASS']
+    top_checks = failing.groupby('check_name')['run_date'].count().nlargest(TOP_FAILING_CHECKS).index.tolist()
+    selected = st.multiselect("Violations per check", sorted(checks['check_name'].unique()), default=top_checks)
+    if selected:
+        chosen = checks[checks['check_name'].isin(selected)]
+        st.plotly_chart(px.line(chosen, x='run_date', y='violations', color='check_name'), use_container_width=True)
+        st.plotly_chart(px.line(chosen, x='run_date', y='avg_duration_seconds', color='check_name',
+                                labels={'avg_duration_seconds': 'seconds'}), use_container_width=True)
+
+    st.subheader("Latest run")
+    st.dataframe(latest, use_container_width=True, hide_index=True)
+
+
+main()
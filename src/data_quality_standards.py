@@ -1,4 +1,6 @@
-from typing import Dict, Any
+import os
+from datetime import date
+from typing import Dict, Any, List, Optional, Tuple
 
 # Data quality checks
 
@@ -30,14 +32,173 @@ FOREIGN_KEY_CHECKS = [
     {'table': 'accounts', 'fk_column': 'customer_id', 'parent_table': 'customers', 'pk_column': 'customer_id'},
     {'table': 'transactions', 'fk_column': 'source_account_id', 'parent_table': 'accounts', 'pk_column': 'account_id'},
     {'table': 'authlogs', 'fk_column': 'customer_id', 'parent_table': 'customers', 'pk_column': 'customer_id'},
+    # Không còn là ràng buộc trong schema vì Transactions được phân vùng
+    {'table': 'authlogs', 'fk_column': 'transaction_id', 'parent_table': 'transactions', 'pk_column': 'transaction_id'},
+    {'table': 'risktags', 'fk_column': 'transaction_id', 'parent_table': 'transactions', 'pk_column': 'transaction_id'},
 ]
 
+# Bảng mà các check (ngoài NULL/UNIQUE/FK) đọc, dùng làm khoá của cache kết quả
+CHECK_SOURCE_TABLES = {
+    'check_document_format': ['customeridentitydocuments'],
+    'risk_high_value_txn_strong_auth': ['transactions', 'authlogs'],
+    'risk_untrusted_device_transactions': ['transactions', 'accounts', 'customerdevicelinks'],
+    # View có thể chưa được làm mới, nên tính cả các bảng nguồn của nó
+    'risk_daily_total_over_20m_auth': ['daily_customer_spend', 'transactions', 'accounts', 'authlogs'],
+}
 
-def check_null_values(cur, table: str, column: str) -> Dict[str, Any]:
-    """Generic function to check for NULL values in a column."""
-    query = f"SELECT COUNT(*) FROM {table} WHERE {column} IS NULL;"
-    cur.execute(query)
-    count = cur.fetchone()[0]
+# Bảng chỉ ghi thêm (append-only): cột ID tăng dần dùng làm watermark cho chế độ incremental
+APPEND_ONLY_TABLES = {
+    'transactions': 'transaction_id',
+    'authlogs': 'log_id',
+    'risktags': 'risk_tag_id',
+}
+
+# Khóa chính của từng bảng, dùng để trích mẫu các bản ghi vi phạm
+PRIMARY_KEYS = {
+    'customers': ['customer_id'],
+    'customeridentitydocuments': ['document_id'],
+    'biometricdata': ['biometric_id'],
+    'accounts': ['account_id'],
+    'devices': ['device_id'],
+    'customerdevicelinks': ['customer_id', 'device_id'],
+    'transactionlimits': ['limit_id'],
+    'dailylimittrackers': ['tracker_id'],
+    'transactions': ['transaction_id'],
+    'authlogs': ['log_id'],
+    'risktags': ['risk_tag_id'],
+}
+
+# Số bản ghi vi phạm tối đa được đọc về cho mỗi check (0 để tắt)
+FAILED_RECORDS_LIMIT = int(os.getenv("AUDIT_FAILED_RECORDS_LIMIT", "10"))
+DUPLICATE_KEYS_SHOWN = 5
+
+STRONG_AUTH_METHODS_SQL = "('sms_otp', 'soft_otp', 'biometric_faceid')"
+
+# Bảng phân vùng theo tháng: lọc theo cửa sổ ngày trên cột này để PostgreSQL bỏ qua các phân vùng khác
+PARTITIONED_TABLES = {
+    'transactions': 'created_at',
+    'authlogs': 'created_at',
+}
+
+IdRange = Optional[Tuple[int, int]]
+# Cửa sổ ngày [start, end) áp dụng cho các bảng phân vùng
+DateWindow = Optional[Tuple[date, date]]
+
+# Index phục vụ các risk check, suy ra từ điều kiện lọc/kết nối của từng check.
+# Được tạo bởi check_indexes.py bằng CREATE INDEX CONCURRENTLY (idempotent).
+CHECK_INDEXES = [
+    {
+        'name': 'idx_authlogs_strong_success_txn',
+        'table': 'authlogs',
+        'definition': f"(transaction_id) WHERE result = 'success' AND auth_method IN {STRONG_AUTH_METHODS_SQL}",
+        'used_by': ['risk_high_value_txn_strong_auth', 'risk_daily_total_over_20m_auth'],
+    },
+    {
+        'name': 'idx_transactions_completed_high_value',
+        'table': 'transactions',
+        'definition': "(transaction_id) WHERE status = 'completed' AND amount > 10000000",
+        'used_by': ['risk_high_value_txn_strong_auth'],
+    },
+    {
+        'name': 'idx_transactions_completed_account_time',
+        'table': 'transactions',
+        'definition': "(source_account_id, created_at) INCLUDE (amount, transaction_id) WHERE status = 'completed'",
+        'used_by': ['risk_daily_total_over_20m_auth'],
+    },
+    {
+        'name': 'idx_links_unverified_device_customer',
+        'table': 'customerdevicelinks',
+        'definition': "(device_id, customer_id) WHERE trust_status = 'unverified'",
+        'used_by': ['risk_untrusted_device_transactions'],
+    },
+]
+
+
+def _strong_auth_txns_sql(window: DateWindow = None) -> Tuple[str, tuple]:
+    # Auth log luôn đến sau giao dịch nên chỉ cần cận dưới của cửa sổ để cắt bớt phân vùng AuthLogs
+    window_sql, params = (" AND created_at >= %s", (window[0],)) if window else ("", ())
+    return f"""
+        SELECT DISTINCT transaction_id
+        FROM AuthLogs
+        WHERE result = 'success' AND auth_method IN {STRONG_AUTH_METHODS_SQL}{window_sql}
+    """, params
+
+def _unverified_device_txns_sql(window: DateWindow = None) -> Tuple[str, tuple]:
+    window_sql, params = _window_filter('transactions', window, alias="t.")
+    # DISTINCT: liên kết (customer_id, device_id) bị trùng không được nhân số giao dịch
+    return f"""
+        SELECT DISTINCT t.transaction_id, t.status, t.device_id, a.customer_id
+        FROM Transactions t
+        JOIN Accounts a ON t.source_account_id = a.account_id
+        JOIN CustomerDeviceLinks cdl ON t.device_id = cdl.device_id AND a.customer_id = cdl.customer_id
+        WHERE cdl.trust_status = 'unverified'{window_sql}
+    """, params
+
+# Quan hệ trung gian dùng chung trong một lần audit: audit_intermediates.py dựng mỗi quan hệ một lần
+# (bảng UNLOGGED) cho các check trong 'used_by' và xoá khi audit kết thúc
+INTERMEDIATE_RELATIONS = {
+    'strong_auth_txns': {
+        'sql': _strong_auth_txns_sql,
+        'index': "(transaction_id)",
+        'used_by': ['risk_high_value_txn_strong_auth'],
+    },
+    'unverified_device_txns': {
+        'sql': _unverified_device_txns_sql,
+        'index': "(transaction_id)",
+        'used_by': ['risk_untrusted_device_transactions'],
+    },
+}
+
+
+def _id_range_filter(id_column: str, id_range: IdRange) -> Tuple[str, tuple]:
+    """SQL fragment restricting `id_column` to the half-open range (low, high]."""
+    if id_range is None:
+        return "", ()
+    return f" AND {id_column} > %s AND {id_column} <= %s", tuple(id_range)
+
+def _window_filter(table: str, window: DateWindow, alias: str = "") -> Tuple[str, tuple]:
+    """SQL fragment limiting a partitioned table to the dates [start, end); empty for other tables."""
+    if window is None or table not in PARTITIONED_TABLES:
+        return "", ()
+    column = f"{alias}{PARTITIONED_TABLES[table]}"
+    return f" AND {column} >= %s AND {column} < %s", tuple(window)
+
+def _primary_key_sql(table: str, alias: str = "") -> str:
+    return ", ".join(f"{alias}{column}" for column in PRIMARY_KEYS[table])
+
+def intermediates_used_by(check_name: str) -> List[str]:
+    return [name for name, spec in INTERMEDIATE_RELATIONS.items() if check_name in spec['used_by']]
+
+def intermediate_source(name: str, relations: Optional[Dict[str, str]], window: DateWindow = None) -> Tuple[str, tuple]:
+    """FROM-clause source of an intermediate: the relation built for this run, or the same query inlined."""
+    if relations and name in relations:
+        return relations[name], ()
+    sql, params = INTERMEDIATE_RELATIONS[name]['sql'](window)
+    return f"({sql})", params
+
+def sample_failed_records(cur, query: str, params: tuple = ()) -> List[Any]:
+    """Up to FAILED_RECORDS_LIMIT rows of `query`, read through a named (server-side) cursor.
+
+    Only the sampled rows ever reach the client, however many violations
+    the query would return, and the cursor lets PostgreSQL pick a fast-start plan.
+    """
+    if FAILED_RECORDS_LIMIT <= 0:
+        return []
+    with cur.connection.cursor(name="failed_records_sample") as sample_cur:
+        sample_cur.itersize = FAILED_RECORDS_LIMIT
+        sample_cur.execute(query, params or None)
+        rows = sample_cur.fetchmany(FAILED_RECORDS_LIMIT)
+    rows = [[value.isoformat() if isinstance(value, date) else value for value in row] for row in rows]
+    return [row[0] if len(row) == 1 else row for row in rows]
+
+def attach_failed_records(result: Dict[str, Any], cur, query: str, params: tuple = ()) -> Dict[str, Any]:
+    """Adds a bounded `failed_records` sample to a result that found violations."""
+    if result.get("failed_count"):
+        result["failed_records"] = sample_failed_records(cur, query, params)
+    return result
+
+
+def null_check_result(table: str, column: str, count: int) -> Dict[str, Any]:
     if count == 0:
         return {"status": "PASS", "message": f"[{table}.{column}] No NULL values found."}
     else:
@@ -47,10 +208,29 @@ def check_null_values(cur, table: str, column: str) -> Dict[str, Any]:
             "failed_count": count
         }
 
-def check_uniqueness(cur, table: str, column: str) -> Dict[str, Any]:
-    query = f"SELECT COUNT(*) FROM (SELECT {column} FROM {table} GROUP BY {column} HAVING COUNT(*) > 1) as duplicates;"
-    cur.execute(query)
-    duplicate_groups = cur.fetchone()[0]
+def count_null_values_batch(cur, table: str, columns: List[str], id_range: IdRange = None,
+                            window: DateWindow = None) -> List[int]:
+    """NULL counts per column from a single scan, optionally limited to an ID range and/or date window."""
+    counters = ", ".join(f"COUNT(*) FILTER (WHERE {column} IS NULL)" for column in columns)
+    range_sql, range_params = _id_range_filter(APPEND_ONLY_TABLES.get(table, ''), id_range)
+    window_sql, window_params = _window_filter(table, window)
+    params = range_params + window_params
+    cur.execute(f"SELECT {counters} FROM {table} WHERE TRUE{range_sql}{window_sql};", params or None)
+    return list(cur.fetchone())
+
+def check_null_values_batch(cur, table: str, columns: List[str], window: DateWindow = None) -> Dict[str, Dict[str, Any]]:
+    """Checks several columns of one table for NULLs in a single scan; returns one result per column."""
+    counts = count_null_values_batch(cur, table, columns, window=window)
+    window_sql, params = _window_filter(table, window)
+    return {
+        column: attach_failed_records(
+            null_check_result(table, column, count), cur,
+            f"SELECT {_primary_key_sql(table)} FROM {table} WHERE {column} IS NULL{window_sql};", params,
+        )
+        for column, count in zip(columns, counts)
+    }
+
+def uniqueness_result(table: str, column: str, duplicate_groups: int) -> Dict[str, Any]:
     if duplicate_groups == 0:
         return {"status": "PASS", "message": f"[{table}.{column}] All values are unique."}
     else:
@@ -60,15 +240,55 @@ def check_uniqueness(cur, table: str, column: str) -> Dict[str, Any]:
             "failed_count": duplicate_groups
         }
 
-def check_foreign_key_integrity(cur, table: str, fk_column: str, parent_table: str, pk_column: str) -> Dict[str, Any]:
-    query = f"""
-        SELECT COUNT(t1.{fk_column})
+def count_duplicate_groups_batch(cur, table: str, columns: List[str]) -> List[int]:
+    """Duplicate-value groups per column from a single scan (one grouping set per column)."""
+    grouped = ", ".join(f"GROUPING({column}) = 0 AS g{i}" for i, column in enumerate(columns))
+    counters = ", ".join(f"COUNT(*) FILTER (WHERE g{i})" for i in range(len(columns)))
+    sets = ", ".join(f"({column})" for column in columns)
+    cur.execute(f"""
+        SELECT {counters}
+        FROM (
+            SELECT {grouped}
+            FROM {table}
+            GROUP BY GROUPING SETS ({sets})
+            HAVING COUNT(*) > 1
+        ) duplicates;
+    """)
+    return list(cur.fetchone())
+
+def check_uniqueness_batch(cur, table: str, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Checks several columns of one table for duplicates in a single scan; returns one result per column."""
+    counts = count_duplicate_groups_batch(cur, table, columns)
+    # Mỗi mẫu: giá trị bị trùng và tối đa DUPLICATE_KEYS_SHOWN khóa chính mang giá trị đó
+    pk = _primary_key_sql(table)
+    return {
+        column: attach_failed_records(uniqueness_result(table, column, count), cur, f"""
+            SELECT {column}, (array_agg({pk} ORDER BY {pk}))[1:{DUPLICATE_KEYS_SHOWN}]
+            FROM {table}
+            GROUP BY {column}
+            HAVING COUNT(*) > 1;
+        """)
+        for column, count in zip(columns, counts)
+    }
+
+def _orphaned_records_sql(table: str, fk_column: str, parent_table: str, pk_column: str,
+                          id_range: IdRange = None, window: DateWindow = None) -> Tuple[str, tuple]:
+    range_sql, range_params = _id_range_filter(f"t1.{APPEND_ONLY_TABLES.get(table, '')}", id_range)
+    window_sql, window_params = _window_filter(table, window, alias="t1.")
+    from_where = f"""
         FROM {table} t1
         LEFT JOIN {parent_table} t2 ON t1.{fk_column} = t2.{pk_column}
-        WHERE t1.{fk_column} IS NOT NULL AND t2.{pk_column} IS NULL;
+        WHERE t1.{fk_column} IS NOT NULL AND t2.{pk_column} IS NULL{range_sql}{window_sql}
     """
-    cur.execute(query)
-    orphaned_count = cur.fetchone()[0]
+    return from_where, range_params + window_params
+
+def count_orphaned_records(cur, table: str, fk_column: str, parent_table: str, pk_column: str,
+                           id_range: IdRange = None, window: DateWindow = None) -> int:
+    from_where, params = _orphaned_records_sql(table, fk_column, parent_table, pk_column, id_range, window)
+    cur.execute(f"SELECT COUNT(t1.{fk_column}) {from_where};", params or None)
+    return cur.fetchone()[0]
+
+def foreign_key_result(table: str, fk_column: str, parent_table: str, pk_column: str, orphaned_count: int) -> Dict[str, Any]:
     if orphaned_count == 0:
         return {"status": "PASS", "message": f"FK Integrity OK: [{table}.{fk_column}] -> [{parent_table}.{pk_column}]."}
     else:
@@ -78,16 +298,21 @@ def check_foreign_key_integrity(cur, table: str, fk_column: str, parent_table: s
             "failed_count": orphaned_count
         }
 
-def check_document_format(cur) -> Dict[str, Any]:
-    query = r"""
-        SELECT COUNT(*)
-        FROM CustomerIdentityDocuments
-        WHERE
-            (document_type = 'CCCD' AND document_number !~ '^\d{12}$') OR
-            (document_type = 'Passport' AND document_number !~ '^[A-Z]\d{7}$');
-    """
-    cur.execute(query)
-    invalid_count = cur.fetchone()[0]
+def check_foreign_key_integrity(cur, table: str, fk_column: str, parent_table: str, pk_column: str,
+                                window: DateWindow = None) -> Dict[str, Any]:
+    orphaned_count = count_orphaned_records(cur, table, fk_column, parent_table, pk_column, window=window)
+    result = foreign_key_result(table, fk_column, parent_table, pk_column, orphaned_count)
+    from_where, params = _orphaned_records_sql(table, fk_column, parent_table, pk_column, window=window)
+    return attach_failed_records(result, cur, f"SELECT {_primary_key_sql(table, 't1.')} {from_where};", params)
+
+INVALID_DOCUMENT_FORMAT_SQL = r"""
+    FROM CustomerIdentityDocuments
+    WHERE
+        (document_type = 'CCCD' AND document_number !~ '^\d{12}$') OR
+        (document_type = 'Passport' AND document_number !~ '^[A-Z]\d{7}$')
+"""
+
+def document_format_result(invalid_count: int) -> Dict[str, Any]:
     if invalid_count == 0:
         return {"status": "PASS", "message": "[CustomerIdentityDocuments] CCCD and Passport formats are valid."}
     else:
@@ -97,29 +322,52 @@ def check_document_format(cur) -> Dict[str, Any]:
             "failed_count": invalid_count
         }
 
+def check_document_format(cur) -> Dict[str, Any]:
+    cur.execute(f"SELECT COUNT(*) {INVALID_DOCUMENT_FORMAT_SQL};")
+    invalid_count = cur.fetchone()[0]
+    return attach_failed_records(document_format_result(invalid_count), cur, f"SELECT document_id {INVALID_DOCUMENT_FORMAT_SQL};")
+
 # Risk-Based Checks
 
-def check_high_value_txn_strong_auth(cur) -> Dict[str, Any]:
-    strong_auth_methods = "('sms_otp', 'soft_otp', 'biometric_faceid')"
-    
-    query = f"""
+def check_high_value_txn_strong_auth(cur, window: DateWindow = None,
+                                     relations: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    txn_window_sql, txn_params = _window_filter('transactions', window)
+    strong_auth_source, auth_params = intermediate_source('strong_auth_txns', relations, window)
+
+    violations = f"""
         WITH high_value_txns AS (
             SELECT transaction_id
             FROM Transactions
-            WHERE amount > 10000000 AND status = 'completed'
-        ),
-        strongly_authed_txns AS (
-            SELECT DISTINCT transaction_id
-            FROM AuthLogs
-            WHERE result = 'success' AND auth_method IN {strong_auth_methods}
+            WHERE amount > 10000000 AND status = 'completed'{txn_window_sql}
         )
-        SELECT COUNT(hvt.transaction_id)
+        SELECT hvt.transaction_id
         FROM high_value_txns hvt
-        LEFT JOIN strongly_authed_txns sa ON hvt.transaction_id = sa.transaction_id
-        WHERE sa.transaction_id IS NULL;
+        LEFT JOIN {strong_auth_source} sa ON hvt.transaction_id = sa.transaction_id
+        WHERE sa.transaction_id IS NULL
     """
-    cur.execute(query)
+    params = txn_params + auth_params
+    cur.execute(f"SELECT COUNT(*) FROM ({violations}) v;", params or None)
     count = cur.fetchone()[0]
+    return attach_failed_records(high_value_txn_strong_auth_result(count), cur, violations, params)
+
+def count_high_value_txn_without_strong_auth(cur, id_range: IdRange = None) -> int:
+    """Completed transactions >10M VND in `id_range` that have no successful strong auth log."""
+    range_sql, params = _id_range_filter("t.transaction_id", id_range)
+    query = f"""
+        SELECT COUNT(*)
+        FROM Transactions t
+        WHERE t.amount > 10000000 AND t.status = 'completed'{range_sql}
+          AND NOT EXISTS (
+              SELECT 1 FROM AuthLogs al
+              WHERE al.transaction_id = t.transaction_id
+                AND al.result = 'success'
+                AND al.auth_method IN {STRONG_AUTH_METHODS_SQL}
+          );
+    """
+    cur.execute(query, params or None)
+    return cur.fetchone()[0]
+
+def high_value_txn_strong_auth_result(count: int) -> Dict[str, Any]:
     if count == 0:
         return {"status": "PASS", "message": "[Risk] High-value transactions (>10M VND) comply with strong auth."}
     else:
@@ -129,23 +377,48 @@ def check_high_value_txn_strong_auth(cur) -> Dict[str, Any]:
             "failed_count": count
         }
 
-def check_untrusted_device_transactions(cur) -> Dict[str, Any]:
-    query = """
-        SELECT t.status
+def _untrusted_device_sql(id_range: IdRange = None, window: DateWindow = None,
+                          relations: Optional[Dict[str, str]] = None) -> Tuple[str, tuple]:
+    if id_range is None:
+        source, params = intermediate_source('unverified_device_txns', relations, window)
+        return f"FROM {source} t", params
+    range_sql, range_params = _id_range_filter("t.transaction_id", id_range)
+    window_sql, window_params = _window_filter('transactions', window, alias="t.")
+    # EXISTS thay cho JOIN: mỗi giao dịch đếm một lần dù liên kết thiết bị bị trùng
+    from_where = f"""
         FROM Transactions t
-        JOIN Accounts a ON t.source_account_id = a.account_id
-        JOIN CustomerDeviceLinks cdl ON t.device_id = cdl.device_id AND a.customer_id = cdl.customer_id
-        WHERE cdl.trust_status = 'unverified';
+        WHERE EXISTS (
+            SELECT 1
+            FROM Accounts a
+            JOIN CustomerDeviceLinks cdl ON cdl.customer_id = a.customer_id
+            WHERE a.account_id = t.source_account_id
+              AND cdl.device_id = t.device_id
+              AND cdl.trust_status = 'unverified'
+        ){range_sql}{window_sql}
     """
-    cur.execute(query)
-    untrusted_transactions = cur.fetchall()
-    
-    total_untrusted_txns = len(untrusted_transactions)
-    
+    return from_where, range_params + window_params
+
+def check_untrusted_device_transactions(cur, window: DateWindow = None,
+                                        relations: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    total_untrusted_txns, successful_count = count_untrusted_device_transactions(cur, window=window, relations=relations)
+    from_where, params = _untrusted_device_sql(window=window, relations=relations)
+    return attach_failed_records(
+        untrusted_device_result(total_untrusted_txns, successful_count), cur,
+        f"SELECT t.transaction_id {from_where};", params,
+    )
+
+def count_untrusted_device_transactions(cur, id_range: IdRange = None, window: DateWindow = None,
+                                        relations: Optional[Dict[str, str]] = None) -> Tuple[int, int]:
+    """(all, completed) transactions made from a device the customer has not verified."""
+    from_where, params = _untrusted_device_sql(id_range, window, relations)
+    cur.execute(f"SELECT COUNT(*), COUNT(*) FILTER (WHERE t.status = 'completed') {from_where};", params or None)
+    total, successful = cur.fetchone()
+    return total, successful
+
+def untrusted_device_result(total_untrusted_txns: int, successful_count: int) -> Dict[str, Any]:
     if total_untrusted_txns == 0:
         return {"status": "PASS", "message": "[Risk] No transactions found from unverified devices."}
     else:
-        successful_count = sum(1 for txn in untrusted_transactions if txn[0] == 'completed')
         return {
             "status": "WARNING",
             "message": f"[Risk] Found {total_untrusted_txns} txns from unverified devices ({successful_count} successful).",
@@ -153,38 +426,100 @@ def check_untrusted_device_transactions(cur) -> Dict[str, Any]:
             "details": {"successful_from_untrusted": successful_count}
         }
 
-def check_daily_total_over_20m_auth(cur) -> Dict[str, Any]:
-    strong_auth_methods = "('sms_otp', 'soft_otp', 'biometric_faceid')"
+def _daily_total_over_20m_sql(window: DateWindow = None, live: bool = False) -> Tuple[str, tuple]:
+    """Violating customer-days from the rollup, or with `live` straight from the function the rollup is defined by."""
+    window_sql, params = (" AND spend_date >= %s AND spend_date < %s", tuple(window)) if window else ("", ())
+    source = "daily_customer_spend_between('-infinity', 'infinity')" if live else "daily_customer_spend"
+    return f"""
+        SELECT customer_id, spend_date
+        FROM {source}
+        WHERE TRUE{window_sql}
+        GROUP BY customer_id, spend_date
+        HAVING SUM(total_amount) > 20000000 AND NOT bool_or(has_strong_auth)
+    """, params
+
+def count_daily_total_over_20m(cur, window: DateWindow = None, live: bool = False) -> int:
+    violations, params = _daily_total_over_20m_sql(window, live)
+    cur.execute(f"SELECT COUNT(*) FROM ({violations}) v;", params or None)
+    return cur.fetchone()[0]
+
+def check_daily_total_over_20m_auth(cur, window: DateWindow = None) -> Dict[str, Any]:
+    """Reads the daily_customer_spend rollup instead of re-aggregating Transactions."""
+    count = count_daily_total_over_20m(cur, window)
+    violations, params = _daily_total_over_20m_sql(window)
+    return attach_failed_records(daily_total_over_20m_result(count), cur, violations, params)
 
+def count_daily_total_over_20m_delta(cur, id_range: Tuple[int, int]) -> int:
+    """Change in >20M customer/day violations caused by the transactions in `id_range`.
+
+    Only the customer-days touched by those transactions are re-evaluated,
+    once with every transaction up to the range's upper bound and once with
+    the transactions already covered by its lower bound.
+    """
+    low, high = id_range
     query = f"""
-        WITH daily_totals AS (
-            SELECT
-                a.customer_id,
-                t.created_at::date as transaction_date
+        WITH affected_days AS (
+            SELECT DISTINCT a.customer_id, t.created_at::date AS transaction_date
             FROM Transactions t
             JOIN Accounts a ON t.source_account_id = a.account_id
-            WHERE t.status = 'completed'
-            GROUP BY 1, 2
-            HAVING SUM(t.amount) > 20000000
+            WHERE t.transaction_id > %(low)s AND t.transaction_id <= %(high)s
         ),
-        daily_strong_auths AS (
-            SELECT DISTINCT
-                a.customer_id,
-                t.created_at::date as transaction_date
-            FROM Transactions t
-            JOIN Accounts a ON t.source_account_id = a.account_id
-            JOIN AuthLogs al ON t.transaction_id = al.transaction_id
-            WHERE t.status = 'completed'
-              AND al.result = 'success'
-              AND al.auth_method IN {strong_auth_methods}
+        day_txns AS (
+            SELECT ad.customer_id, ad.transaction_date, t.transaction_id, t.amount
+            FROM affected_days ad
+            JOIN Accounts a ON a.customer_id = ad.customer_id
+            JOIN Transactions t ON t.source_account_id = a.account_id
+                               AND t.created_at::date = ad.transaction_date
+            WHERE t.status = 'completed' AND t.transaction_id <= %(high)s
+        ),
+        strong_txns AS (
+            SELECT DISTINCT al.transaction_id
+            FROM AuthLogs al
+            JOIN day_txns dt ON dt.transaction_id = al.transaction_id
+            WHERE al.result = 'success' AND al.auth_method IN {STRONG_AUTH_METHODS_SQL}
+        ),
+        per_day AS (
+            SELECT
+                dt.customer_id,
+                dt.transaction_date,
+                SUM(dt.amount) AS total_now,
+                SUM(dt.amount) FILTER (WHERE dt.transaction_id <= %(low)s) AS total_before,
+                bool_or(st.transaction_id IS NOT NULL) AS strong_now,
+                bool_or(st.transaction_id IS NOT NULL AND dt.transaction_id <= %(low)s) AS strong_before
+            FROM day_txns dt
+            LEFT JOIN strong_txns st ON st.transaction_id = dt.transaction_id
+            GROUP BY 1, 2
         )
-        SELECT COUNT(dt.customer_id)
-        FROM daily_totals dt
-        LEFT JOIN daily_strong_auths dsa ON dt.customer_id = dsa.customer_id AND dt.transaction_date = dsa.transaction_date
-        WHERE dsa.customer_id IS NULL;
+        SELECT
+            COUNT(*) FILTER (WHERE total_now > 20000000 AND NOT strong_now)
+          - COUNT(*) FILTER (WHERE total_before > 20000000 AND NOT strong_before)
+        FROM per_day;
     """
-    cur.execute(query)
-    count = cur.fetchone()[0]
+    cur.execute(query, {"low": low, "high": high})
+    return cur.fetchone()[0]
+
+def auth_logs_after(cur, log_id: int, transaction_id: int) -> Tuple[int, bool]:
+    """(highest auth log ID, whether a log above `log_id` points at a transaction at or below `transaction_id`)."""
+    cur.execute("SELECT COALESCE(MAX(log_id), 0) FROM AuthLogs;")
+    latest = cur.fetchone()[0]
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM AuthLogs
+            WHERE log_id > %s AND log_id <= %s AND transaction_id <= %s
+        );
+    """, (log_id, latest, transaction_id))
+    return latest, cur.fetchone()[0]
+
+def unverified_links_digest(cur, max_device_id: int) -> str:
+    """Digest of the unverified (customer, device) links on devices up to `max_device_id`."""
+    cur.execute("""
+        SELECT COALESCE(md5(string_agg(customer_id || ':' || device_id, ',' ORDER BY customer_id, device_id)), '')
+        FROM CustomerDeviceLinks
+        WHERE trust_status = 'unverified' AND device_id <= %s;
+    """, (max_device_id,))
+    return cur.fetchone()[0]
+
+def daily_total_over_20m_result(count: int) -> Dict[str, Any]:
     if count == 0:
         return {"status": "PASS", "message": "[Risk] Daily totals >20M VND comply with strong auth."}
     else:
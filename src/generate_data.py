@@ -1,25 +1,91 @@
 import psycopg2
 from faker import Faker
+import argparse
+import multiprocessing
 import random
-from datetime import datetime, timedelta
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime, time as day_time, timedelta
 import hashlib
+import json
 import uuid
 import os
 
+from audit_state import reset_state
+from daily_spend import daily_spend_summary, populate_daily_limit_trackers, refresh_daily_spend
+from bulk_loader import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_LOAD_MODE,
+    LOAD_MODES,
+    LOAD_STATS,
+    format_rate,
+    iter_chunks,
+    load_chunk,
+    load_rows,
+    print_load_stats,
+    reserve_id_block,
+)
+import value_pools
+from value_pools import account_number_for, document_number_for, email_for, phone_number_for
+from risk_rules import (
+    BUSINESS_TIMEZONE,
+    BUSINESS_TZINFO,
+    auth_log_rows,
+    failed_auth_risk_tags,
+    transaction_risk_tags,
+)
+
 CONN_PARAMS = {
     "host": os.getenv("BANKING_DB_HOST", "localhost"),
     "port": os.getenv("BANKING_DB_PORT", "5432"),
     "dbname": os.getenv("BANKING_DB_NAME", "banking_db"),
     "user": os.getenv("BANKING_DB_USER", "db_user"),
-    "password": os.getenv("BANKING_DB_PASSWORD", "db_password")
+    "password": os.getenv("BANKING_DB_PASSWORD", "db_password"),
+    "options": f"-c timezone={BUSINESS_TIMEZONE}",
 }
 
 NUM_CUSTOMERS = 200
 NUM_DEVICES = 150
+TXN_PER_ACCOUNT = (10, 25)
+TXN_HISTORY_DAYS = 30
+
+# Chế độ --advance-day: chỉ sinh thêm một ngày trên dữ liệu sẵn có
+ADVANCE_NEW_CUSTOMERS = 20
+ADVANCE_NEW_DEVICES = 10
+ADVANCE_ACTIVE_CUSTOMERS = 60
+ADVANCE_TXN_PER_ACCOUNT = (1, 3)
+# Tỷ lệ khách hàng cũ đăng nhập thêm từ một thiết bị mới trong ngày
+ADVANCE_NEW_DEVICE_SHARE = 0.05
+# Số thiết bị có sẵn được lấy mẫu để khách hàng mới liên kết
+ADVANCE_EXISTING_DEVICE_SAMPLE = 1000
+
+FULL_DEFAULTS = {'customers': NUM_CUSTOMERS, 'devices': NUM_DEVICES, 'txn_per_account': TXN_PER_ACCOUNT}
+ADVANCE_DEFAULTS = {'customers': ADVANCE_NEW_CUSTOMERS, 'devices': ADVANCE_NEW_DEVICES, 'txn_per_account': ADVANCE_TXN_PER_ACCOUNT}
+
+TRANSACTION_COLUMNS = ['transaction_id', 'source_account_id', 'destination_account_id', 'device_id', 'transaction_type', 'amount', 'status', 'regulation_category', 'created_at']
+AUTH_LOG_COLUMNS = ['customer_id', 'device_id', 'transaction_id', 'auth_method', 'result', 'created_at']
+RISK_TAG_COLUMNS = ['customer_id', 'transaction_id', 'tag_type', 'description']
+# Bảng phân vùng theo tháng: ghi thẳng vào phân vùng của từng dòng theo cột thời gian
+PARTITIONED_TABLES = {'Transactions': 'created_at', 'AuthLogs': 'created_at'}
+
+ENGINE_PYTHON = 'python'
+ENGINE_NUMPY = 'numpy'
+ENGINES = (ENGINE_PYTHON, ENGINE_NUMPY)
+
+# Giới hạn trên số tài khoản mỗi khách hàng, dùng để cấp khối ID cho từng shard
+MAX_ACCOUNTS_PER_CUSTOMER = 2
+
+LOAD_MODE = DEFAULT_LOAD_MODE
+CHUNK_SIZE = DEFAULT_CHUNK_SIZE
+AS_OF = datetime.now(BUSINESS_TZINFO).replace(tzinfo=None)
 
 fake = Faker('vi_VN')
 
-used_account_numbers = set()
+# Thời gian theo từng pha sinh dữ liệu: {phase: seconds}
+PHASE_STATS = {}
 
 def get_db_connection():
     return psycopg2.connect(**CONN_PARAMS)
@@ -34,47 +100,67 @@ def clear_all_tables(conn):
                 BiometricData, CustomerIdentityDocuments, Customers
             RESTART IDENTITY CASCADE;
         """)
+        reset_state(cur)
         print("All tables cleared successfully.")
 
-def generate_customers(cur, count):
+@contextmanager
+def timed_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_STATS[name] = PHASE_STATS.get(name, 0.0) + time.perf_counter() - started
+
+def ensure_partitions(cur, start, end):
+    """Creates the monthly partitions of every partitioned table covering [start, end]."""
+    for table in PARTITIONED_TABLES:
+        cur.execute("SELECT create_monthly_partitions(%s, %s, %s);", (table.lower(), start, end))
+        created = cur.fetchone()[0]
+        if created:
+            print(f"-> Created {created} monthly partitions for {table}.")
+
+def derive_shard_seed(seed, shard_index):
+    digest = hashlib.sha256(f"{seed}:{shard_index}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def seed_generators(seed):
+    random.seed(seed)
+    fake.seed_instance(seed)
+
+# Các giá trị UNIQUE được suy ra từ ID (value_pools.py) nên không trùng giữa các shard
+def iter_customer_rows(first_id, count):
+    end_id = first_id + count
+    # Lấy mẫu tên, địa chỉ, ngày sinh... theo từng lô thay vì gọi Faker cho mỗi dòng
+    for block_start in range(first_id, end_id, CHUNK_SIZE):
+        block_ids = range(block_start, min(block_start + CHUNK_SIZE, end_id))
+        size = len(block_ids)
+        names = value_pools.sample_names(size)
+        addresses = value_pools.sample_addresses(size)
+        birth_dates = value_pools.sample_birth_dates(AS_OF.date(), size)
+        genders = random.choices(['male', 'female', 'other'], k=size)
+        statuses = random.choices(['active', 'inactive', 'suspended'], weights=[0.90, 0.08, 0.02], k=size)
+
+        for i, customer_id in enumerate(block_ids):
+            pin = str(random.randint(100000, 999999))
+            yield (
+                customer_id, names[i], birth_dates[i], genders[i],
+                addresses[i], phone_number_for(customer_id),
+                email_for(customer_id), statuses[i],
+                value_pools.secret_hash(),
+                hashlib.sha256(pin.encode()).hexdigest(),
+            )
+
+def generate_customers(cur, first_id, count):
     print(f"Generating {count} customers...")
-    customers_data = []
-    for _ in range(count):
-        full_name = fake.name()
-        for prefix in ['Anh ', 'Chị ', 'Cô ', 'Bác ', 'Ông ', 'Bà ']:
-            if full_name.startswith(prefix):
-                full_name = full_name[len(prefix):]
-        full_name = full_name.strip()
-
-        dob = fake.date_of_birth(minimum_age=18, maximum_age=70)
-        password = fake.password(length=12)
-        pin = str(random.randint(100000, 999999))
-        
-        status = random.choices(['active', 'inactive', 'suspended'], weights=[0.90, 0.08, 0.02])[0]
-        
-        customers_data.append((
-            full_name, dob, random.choice(['male', 'female', 'other']),
-            fake.address(), f"+84{fake.unique.phone_number()[1:]}",
-            fake.unique.email(), status,
-            hashlib.sha256(password.encode()).hexdigest(),
-            hashlib.sha256(pin.encode()).hexdigest(),
-        ))
-    
-    insert_query = """
-        INSERT INTO Customers (full_name, date_of_birth, gender, address, phone_number, email, status, password_hash, pin_hash)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, customers_data)
-    
-    cur.execute("SELECT customer_id, status, address FROM Customers;")
-    customers_info = cur.fetchall()
+    columns = ['customer_id', 'full_name', 'date_of_birth', 'gender', 'address', 'phone_number', 'email', 'status', 'password_hash', 'pin_hash']
+    customers_info = []
+    for chunk in iter_chunks(iter_customer_rows(first_id, count), CHUNK_SIZE):
+        load_chunk(cur, 'Customers', columns, chunk, mode=LOAD_MODE)
+        customers_info.extend((row[0], row[7], row[4]) for row in chunk)
     print(f"-> Generated {len(customers_info)} customers.")
     return customers_info
 
-def generate_devices(cur, count):
-    print(f"Generating {count} devices...")
-    devices_data = []
-    
+def iter_device_rows(count):
     device_name_map = {
         ('mobile', 'iOS'): ["iPhone 15 Pro Max", "iPhone 14", "iPhone 13 Pro"],
         ('mobile', 'Android'): ["Samsung Galaxy S24 Ultra", "Oppo Reno11", "Xiaomi 14"],
@@ -96,163 +182,156 @@ def generate_devices(cur, count):
         os_key = 'iOS' if 'iOS' in device_os else 'iPadOS' if 'iPadOS' in device_os else 'macOS' if 'macOS' in device_os else 'Windows' if 'Windows' in device_os else 'Android'
         device_name = random.choice(device_name_map.get((device_type, os_key), ["Generic Device"]))
 
-        devices_data.append((
-            str(uuid.uuid4()), device_name, device_type, device_os,
-            datetime.now(), 'active'
-        ))
-
-    insert_query = """
-        INSERT INTO Devices (device_identifier, device_name, device_type, device_os, last_login_at, status)
-        VALUES (%s, %s, %s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, devices_data)
+        yield (
+            str(uuid.UUID(int=random.getrandbits(128), version=4)), device_name, device_type, device_os,
+            AS_OF, 'active'
+        )
 
-    cur.execute("SELECT device_id FROM Devices;")
-    device_ids = [row[0] for row in cur.fetchall()]
+def generate_devices(cur, count):
+    print(f"Generating {count} devices...")
+    columns = ['device_identifier', 'device_name', 'device_type', 'device_os', 'last_login_at', 'status']
+    device_ids = []
+    for chunk in iter_chunks(iter_device_rows(count), CHUNK_SIZE):
+        device_ids.extend(load_chunk(cur, 'Devices', columns, chunk, id_column='device_id', mode=LOAD_MODE))
     print(f"-> Generated {len(device_ids)} devices.")
     return device_ids
 
-def generate_customer_device_links(cur, customer_ids, device_ids):
-    print("Generating customer-device links...")
-    links_data = []
+def iter_customer_device_link_rows(customer_ids, device_ids):
     for customer_id in customer_ids:
         num_devices_for_customer = random.randint(1, 2)
         assigned_devices = random.sample(device_ids, num_devices_for_customer)
         
         # Thiết bị đầu tiên luôn là 'verified' và là session đang hoạt động
-        links_data.append((customer_id, assigned_devices[0], 'verified', True))
+        yield (customer_id, assigned_devices[0], 'verified', True)
         
         for i in range(1, len(assigned_devices)):
             status = random.choices(['verified', 'unverified'], weights=[0.8, 0.2])[0]
-            links_data.append((customer_id, assigned_devices[i], status, False))
+            yield (customer_id, assigned_devices[i], status, False)
 
-    insert_query = """
-        INSERT INTO CustomerDeviceLinks (customer_id, device_id, trust_status, is_active_session)
-        VALUES (%s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, links_data)
+def index_customer_devices(link_rows, device_index):
+    # device_index: customer_id -> ([thiết bị verified], [thiết bị unverified])
+    for row in link_rows:
+        customer_id, device_id, trust_status, _ = row
+        verified, unverified = device_index.setdefault(customer_id, ([], []))
+        (verified if trust_status == 'verified' else unverified).append(device_id)
+        yield row
+
+def generate_customer_device_links(cur, customer_ids, device_ids):
+    print("Generating customer-device links...")
+    columns = ['customer_id', 'device_id', 'trust_status', 'is_active_session']
+    device_index = {}
+    rows = index_customer_devices(iter_customer_device_link_rows(customer_ids, device_ids), device_index)
+    load_rows(cur, 'CustomerDeviceLinks', columns, rows, mode=LOAD_MODE, chunk_size=CHUNK_SIZE)
     print("-> Generated customer-device links.")
+    return device_index
 
-def generate_identity_documents(cur, customers_info):
-    print("Generating customer identity documents...")
-    docs_data = []
+def iter_identity_document_rows(customers_info):
     for customer_id, status, address in customers_info:
         if status == 'active':
             doc_type = random.choice(['CCCD', 'Passport'])
             
+            doc_number = document_number_for(customer_id, doc_type)
             if doc_type == 'CCCD':
-                doc_number = f"{random.randint(10**11, 10**12-1)}"
                 issue_place = "Cục Cảnh sát quản lý hành chính về trật tự xã hội"
             else: # Passport
-                doc_number = f"{random.choice('BCK')}{random.randint(10**6, 10**7-1)}"
                 issue_place = "Cục Quản lý Xuất nhập cảnh"
             
-            issue_date = fake.date_between(start_date='-3y', end_date='-2y')
-            expiry_date = fake.date_between(start_date='+2y', end_date='+3y')
+            today = AS_OF.date()
+            issue_date = value_pools.random_date(today - timedelta(days=3 * 365), today - timedelta(days=2 * 365))
+            expiry_date = value_pools.random_date(today + timedelta(days=2 * 365), today + timedelta(days=3 * 365))
             
-            docs_data.append((
+            yield (
                 customer_id, doc_number, doc_type, 'Vietnam',
                 issue_date, expiry_date, issue_place
-            ))
-    
-    insert_query = """
-        INSERT INTO CustomerIdentityDocuments (customer_id, document_number, document_type, nationality, issue_date, expiry_date, issue_place)
-        VALUES (%s, %s, %s, %s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, docs_data)
-    print(f"-> Generated {len(docs_data)} identity documents.")
+            )
 
-def generate_biometric_data(cur, customers_info):
-    print("Generating biometric data...")
-    bio_data = []
+def generate_identity_documents(cur, customers_info):
+    print("Generating customer identity documents...")
+    columns = ['customer_id', 'document_number', 'document_type', 'nationality', 'issue_date', 'expiry_date', 'issue_place']
+    docs_count = load_rows(cur, 'CustomerIdentityDocuments', columns, iter_identity_document_rows(customers_info), mode=LOAD_MODE, chunk_size=CHUNK_SIZE)
+    print(f"-> Generated {docs_count} identity documents.")
+
+def iter_biometric_rows(customers_info):
     for customer_id, status, _ in customers_info:
         if status in ('active', 'suspended'):
-            bio_data.append((
+            yield (
                 customer_id,
                 'face',
                 hashlib.sha256(str(customer_id).encode()).hexdigest()
-            ))
-    
-    insert_query = "INSERT INTO BiometricData (customer_id, biometric_type, template_hash) VALUES (%s, %s, %s);"
-    cur.executemany(insert_query, bio_data)
-    print(f"-> Generated {len(bio_data)} biometric records.")
+            )
+
+def generate_biometric_data(cur, customers_info):
+    print("Generating biometric data...")
+    bio_count = load_rows(cur, 'BiometricData', ['customer_id', 'biometric_type', 'template_hash'], iter_biometric_rows(customers_info), mode=LOAD_MODE, chunk_size=CHUNK_SIZE)
+    print(f"-> Generated {bio_count} biometric records.")
 
 def generate_transaction_limits(cur, customer_ids):
     print("Generating transaction limits...")
-    limits_data = []
+    limits = {}
     
     daily_limit_options = [500_000_000.0, 1_000_000_000.0, 2_000_000_000.0, 5_000_000_000.0]
     per_transaction_options = [100_000_000.0, 500_000_000.0, 1_000_000_000.0]
 
-    for customer_id in customer_ids:
-        daily_total = random.choice(daily_limit_options)
-        valid_per_transaction_options = [p for p in per_transaction_options if p <= daily_total]
-        per_transaction = random.choice(valid_per_transaction_options) if valid_per_transaction_options else min(per_transaction_options)
+    def rows():
+        for customer_id in customer_ids:
+            daily_total = random.choice(daily_limit_options)
+            valid_per_transaction_options = [p for p in per_transaction_options if p <= daily_total]
+            per_transaction = random.choice(valid_per_transaction_options) if valid_per_transaction_options else min(per_transaction_options)
 
-        limits_data.append((customer_id, 'DAILY_TOTAL', daily_total, 'VND'))
-        limits_data.append((customer_id, 'PER_TRANSACTION', per_transaction, 'VND'))
+            limits[customer_id] = {'DAILY_TOTAL': daily_total, 'PER_TRANSACTION': per_transaction}
+            yield (customer_id, 'DAILY_TOTAL', daily_total, 'VND')
+            yield (customer_id, 'PER_TRANSACTION', per_transaction, 'VND')
     
-    insert_query = "INSERT INTO TransactionLimits (customer_id, limit_type, limit_amount, currency) VALUES (%s, %s, %s, %s);"
-    cur.executemany(insert_query, limits_data)
-    print(f"-> Generated {len(limits_data)} transaction limit records.")
-
-def generate_accounts(cur, customers_info):
-    print("Generating accounts for active customers...")
-    accounts_data = []
-    used_account_numbers.clear()
+    limits_count = load_rows(cur, 'TransactionLimits', ['customer_id', 'limit_type', 'limit_amount', 'currency'], rows(), mode=LOAD_MODE, chunk_size=CHUNK_SIZE)
+    print(f"-> Generated {limits_count} transaction limit records.")
+    return limits
 
-    active_customers = [info for info in customers_info if info[1] == 'active']
-    customer_ids = [info[0] for info in active_customers]
-
-    for customer_id in customer_ids:
-        for _ in range(random.randint(1, 2)):
-            while True:
-                acc_num = f"102{random.randint(10**9, 10**10-1)}"
-                if acc_num not in used_account_numbers:
-                    used_account_numbers.add(acc_num)
-                    break
-            
+def iter_account_rows(customers_info, first_account_id):
+    account_id = first_account_id
+    for customer_id, status, _ in customers_info:
+        if status != 'active':
+            continue
+        for _ in range(random.randint(1, MAX_ACCOUNTS_PER_CUSTOMER)):
             has_card = random.choice([True, False])
-            accounts_data.append((
-                customer_id, acc_num,
+            yield (
+                account_id, customer_id, account_number_for(account_id),
                 random.choices(['payment', 'savings'], weights=[0.8, 0.2])[0],
                 random.uniform(100000, 50000000),
                 random.choices(['active', 'inactive', 'closed', 'frozen'], weights=[0.9, 0.05, 0.03, 0.02])[0],
                 f"512345******{random.randint(1000,9999)}" if has_card else None,
-                fake.future_date(end_date="+3y") if has_card else None,
+                value_pools.random_date(AS_OF.date() + timedelta(days=1), AS_OF.date() + timedelta(days=3 * 365)) if has_card else None,
                 'active' if has_card else None
-            ))
-    
-    insert_query = """
-        INSERT INTO Accounts (customer_id, account_number, account_type, balance, status, card_number_masked, card_expiry_date, card_status)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, accounts_data)
-    
-    cur.execute("SELECT customer_id, account_id FROM Accounts WHERE status = 'active';")
+            )
+            account_id += 1
+
+def generate_accounts(cur, customers_info, first_account_id):
+    print("Generating accounts for active customers...")
+    columns = ['account_id', 'customer_id', 'account_number', 'account_type', 'balance', 'status', 'card_number_masked', 'card_expiry_date', 'card_status']
     customer_accounts_map = {}
-    for cid, aid in cur.fetchall():
-        if cid not in customer_accounts_map:
-            customer_accounts_map[cid] = []
-        customer_accounts_map[cid].append(aid)
+    for chunk in iter_chunks(iter_account_rows(customers_info, first_account_id), CHUNK_SIZE):
+        load_chunk(cur, 'Accounts', columns, chunk, mode=LOAD_MODE)
+        for row in chunk:
+            if row[5] != 'active':
+                continue
+            aid, cid = row[0], row[1]
+            if cid not in customer_accounts_map:
+                customer_accounts_map[cid] = []
+            customer_accounts_map[cid].append(aid)
     print("-> Generated accounts for active customers.")
     return customer_accounts_map
 
-def generate_transactions(cur, customer_accounts_map, limits):
-    print("Generating transactions...")
-    transactions_data = []
-    if not customer_accounts_map:
-        print("-> No active accounts to generate transactions for.")
-        return
+def lookup_customer_devices(device_index, customer_id):
+    verified_devices, unverified_devices = device_index.get(customer_id, ([], []))
+    return verified_devices, unverified_devices[0] if unverified_devices else None
 
+def iter_transaction_rows(customer_accounts_map, limits, customer_devices, first_txn_id, txn_per_account, days):
+    txn_id = first_txn_id
+    window_start = AS_OF - timedelta(days=days)
     all_active_account_ids = [aid for sublist in customer_accounts_map.values() for aid in sublist]
+    min_txn, max_txn = txn_per_account
     
     for customer_id, account_ids in customer_accounts_map.items():
-        cur.execute("SELECT device_id FROM CustomerDeviceLinks WHERE customer_id = %s AND trust_status = 'verified';", (customer_id,))
-        verified_devices = [row[0] for row in cur.fetchall()]
-        
-        cur.execute("SELECT device_id FROM CustomerDeviceLinks WHERE customer_id = %s AND trust_status = 'unverified' LIMIT 1;", (customer_id,))
-        unverified_device_row = cur.fetchone()
+        verified_devices, unverified_device = customer_devices(customer_id)
         
         if not verified_devices:
             continue 
@@ -261,7 +340,7 @@ def generate_transactions(cur, customer_accounts_map, limits):
         per_transaction_limit_float = float(per_transaction_limit)
 
         for account_id in account_ids:
-            for _ in range(random.randint(10, 25)):
+            for _ in range(random.randint(min_txn, max_txn)):
                 amount = random.uniform(50000, per_transaction_limit_float * 0.5)
                 
                 rand_choice = random.random()
@@ -280,200 +359,494 @@ def generate_transactions(cur, customer_accounts_map, limits):
                     regulation_category = 'B'
                 
                 device_to_use = random.choice(verified_devices)
-                if unverified_device_row and random.random() < 0.02:
-                    device_to_use = unverified_device_row[0]
+                if unverified_device and random.random() < 0.02:
+                    device_to_use = unverified_device
                     status = random.choices(['completed', 'failed'], weights=[0.4, 0.6])[0] 
 
                 destination_account = random.choice(all_active_account_ids) if random.random() > 0.2 else None
 
-                transactions_data.append((
-                    account_id, destination_account,
+                yield (
+                    txn_id, account_id, destination_account,
                     device_to_use,
                     random.choices(['P2P_TRANSFER', 'BILL_PAYMENT'], weights=[0.8, 0.2])[0],
                     amount, status, regulation_category,
-                    fake.date_time_between(start_date='-30d', end_date='now')
-                ))
+                    fake.date_time_between(start_date=window_start, end_date=AS_OF)
+                )
+                txn_id += 1
+
+def derive_transaction_chunk(chunk, account_owner, device_index):
+    """Auth logs and risk tags for one chunk of transactions."""
+    auth_rows, risk_rows = [], []
+    for txn_id, account_id, _, device_id, _, _, status, reg_cat, created_at in chunk:
+        customer_id = account_owner[account_id]
+        txn_auth_rows = auth_log_rows(customer_id, device_id, txn_id, status, reg_cat, created_at)
+        auth_rows.extend(txn_auth_rows)
+
+        device_unverified = device_id in device_index.get(customer_id, ([], []))[1]
+        tags = transaction_risk_tags(device_unverified, status, created_at)
+        tags += failed_auth_risk_tags(sum(1 for row in txn_auth_rows if row[4] == 'failure'))
+        risk_rows.extend((customer_id, txn_id, tag, None) for tag in tags)
+    return auth_rows, risk_rows
+
+def generate_transactions(cur, customer_accounts_map, limits, device_index, first_txn_id, txn_per_account=TXN_PER_ACCOUNT, days=TXN_HISTORY_DAYS, engine=ENGINE_PYTHON):
+    print(f"Generating transactions ({engine} engine) with auth logs and risk tags...")
+    if not customer_accounts_map:
+        print("-> No active accounts to generate transactions for.")
+        return
 
-    insert_query = """
-        INSERT INTO Transactions (source_account_id, destination_account_id, device_id, transaction_type, amount, status, regulation_category, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, transactions_data)
-    print(f"-> Generated {len(transactions_data)} transactions.")
-
-def generate_auth_logs(cur):
-    print("Generating authentication logs...")
-    cur.execute("""
-        SELECT t.transaction_id, a.customer_id, t.device_id, t.status, t.regulation_category, t.created_at
-        FROM Transactions t
-        JOIN Accounts a ON t.source_account_id = a.account_id;
-    """)
-    transactions_info = cur.fetchall()
-    
-    auth_logs_data = []
-    
-    for txn_id, customer_id, device_id, status, reg_cat, created_at in transactions_info:
-        result = 'success' if status == 'completed' else 'failure'
-        
-        if reg_cat in ('A', 'B'):
-            auth_method = random.choice(['sms_otp', 'device_biometric'])
-            auth_logs_data.append((customer_id, device_id, txn_id, auth_method, result, created_at + timedelta(seconds=2)))
-        elif reg_cat == 'C':
-            auth_method = 'biometric_faceid'
-            auth_logs_data.append((customer_id, device_id, txn_id, auth_method, result, created_at + timedelta(seconds=2)))
-        elif reg_cat == 'D':
-            auth_logs_data.append((customer_id, device_id, txn_id, 'biometric_faceid', result, created_at + timedelta(seconds=2)))
-            auth_logs_data.append((customer_id, device_id, txn_id, 'soft_otp', result, created_at + timedelta(seconds=4)))
-
-    insert_query = """
-        INSERT INTO AuthLogs (customer_id, device_id, transaction_id, auth_method, result, created_at)
-        VALUES (%s, %s, %s, %s, %s, %s);
-    """
-    cur.executemany(insert_query, auth_logs_data)
-    print(f"-> Generated {len(auth_logs_data)} auth logs.")
+    # Hàng được sinh và ghi theo từng lô, không giữ toàn bộ giao dịch trong bộ nhớ
+    customer_devices = partial(lookup_customer_devices, device_index)
+    if engine == ENGINE_NUMPY:
+        from vectorized_transactions import iter_transaction_rows_numpy
+        rows = iter_transaction_rows_numpy(
+            customer_accounts_map, limits, customer_devices, first_txn_id, txn_per_account, days,
+            as_of=AS_OF, seed=random.getrandbits(64), batch_rows=CHUNK_SIZE,
+        )
+    else:
+        rows = iter_transaction_rows(customer_accounts_map, limits, customer_devices, first_txn_id, txn_per_account, days)
+
+    account_owner = {aid: cid for cid, account_ids in customer_accounts_map.items() for aid in account_ids}
+    counts = {'Transactions': 0, 'AuthLogs': 0, 'RiskTags': 0}
+
+    def load(table, columns, table_rows):
+        if table_rows:
+            load_chunk(cur, table, columns, table_rows, mode=LOAD_MODE, partition_column=PARTITIONED_TABLES.get(table))
+            counts[table] += len(table_rows)
+
+    # Các bảng dẫn xuất được tính ngay trên từng lô giao dịch, không đọc lại từ database
+    for chunk in iter_chunks(rows, CHUNK_SIZE):
+        load('Transactions', TRANSACTION_COLUMNS, chunk)
+        auth_rows, risk_rows = derive_transaction_chunk(chunk, account_owner, device_index)
+        load('AuthLogs', AUTH_LOG_COLUMNS, auth_rows)
+        load('RiskTags', RISK_TAG_COLUMNS, risk_rows)
+
+    print(f"-> Generated {counts['Transactions']} transactions, {counts['AuthLogs']} auth logs "
+          f"and {counts['RiskTags']} risk tags.")
 
 def generate_daily_limit_trackers(cur):
-    print("Generating daily limit trackers based on transaction history...")
-    cur.execute("""
-        SELECT 
-            a.customer_id, 
-            t.amount, 
-            t.regulation_category, 
-            t.created_at::date as tracking_date,
-            CASE 
-                WHEN t.transaction_type = 'P2P_TRANSFER' THEN 'NHOM_I.3'
-                WHEN t.transaction_type = 'BILL_PAYMENT' THEN 'NHOM_I.2'
-                ELSE 'NHOM_I.1'
-            END as transaction_type_group
-        FROM Transactions t
-        JOIN Accounts a ON t.source_account_id = a.account_id
-        WHERE t.status = 'completed'
-        ORDER BY a.customer_id, t.created_at;
-    """)
-    transactions = cur.fetchall()
-
-    trackers = {}
-    for customer_id, amount, reg_cat, date, group in transactions:
-        key = (customer_id, date, group)
-        if key not in trackers:
-            trackers[key] = {'T': 0, 'Tksth': 0}
-        
-        trackers[key]['T'] += amount
-        trackers[key]['Tksth'] += amount
-
-        if reg_cat in ('C', 'D'):
-            trackers[key]['Tksth'] = 0
-    
-    trackers_data = []
-    for (customer_id, date, group), values in trackers.items():
-        trackers_data.append((
-            customer_id, group, values['T'], values['Tksth'], date
-        ))
-
-    insert_query = """
-        INSERT INTO DailyLimitTrackers (customer_id, transaction_type_group, total_daily_amount, running_total_amount, tracking_date)
-        VALUES (%s, %s, %s, %s, %s);
+    """Refreshes the daily spend rollup once every shard has committed, then fills the trackers from it."""
+    print("Aggregating daily spend and populating daily limit trackers...")
+    # Bảng vừa được nạp lại toàn bộ, không có ai đọc view nên không cần CONCURRENTLY
+    refresh_daily_spend(cur, concurrently=False)
+    summary = daily_spend_summary(cur)
+    trackers = populate_daily_limit_trackers(cur)
+    print(f"-> Rolled up {summary['transactions']:,} completed transactions into {summary['rows']:,} "
+          f"customer/day/group rows; {trackers:,} daily limit tracker records written.")
+
+def merge_load_stats(shard_stats):
+    # Các shard chạy song song: cộng số dòng, lấy thời gian của shard chậm nhất
+    for stats in shard_stats:
+        for table, values in stats.items():
+            merged = LOAD_STATS.setdefault(table, {"rows": 0, "seconds": 0.0})
+            merged["rows"] += values["rows"]
+            merged["seconds"] = max(merged["seconds"], values["seconds"])
+
+def merge_phase_stats(shard_phases):
+    for phases in shard_phases:
+        for phase, seconds in phases.items():
+            PHASE_STATS[phase] = max(PHASE_STATS.get(phase, 0.0), seconds)
+
+def plan_shards(cur, args):
+    """Reserves one ID block per identity table and slices it into per-shard ranges.
+
+    Shard boundaries and seeds depend only on (seed, shard count), so the same
+    rows and IDs are produced regardless of the number of worker processes.
+    """
+    total, shard_count = args.customers, args.shards
+    accounts_per_customer = MAX_ACCOUNTS_PER_CUSTOMER
+    txns_per_customer = MAX_ACCOUNTS_PER_CUSTOMER * args.txn_per_account[1]
+
+    customer_base = reserve_id_block(cur, 'Customers', 'customer_id', total)
+    account_base = reserve_id_block(cur, 'Accounts', 'account_id', total * accounts_per_customer)
+    txn_base = reserve_id_block(cur, 'Transactions', 'transaction_id', total * txns_per_customer)
+
+    plans = []
+    for shard_index in range(shard_count):
+        start = shard_index * total // shard_count
+        end = (shard_index + 1) * total // shard_count
+        plans.append({
+            'shard_index': shard_index,
+            'shard_count': shard_count,
+            'seed': derive_shard_seed(args.seed, shard_index),
+            'first_customer_id': customer_base + start,
+            'customer_count': end - start,
+            'first_account_id': account_base + start * accounts_per_customer,
+            'first_txn_id': txn_base + start * txns_per_customer,
+            'txn_per_account': args.txn_per_account,
+            'days': args.days,
+            'engine': args.engine,
+            'as_of': AS_OF,
+            'load_mode': LOAD_MODE,
+            'chunk_size': CHUNK_SIZE,
+        })
+    return plans
+
+def generate_shard(plan, device_ids):
+    """Generates customers, accounts, device links and transactions for one shard."""
+    global LOAD_MODE, CHUNK_SIZE, AS_OF
+    LOAD_MODE = plan['load_mode']
+    CHUNK_SIZE = plan['chunk_size']
+    AS_OF = plan['as_of']
+    seed_generators(plan['seed'])
+    # Khi chạy trong process cha (--workers 1) cần giữ lại số liệu tải của process cha
+    parent_stats = {table: dict(values) for table, values in LOAD_STATS.items()}
+    parent_phases = dict(PHASE_STATS)
+    LOAD_STATS.clear()
+    PHASE_STATS.clear()
+
+    label = f"[shard {plan['shard_index'] + 1}/{plan['shard_count']}]"
+    print(f"{label} Generating customers {plan['first_customer_id']}..{plan['first_customer_id'] + plan['customer_count'] - 1}")
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            with timed_phase('customers'):
+                customers_info = generate_customers(cur, plan['first_customer_id'], plan['customer_count'])
+            customer_ids = [info[0] for info in customers_info]
+            with timed_phase('identity_documents'):
+                generate_identity_documents(cur, customers_info)
+            with timed_phase('biometric_data'):
+                generate_biometric_data(cur, customers_info)
+            with timed_phase('transaction_limits'):
+                limits = generate_transaction_limits(cur, customer_ids)
+            with timed_phase('customer_device_links'):
+                device_index = generate_customer_device_links(cur, customer_ids, device_ids)
+            with timed_phase('accounts'):
+                customer_accounts_map = generate_accounts(cur, customers_info, plan['first_account_id'])
+            with timed_phase('transactions'):
+                generate_transactions(cur, customer_accounts_map, limits, device_index, plan['first_txn_id'], plan['txn_per_account'], plan['days'], plan['engine'])
+            with timed_phase('shard_commit'):
+                conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        # Lỗi psycopg2 không pickle được qua process pool
+        raise RuntimeError(f"{label} {e}") from None
+    finally:
+        conn.close()
+        shard_stats = {table: dict(values) for table, values in LOAD_STATS.items()}
+        shard_phases = dict(PHASE_STATS)
+        LOAD_STATS.clear()
+        LOAD_STATS.update(parent_stats)
+        PHASE_STATS.clear()
+        PHASE_STATS.update(parent_phases)
+    print(f"{label} Done.")
+    return shard_stats, shard_phases
+
+def run_shards(plans, device_ids, workers):
+    if workers <= 1:
+        return [generate_shard(plan, device_ids) for plan in plans]
+
+    print(f"\nRunning {len(plans)} shards on {workers} worker processes...")
+    # spawn: process con không được kế thừa kết nối psycopg2 của process cha
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(generate_shard, plan, device_ids) for plan in plans]
+        return [future.result() for future in futures]
+
+def apply_defaults(args, defaults):
+    for name, value in defaults.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+
+def latest_transaction_day(cur):
+    # MAX trên cột có index: chỉ đọc đầu index của phân vùng mới nhất
+    cur.execute("SELECT MAX(created_at)::date FROM Transactions;")
+    return cur.fetchone()[0]
+
+def id_range(cur, table, id_column):
+    cur.execute(f"SELECT MIN({id_column}), MAX({id_column}) FROM {table};")
+    return cur.fetchone()
+
+def sample_device_ids(cur, count):
+    """Up to `count` random IDs of existing devices.
+
+    Device IDs come from sequence blocks, so a rolled-back load leaves gaps
+    and the MIN..MAX range is not a list of real devices. The session seed is
+    drawn from `random`, so runs with --seed pick the same devices.
     """
-    cur.executemany(insert_query, trackers_data)
-    print(f"-> Generated {len(trackers_data)} daily limit tracker records.")
-
-def generate_risk_tags(cur):
-    print("Generating risk tags based on risky scenarios...")
-    risk_tags_data = []
-
-    # Giao dịch từ thiết bị chưa xác thực
-    cur.execute("""
-        SELECT t.transaction_id, a.customer_id
-        FROM Transactions t
-        JOIN Accounts a ON t.source_account_id = a.account_id
-        JOIN CustomerDeviceLinks cdl ON t.device_id = cdl.device_id AND a.customer_id = cdl.customer_id
-        WHERE cdl.trust_status = 'unverified';
-    """)
-    for txn_id, customer_id in cur.fetchall():
-        risk_tags_data.append((customer_id, txn_id, 'UNVERIFIED_DEVICE', None))
-
-    # Xác thực thất bại 3 lần trở lên
-    cur.execute("""
-        SELECT customer_id, transaction_id 
-        FROM AuthLogs 
-        WHERE result = 'failure'
-        GROUP BY customer_id, transaction_id
-        HAVING COUNT(*) >= 3;
-    """)
-    for customer_id, txn_id in cur.fetchall():
-        risk_tags_data.append((customer_id, txn_id, 'MULTIPLE_FAILED_AUTHENTICATIONS', None))
-
-    # Giao dịch vào giờ bất thường (0h - 5h sáng)
-    cur.execute("""
-        SELECT t.transaction_id, a.customer_id
-        FROM Transactions t
-        JOIN Accounts a ON t.source_account_id = a.account_id
-        WHERE EXTRACT(HOUR FROM t.created_at) BETWEEN 0 AND 5;
-    """)
-    for txn_id, customer_id in cur.fetchall():
-        risk_tags_data.append((customer_id, txn_id, 'UNUSUAL_TRANSACTION_TIME', None))
-
-    # Giao dịch thành công từ thiết bị mới (chưa xác thực)
-    cur.execute("""
-        SELECT t.transaction_id, a.customer_id
-        FROM Transactions t
-        JOIN Accounts a ON t.source_account_id = a.account_id
-        JOIN CustomerDeviceLinks cdl ON t.device_id = cdl.device_id AND a.customer_id = cdl.customer_id
-        WHERE cdl.trust_status = 'unverified' AND t.status = 'completed';
-    """)
-    for txn_id, customer_id in cur.fetchall():
-        risk_tags_data.append((customer_id, txn_id, 'NEW_DEVICE_SUCCESSFUL_TRANSACTION', None))
-
-    insert_query = """
-        INSERT INTO RiskTags (customer_id, transaction_id, tag_type, description)
-        VALUES (%s, %s, %s, %s);
+    cur.execute("SELECT setseed(%s);", (random.uniform(-1, 1),))
+    cur.execute("SELECT device_id FROM Devices ORDER BY random() LIMIT %s;", (count,))
+    return [row[0] for row in cur.fetchall()]
+
+def load_existing_customers(cur, customer_ids):
+    """Active accounts, limits and device links of existing customers, shaped like the generators' return values."""
+    customer_accounts_map, limits, device_index = {}, {}, {}
+    for chunk in iter_chunks(customer_ids, CHUNK_SIZE):
+        cur.execute("""
+            SELECT customer_id, account_id FROM Accounts
+            WHERE customer_id = ANY(%s) AND status = 'active'
+            ORDER BY customer_id, account_id;
+        """, (chunk,))
+        for customer_id, account_id in cur.fetchall():
+            customer_accounts_map.setdefault(customer_id, []).append(account_id)
+        cur.execute("SELECT customer_id, limit_type, limit_amount FROM TransactionLimits WHERE customer_id = ANY(%s);", (chunk,))
+        for customer_id, limit_type, limit_amount in cur.fetchall():
+            limits.setdefault(customer_id, {})[limit_type] = float(limit_amount)
+        cur.execute("""
+            SELECT customer_id, device_id, trust_status, is_active_session FROM CustomerDeviceLinks
+            WHERE customer_id = ANY(%s)
+            ORDER BY customer_id, is_active_session DESC, device_id;
+        """, (chunk,))
+        for _ in index_customer_devices(cur.fetchall(), device_index):
+            pass
+    return customer_accounts_map, limits, device_index
+
+def iter_new_device_link_rows(customer_ids, new_device_ids):
+    for customer_id in customer_ids:
+        if new_device_ids and random.random() < ADVANCE_NEW_DEVICE_SHARE:
+            status = random.choices(['verified', 'unverified'], weights=[0.8, 0.2])[0]
+            yield (customer_id, random.choice(new_device_ids), status, False)
+
+def start_day(day):
+    """Points AS_OF at the end of `day` (a date or ISO string) and returns the start of the day."""
+    global AS_OF
+    if isinstance(day, str):
+        day = datetime.fromisoformat(day).date()
+    day_start = datetime.combine(day, day_time.min)
+    AS_OF = day_start + timedelta(days=1)
+    return day_start
+
+def advance_reference(cur, args):
+    """Adds the day's new devices and customers, with their documents, biometrics, limits, links and accounts.
+
+    Returns the plan the later phases work from (JSON-serialisable), or None
+    when there is no data to build on.
     """
-    cur.executemany(insert_query, risk_tags_data)
-    print(f"-> Generated {len(risk_tags_data)} risk tags.")
+    with timed_phase('existing_state'):
+        latest_day = latest_transaction_day(cur)
+        customer_bounds = id_range(cur, 'Customers', 'customer_id')
+    if latest_day is None or customer_bounds[0] is None:
+        return None
+    apply_defaults(args, ADVANCE_DEFAULTS)
+
+    day = args.as_of.date() if args.as_of is not None else latest_day + timedelta(days=1)
+    day_start = start_day(day)
+    print(f"Appending {day.isoformat()} (latest existing transaction day: {latest_day.isoformat()}).")
+
+    with timed_phase('partitions'):
+        ensure_partitions(cur, day_start, AS_OF + timedelta(days=1))
+    with timed_phase('devices'):
+        new_device_ids = generate_devices(cur, args.devices)
+        device_ids = sorted(set(new_device_ids) | set(sample_device_ids(cur, ADVANCE_EXISTING_DEVICE_SAMPLE)))
+
+    first_customer_id = reserve_id_block(cur, 'Customers', 'customer_id', args.customers)
+    first_account_id = reserve_id_block(cur, 'Accounts', 'account_id', args.customers * MAX_ACCOUNTS_PER_CUSTOMER)
+    with timed_phase('customers'):
+        customers_info = generate_customers(cur, first_customer_id, args.customers)
+    customer_ids = [info[0] for info in customers_info]
+    with timed_phase('identity_documents'):
+        generate_identity_documents(cur, customers_info)
+    with timed_phase('biometric_data'):
+        generate_biometric_data(cur, customers_info)
+    with timed_phase('transaction_limits'):
+        generate_transaction_limits(cur, customer_ids)
+    with timed_phase('customer_device_links'):
+        generate_customer_device_links(cur, customer_ids, device_ids)
+    with timed_phase('accounts'):
+        generate_accounts(cur, customers_info, first_account_id)
+    return {
+        'mode': 'advance',
+        'day': day.isoformat(),
+        'existing_customers': list(customer_bounds),
+        'new_customers': [first_customer_id, args.customers],
+        'new_devices': new_device_ids,
+    }
+
+def advance_transactions(cur, args, plan):
+    """Generates the day's transactions, auth logs and risk tags for the new customers and a sample of existing ones."""
+    apply_defaults(args, ADVANCE_DEFAULTS)
+    start_day(plan['day'])
+    first_id, last_id = plan['existing_customers']
+    first_new_id, new_count = plan['new_customers']
+
+    with timed_phase('existing_customers'):
+        active_count = min(args.active_customers, last_id - first_id + 1)
+        active_ids = sorted(random.sample(range(first_id, last_id + 1), active_count))
+        # Khách hàng mới cũng được đọc lại, nên phase này chạy riêng được (task riêng của DAG)
+        customer_accounts_map, limits, device_index = load_existing_customers(
+            cur, active_ids + list(range(first_new_id, first_new_id + new_count)))
+        transacting = [customer_id for customer_id in active_ids if customer_id in customer_accounts_map]
+        print(f"-> {len(transacting):,} of {active_count:,} sampled existing customers have active accounts.")
+        columns = ['customer_id', 'device_id', 'trust_status', 'is_active_session']
+        rows = index_customer_devices(iter_new_device_link_rows(transacting, plan['new_devices']), device_index)
+        linked = load_rows(cur, 'CustomerDeviceLinks', columns, rows, mode=LOAD_MODE, chunk_size=CHUNK_SIZE)
+        print(f"-> Linked {linked:,} existing customers to new devices.")
+
+    account_count = sum(len(account_ids) for account_ids in customer_accounts_map.values())
+    first_txn_id = reserve_id_block(cur, 'Transactions', 'transaction_id', account_count * args.txn_per_account[1])
+    with timed_phase('transactions'):
+        generate_transactions(cur, customer_accounts_map, limits, device_index, first_txn_id, args.txn_per_account, 1, args.engine)
+
+def advance_derived(cur, plan):
+    day_start = start_day(plan['day'])
+    with timed_phase('daily_limit_trackers'):
+        # Chỉ tính lại ngày vừa sinh; materialized view được audit làm mới khi cần
+        trackers = populate_daily_limit_trackers(cur, (day_start, AS_OF))
+        print(f"-> {trackers:,} daily limit tracker records written for {plan['day']}.")
+
+# --phase -> hàm chạy phase đó trên plan của phase reference
+ADVANCE_PHASES = {
+    'reference': lambda cur, args, plan: advance_reference(cur, args),
+    'transactions': advance_transactions,
+    'derived': lambda cur, args, plan: advance_derived(cur, plan),
+}
 
+def advance_one_day(cur, args):
+    """Appends one simulated day on top of the existing data, without truncating or rebuilding anything.
 
-def main():
+    New customers and devices take IDs after the current maximum; a sample of
+    existing customers transacts on their existing accounts. Returns the plan,
+    or None when there is no data to build on.
+    """
+    plan = advance_reference(cur, args)
+    if plan is not None:
+        advance_transactions(cur, args, plan)
+        advance_derived(cur, plan)
+    return plan
+
+def print_run_report(started, sharded=True):
+    elapsed = time.perf_counter() - started
+    total_rows = sum(values['rows'] for values in LOAD_STATS.values())
+    # ru_maxrss được tính bằng KB trên Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peak_children_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\nGenerated {total_rows:,} rows in {elapsed:.1f}s ({format_rate(total_rows, elapsed)}).")
+    print(f"Peak memory (RSS): {peak_rss_mb:,.1f} MB" + (f", largest worker {peak_children_mb:,.1f} MB" if peak_children_mb else ""))
+    if PHASE_STATS:
+        # --advance-day không chia shard
+        label = "Phase timings (slowest shard)" if sharded else "Phase timings"
+        print(f"{label}: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in PHASE_STATS.items()))
+
+def parse_txn_per_account(value):
+    parts = value.split('-', 1)
+    try:
+        bounds = tuple(int(p) for p in parts)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected N or MIN-MAX, got '{value}'")
+    min_txn, max_txn = bounds if len(bounds) == 2 else (bounds[0], bounds[0])
+    if min_txn < 0 or max_txn < min_txn:
+        raise argparse.ArgumentTypeError(f"invalid range '{value}'")
+    return min_txn, max_txn
+
+def parse_as_of(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an ISO date or datetime, got '{value}'")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic banking data into PostgreSQL.")
+    parser.add_argument('--customers', type=int, default=None,
+                        help=f"number of (new) customers to generate (default: {NUM_CUSTOMERS}, {ADVANCE_NEW_CUSTOMERS} with --advance-day)")
+    parser.add_argument('--devices', type=int, default=None,
+                        help=f"number of (new) devices to generate (default: {NUM_DEVICES}, {ADVANCE_NEW_DEVICES} with --advance-day)")
+    parser.add_argument('--txn-per-account', type=parse_txn_per_account, default=None,
+                        metavar='N|MIN-MAX', help="transactions per active account (default: 10-25, 1-3 with --advance-day)")
+    parser.add_argument('--days', type=int, default=TXN_HISTORY_DAYS, help="transaction history window in days")
+    parser.add_argument('--as-of', type=parse_as_of, default=None,
+                        help="end of the generated history window (default: now); fix it for reproducible timestamps")
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE_PYTHON,
+                        help="transaction synthesis engine: row-by-row Python or vectorised NumPy")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible output")
+    parser.add_argument('--shards', type=int, default=1, help="number of customer ID shards")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes for shard generation (default: min(shards, CPU count))")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows generated and loaded per round trip")
+    parser.add_argument('--load-mode', choices=LOAD_MODES, default=DEFAULT_LOAD_MODE, help="bulk load strategy")
+    parser.add_argument('--advance-day', action='store_true',
+                        help="append one day (the day after the latest transaction, or --as-of) instead of regenerating everything")
+    parser.add_argument('--active-customers', type=int, default=ADVANCE_ACTIVE_CUSTOMERS,
+                        help="existing customers sampled to transact on the appended day (with --advance-day)")
+    parser.add_argument('--phase', choices=list(ADVANCE_PHASES),
+                        help="run one --advance-day phase in its own transaction; the reference phase prints the plan "
+                             "as its last line")
+    parser.add_argument('--plan', type=json.loads, default=None,
+                        help="plan printed by the reference phase (JSON), required by the later phases")
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    if args.phase:
+        args.advance_day = True
+        if args.phase != 'reference' and args.plan is None:
+            parser.error(f"--phase {args.phase} needs the --plan printed by the reference phase")
+    if args.advance_day and args.shards > 1:
+        parser.error("--advance-day runs in a single process; it cannot be combined with --shards")
+    if args.workers is None:
+        args.workers = min(args.shards, os.cpu_count() or 1)
+    return args
+
+
+def main(argv=None):
+    global LOAD_MODE, CHUNK_SIZE, AS_OF
+    args = parse_args(argv)
+    LOAD_MODE = args.load_mode
+    CHUNK_SIZE = args.chunk_size
+    if args.as_of is not None:
+        AS_OF = args.as_of
+    if args.seed is None:
+        args.seed = random.SystemRandom().randrange(2**32)
+    print(f"Using seed {args.seed} with {args.shards} shard(s).")
+    seed_generators(args.seed)
+
+    started = time.perf_counter()
     conn = None
+    plan = None
     try:
         conn = get_db_connection()
-        clear_all_tables(conn)
+        if args.plan is not None and args.plan.get('mode') != 'advance':
+            print(f"Nothing to do for phase '{args.phase}': the reference phase ran a full generation.")
+            plan = args.plan
+            return True
+        if args.advance_day:
+            with conn.cursor() as cur:
+                if args.phase:
+                    plan = ADVANCE_PHASES[args.phase](cur, args, args.plan) or args.plan
+                else:
+                    plan = advance_one_day(cur, args)
+            if plan is not None:
+                with timed_phase('commit'):
+                    conn.commit()
+                print_load_stats(mode=LOAD_MODE)
+                print_run_report(started, sharded=False)
+                print(f"\n {'Phase ' + args.phase if args.phase else 'One day of data'} appended successfully!")
+                return True
+            conn.rollback()
+            print("No existing data to advance; running a full generation instead.")
+        apply_defaults(args, FULL_DEFAULTS)
+
+        with timed_phase('clear'):
+            clear_all_tables(conn)
 
         with conn.cursor() as cur:
-            customers_info = generate_customers(cur, NUM_CUSTOMERS)
-            device_ids = generate_devices(cur, NUM_DEVICES)
+            with timed_phase('partitions'):
+                # Auth log có thể muộn hơn giao dịch vài giây, nên phủ thêm một ngày sau AS_OF
+                ensure_partitions(cur, AS_OF - timedelta(days=args.days), AS_OF + timedelta(days=1))
+            with timed_phase('devices'):
+                device_ids = generate_devices(cur, args.devices)
+            plans = plan_shards(cur, args)
             conn.commit()
 
-            customer_ids = [info[0] for info in customers_info]
-            generate_identity_documents(cur, customers_info)
-            generate_biometric_data(cur, customers_info)
-            generate_transaction_limits(cur, customer_ids)
-            generate_customer_device_links(cur, customer_ids, device_ids)
-            customer_accounts_map = generate_accounts(cur, customers_info)
-            conn.commit() 
-            
-            cur.execute("SELECT customer_id, limit_type, limit_amount FROM TransactionLimits;")
-            limits = {}
-            for cid, ltype, lamount in cur.fetchall():
-                if cid not in limits:
-                    limits[cid] = {}
-                limits[cid][ltype] = lamount
-
-            generate_transactions(cur, customer_accounts_map, limits)
-            conn.commit()
-            
-            generate_auth_logs(cur)
-            generate_daily_limit_trackers(cur)
-            generate_risk_tags(cur)
-            
+            shard_results = run_shards(plans, device_ids, args.workers)
+            merge_load_stats([load_stats for load_stats, _ in shard_results])
+            merge_phase_stats([phases for _, phases in shard_results])
+            with timed_phase('daily_limit_trackers'):
+                generate_daily_limit_trackers(cur)
             conn.commit()
+            print_load_stats(mode=LOAD_MODE)
+            print_run_report(started)
             print("\n Sample data generated successfully!")
+            plan = {'mode': 'full'}
+            return True
 
-    except psycopg2.Error as e:
+    except (psycopg2.Error, RuntimeError) as e:
         if conn: conn.rollback()
         print(f"\n Database error: {e}")
+        return False
     finally:
         if conn: conn.close()
         print("Database connection closed.")
+        if args.phase and plan is not None:
+            # Dòng cuối của stdout là XCom của BashOperator
+            print(json.dumps(plan))
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(0 if main() else 1)
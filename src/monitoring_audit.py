@@ -1,19 +1,51 @@
 import psycopg2
-from datetime import datetime
+import psycopg2.pool
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 from typing import List, Dict, Any
+import json
 import os
+import sqlite3
 
+import audit_history
+import audit_intermediates
+import audit_state
+import constraint_catalog
+import result_cache
+import sampled_checks
+from daily_spend import DAILY_SPEND_VIEW, REFRESH_STATE_TABLE, ensure_refresh_state_table, refresh_daily_spend_if_stale
+from risk_rules import BUSINESS_TIMEZONE
+from audit_instrumentation import InstrumentedCursor, instrument_check, print_slowest_checks, write_json_report
 from data_quality_standards import (
     NOT_NULL_CHECKS,
     UNIQUE_CHECKS,
     FOREIGN_KEY_CHECKS,
-    check_null_values,
-    check_uniqueness,
+    APPEND_ONLY_TABLES,
+    CHECK_SOURCE_TABLES,
+    check_null_values_batch,
+    check_uniqueness_batch,
     check_foreign_key_integrity,
     check_document_format,
     check_high_value_txn_strong_auth,
     check_untrusted_device_transactions,
-    check_daily_total_over_20m_auth
+    check_daily_total_over_20m_auth,
+    count_null_values_batch,
+    count_orphaned_records,
+    count_high_value_txn_without_strong_auth,
+    count_untrusted_device_transactions,
+    count_daily_total_over_20m,
+    count_daily_total_over_20m_delta,
+    auth_logs_after,
+    unverified_links_digest,
+    null_check_result,
+    foreign_key_result,
+    high_value_txn_strong_auth_result,
+    untrusted_device_result,
+    daily_total_over_20m_result,
+    intermediates_used_by,
 )
 
 CONN_PARAMS = {
@@ -21,14 +53,465 @@ CONN_PARAMS = {
     "port": os.getenv("BANKING_DB_PORT", "5432"),
     "dbname": os.getenv("BANKING_DB_NAME", "banking_db"),
     "user": os.getenv("BANKING_DB_USER", "db_user"),
-    "password": os.getenv("BANKING_DB_PASSWORD", "db_password")
+    "password": os.getenv("BANKING_DB_PASSWORD", "db_password"),
+    "options": f"-c timezone={BUSINESS_TIMEZONE}",
 }
 
-def write_log_file(results: List[Dict[str, Any]]):
-    log_dir = "/opt/airflow/logs" 
+AUDIT_WORKERS = int(os.getenv("AUDIT_WORKERS", "4"))
+# Check chạy lâu hơn ngưỡng này (giây) sẽ được EXPLAIN (ANALYZE, BUFFERS); để trống để tắt
+EXPLAIN_THRESHOLD = os.getenv("AUDIT_EXPLAIN_THRESHOLD")
+SLOWEST_CHECKS_SHOWN = 5
+LOG_DIR = os.getenv("AUDIT_LOG_DIR", "/opt/airflow/logs")
+# Nhóm check, theo thứ tự trong báo cáo; mỗi nhóm có thể chạy riêng (--group), ví dụ một task của DAG
+CHECK_GROUPS = ("null", "unique", "fk", "format", "risk")
+
+# Các check chạy lâu được đưa vào hàng đợi trước để chồng lên các check rẻ
+RISK_CHECKS = [
+    (check_high_value_txn_strong_auth, "risk_high_value_txn_strong_auth"),
+    (check_untrusted_device_transactions, "risk_untrusted_device_transactions"),
+    (check_daily_total_over_20m_auth, "risk_daily_total_over_20m_auth"),
+]
+
+def _count_untrusted(cur, id_range):
+    total, successful = count_untrusted_device_transactions(cur, id_range)
+    return {"failed_count": total, "successful_from_untrusted": successful}
+
+def _late_auth_logs(cur, watermark: int, marks: Dict[str, Any]):
+    # Auth log đến muộn cho giao dịch đã đếm có thể thêm xác thực mạnh cho giao dịch đó
+    latest, late = auth_logs_after(cur, marks.get("authlogs", 0), watermark)
+    return {"authlogs": latest}, "authlogs" not in marks or late
+
+def _changed_device_links(cur, watermark: int, marks: Dict[str, Any]):
+    # Liên kết đổi trạng thái tin cậy trên thiết bị đã có; liên kết với thiết bị mới không chạm giao dịch cũ
+    max_device_id = marks.get("max_device_id", 0)
+    digest = unverified_links_digest(cur, max_device_id)
+    cur.execute("SELECT COALESCE(MAX(device_id), 0) FROM Devices;")
+    latest = cur.fetchone()[0]
+    return ({"max_device_id": latest, "unverified_links": unverified_links_digest(cur, latest)},
+            marks.get("unverified_links") != digest)
+
+def _count_daily_total_over_20m_all(cur):
+    # Đếm lại từ đầu: tính một lần trên mọi ngày nhanh hơn nhiều so với delta. Không đọc bảng tổng hợp
+    # vì nó không biết đến auth log đến muộn (lý do thường gặp của việc đếm lại)
+    return {"failed_count": count_daily_total_over_20m(cur, live=True)}
+
+# Phiên bản incremental của các risk check: đếm delta trên một khoảng ID Transactions, dựng kết quả từ tổng,
+# đếm lại toàn bộ khi chưa có watermark ("all") và các dòng ngoài khoảng ID làm kết quả cũ mất hiệu lực ("dependencies")
+INCREMENTAL_RISK_CHECKS = {
+    "risk_high_value_txn_strong_auth": {
+        "count": lambda cur, id_range: {"failed_count": count_high_value_txn_without_strong_auth(cur, id_range)},
+        "result": lambda totals: high_value_txn_strong_auth_result(totals["failed_count"]),
+        "dependencies": _late_auth_logs,
+    },
+    "risk_untrusted_device_transactions": {
+        "count": _count_untrusted,
+        "result": lambda totals: untrusted_device_result(totals["failed_count"], totals["successful_from_untrusted"]),
+        "dependencies": _changed_device_links,
+    },
+    "risk_daily_total_over_20m_auth": {
+        "count": lambda cur, id_range: {"failed_count": count_daily_total_over_20m_delta(cur, id_range)},
+        "result": lambda totals: daily_total_over_20m_result(totals["failed_count"]),
+        "all": _count_daily_total_over_20m_all,
+        "dependencies": _late_auth_logs,
+    },
+}
+
+def plan_column_checks(not_null_checks: Dict[str, List[str]], unique_checks: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Groups column-level checks into as few queries as possible.
+
+    All NOT NULL columns of a table share one scan, and so do all its unique
+    columns (one grouping set per column).
+    """
+    plan = []
+    for table, columns in not_null_checks.items():
+        plan.append({
+            "kind": "null",
+            "table": table,
+            "columns": list(columns),
+            "check_names": [f"check_null_{table}_{column}" for column in columns],
+        })
+    for table, columns in unique_checks.items():
+        plan.append({
+            "kind": "unique",
+            "table": table,
+            "columns": list(columns),
+            "check_names": [f"check_unique_{table}_{column}" for column in columns],
+        })
+    return plan
+
+def run_planned_check(cur, planned: Dict[str, Any], window=None) -> List[Dict[str, Any]]:
+    """Executes one planned query and maps its outcome back to per-check result dicts."""
+    table = planned["table"]
+    if planned["kind"] == "null":
+        by_column = check_null_values_batch(cur, table, planned["columns"], window=window)
+    else:
+        by_column = check_uniqueness_batch(cur, table, planned["columns"])
+    results = [by_column[column] for column in planned["columns"]]
+
+    for result, check_name in zip(results, planned["check_names"]):
+        result['check_name'] = check_name
+    return results
+
+def run_sampled_null_check(cur, planned: Dict[str, Any], percent: float, seed=None, window=None) -> List[Dict[str, Any]]:
+    by_column = sampled_checks.sampled_null_values_batch(cur, planned["table"], planned["columns"], percent, seed, window)
+    results = [by_column[column] for column in planned["columns"]]
+    for result, check_name in zip(results, planned["check_names"]):
+        result['check_name'] = check_name
+    return results
+
+def _single_check(func, check_name: str, **kwargs):
+    def run(cur, relations=None) -> List[Dict[str, Any]]:
+        # relations chỉ được truyền cho task có khai báo "requires"
+        result = func(cur, **kwargs) if relations is None else func(cur, relations=relations, **kwargs)
+        result['check_name'] = check_name
+        return [result]
+    return run
+
+def _incremental_check(table: str, check_names: List[str], count_range, to_results, full_rebuild: bool,
+                       count_all=None, dependencies=None):
+    """Wraps delta counting over new rows of an append-only table into a task `run(cur)`.
+
+    `count_range(cur, id_range)` returns {check_name: totals}; `to_results`
+    turns the merged totals back into result dicts in `check_names` order.
+    `count_all` and `dependencies` are passed on to audit_state.refresh_totals.
+    """
+    def run(cur) -> List[Dict[str, Any]]:
+        totals, scanned = audit_state.refresh_totals(
+            cur, table, APPEND_ONLY_TABLES[table], check_names, count_range, full_rebuild,
+            count_all, dependencies,
+        )
+        results = to_results(totals)
+        for result, check_name in zip(results, check_names):
+            result['check_name'] = check_name
+            result['scanned_range'] = scanned
+        return results
+    return run
+
+def _incremental_null_check(planned: Dict[str, Any], full_rebuild: bool):
+    table, columns, check_names = planned["table"], planned["columns"], planned["check_names"]
+
+    def count_range(cur, id_range):
+        counts = count_null_values_batch(cur, table, columns, id_range)
+        return {name: {"failed_count": count} for name, count in zip(check_names, counts)}
+
+    def to_results(totals):
+        return [null_check_result(table, column, totals[name]["failed_count"])
+                for column, name in zip(columns, check_names)]
+
+    return _incremental_check(table, check_names, count_range, to_results, full_rebuild)
+
+def _incremental_fk_check(fk_check: Dict[str, str], check_name: str, full_rebuild: bool):
+    def count_range(cur, id_range):
+        return {check_name: {"failed_count": count_orphaned_records(cur, **fk_check, id_range=id_range)}}
+
+    def to_results(totals):
+        return [foreign_key_result(**fk_check, orphaned_count=totals[check_name]["failed_count"])]
+
+    return _incremental_check(fk_check["table"], [check_name], count_range, to_results, full_rebuild)
+
+def _incremental_risk_check(check_name: str, full_rebuild: bool):
+    spec = INCREMENTAL_RISK_CHECKS[check_name]
+    count_all = spec.get("all")
+    return _incremental_check(
+        'transactions', [check_name],
+        lambda cur, id_range: {check_name: spec["count"](cur, id_range)},
+        lambda totals: [spec["result"](totals[check_name])],
+        full_rebuild,
+        count_all=(lambda cur: {check_name: count_all(cur)}) if count_all else None,
+        dependencies=spec.get("dependencies"),
+    )
+
+def _enforced_task(group: str, check_name: str, subject: str, constraint: str) -> Dict[str, Any]:
+    def run(cur) -> List[Dict[str, Any]]:
+        result = constraint_catalog.constraint_enforced_result(subject, constraint)
+        result['check_name'] = check_name
+        return [result]
+    return {"name": check_name, "group": group, "check_names": [check_name], "run": run, "enforced_by": constraint}
+
+def build_check_tasks(incremental: bool = False, full_rebuild: bool = False, window=None,
+                      sample_percent: float = None, sample_seed: int = None,
+                      enforced: constraint_catalog.Enforced = None) -> List[Dict[str, Any]]:
+    """Lists every independent unit of audit work in report order.
+
+    Each task owns one or more check names and a `run(cur)` callable
+    returning their result dicts; tasks listing intermediates in `requires`
+    are called as `run(cur, relations)`. With `incremental`, checks on append-only
+    tables only scan rows above their stored watermark; a date `window`
+    (start, end) limits checks on partitioned tables to those days. With
+    `sample_percent`, NULL, format and risk checks are estimated from a
+    TABLESAMPLE SYSTEM sample; uniqueness and FK checks stay exact. Exact,
+    non-incremental tasks list their `sources`, the tables keying the result cache.
+    NULL, UNIQUE and FK checks guaranteed by a constraint in `enforced` become
+    tasks with `enforced_by` whose result needs no query.
+    """
+    enforced = enforced or {}
+    tasks = []
+    for planned in plan_column_checks(NOT_NULL_CHECKS, UNIQUE_CHECKS):
+        guaranteed = enforced.get(planned["kind"], {})
+        kept = []
+        for column, check_name in zip(planned["columns"], planned["check_names"]):
+            constraint = guaranteed.get((planned["table"], column))
+            if constraint:
+                tasks.append(_enforced_task(planned["kind"], check_name, f"[{planned['table']}.{column}]", constraint))
+            else:
+                kept.append((column, check_name))
+        if not kept:
+            continue
+        planned = dict(planned, columns=[column for column, _ in kept], check_names=[name for _, name in kept])
+        sources = []
+        if incremental and planned["kind"] == "null" and planned["table"] in APPEND_ONLY_TABLES:
+            run = _incremental_null_check(planned, full_rebuild)
+        elif sample_percent and planned["kind"] == "null":
+            run = lambda cur, planned=planned: run_sampled_null_check(cur, planned, sample_percent, sample_seed, window)
+        else:
+            run = lambda cur, planned=planned: run_planned_check(cur, planned, window)
+            sources = [planned["table"]]
+        tasks.append({
+            "name": f"{planned['kind']}:{planned['table']}",
+            "group": planned["kind"],
+            "check_names": planned["check_names"],
+            "run": run,
+            "sources": sources,
+        })
+
+    for fk_check in FOREIGN_KEY_CHECKS:
+        check_name = f"check_fk_{fk_check['table']}_{fk_check['fk_column']}"
+        constraint = enforced.get("fk", {}).get(
+            (fk_check["table"], fk_check["fk_column"], fk_check["parent_table"], fk_check["pk_column"]))
+        if constraint:
+            subject = f"[{fk_check['table']}.{fk_check['fk_column']}] -> [{fk_check['parent_table']}.{fk_check['pk_column']}]"
+            tasks.append(_enforced_task("fk", check_name, subject, constraint))
+            continue
+        sources = []
+        if incremental and fk_check["table"] in APPEND_ONLY_TABLES:
+            run = _incremental_fk_check(fk_check, check_name, full_rebuild)
+        else:
+            run = _single_check(check_foreign_key_integrity, check_name, **fk_check, window=window)
+            sources = [fk_check["table"], fk_check["parent_table"]]
+        tasks.append({
+            "name": check_name,
+            "group": "fk",
+            "check_names": [check_name],
+            "run": run,
+            "sources": sources,
+        })
+
+    tasks.append({
+        "name": "check_document_format",
+        "group": "format",
+        "check_names": ["check_document_format"],
+        "run": (_single_check(sampled_checks.sampled_document_format, "check_document_format",
+                              percent=sample_percent, seed=sample_seed)
+                if sample_percent else _single_check(check_document_format, "check_document_format")),
+        "sources": [] if sample_percent else CHECK_SOURCE_TABLES["check_document_format"],
+    })
+
+    for func, check_name in RISK_CHECKS:
+        requires, sources = [], []
+        if incremental:
+            run = _incremental_risk_check(check_name, full_rebuild)
+        elif sample_percent:
+            run = _single_check(sampled_checks.SAMPLED_RISK_CHECKS[check_name], check_name,
+                                percent=sample_percent, seed=sample_seed, window=window)
+        else:
+            run = _single_check(func, check_name, window=window)
+            requires = intermediates_used_by(check_name)
+            sources = CHECK_SOURCE_TABLES[check_name]
+        tasks.append({
+            "name": check_name,
+            "group": "risk",
+            "check_names": [check_name],
+            "run": run,
+            "requires": requires,
+            "sources": sources,
+        })
+    return tasks
+
+def run_check_task(pool, task: Dict[str, Any], explain_threshold: float = None,
+                   relations: Dict[str, str] = None) -> List[Dict[str, Any]]:
+    """Runs one task on a pooled connection; a database error only fails this task's checks.
+
+    Every result gets the task's timing, rows scanned and statements, plus
+    EXPLAIN output when the task took at least `explain_threshold` seconds.
+    """
+    worker = threading.current_thread().name
+    started = time.perf_counter()
+    conn = pool.getconn()
+    try:
+        with conn.cursor(cursor_factory=InstrumentedCursor) as cur:
+            run = task["run"]
+            if task.get("requires"):
+                run = lambda cur, run=run: run(cur, relations or {})
+            results, metrics = instrument_check(cur, run, explain_threshold)
+        conn.commit()
+    except psycopg2.Error as e:
+        if not conn.closed:
+            conn.rollback()
+        results = [
+            {"check_name": check_name, "status": "ERROR", "message": f"Check failed: {str(e).strip()}"}
+            for check_name in task["check_names"]
+        ]
+        metrics = {"duration_seconds": round(time.perf_counter() - started, 4)}
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+    for result in results:
+        result.update(metrics)
+        result['task'] = task["name"]
+        result['worker'] = worker
+    return results
+
+def prepare_intermediates(pool, tasks: List[Dict[str, Any]], window=None) -> Dict[str, str]:
+    """Builds every intermediate some task requires, once; on failure the checks inline them instead."""
+    required = sorted({name for task in tasks for name in task.get("requires", [])})
+    if not required:
+        return {}
+    conn = pool.getconn()
+    try:
+        return audit_intermediates.build_intermediates(conn, required, window)
+    except psycopg2.Error as e:
+        print(f"-> Could not build intermediates ({str(e).strip()}); checks will compute them inline.")
+        return {}
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+def release_intermediates(pool, relations: Dict[str, str]):
+    if not relations:
+        return
+    conn = pool.getconn()
+    try:
+        audit_intermediates.drop_intermediates(conn, relations)
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+def run_checks_concurrently(tasks: List[Dict[str, Any]], workers: int,
+                            explain_threshold: float = None, window=None,
+                            shared_intermediates: bool = True) -> List[Dict[str, Any]]:
+    """Runs tasks on `workers` threads sharing a bounded connection pool; results keep task order.
+
+    Intermediates required by the tasks are built first and dropped when
+    every task has finished.
+    """
+    workers = max(1, workers)
+    pool = psycopg2.pool.ThreadedConnectionPool(1, workers, **CONN_PARAMS)
+    relations = {}
+    try:
+        if shared_intermediates:
+            relations = prepare_intermediates(pool, tasks, window)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audit-worker") as executor:
+            submit_order = sorted(range(len(tasks)), key=lambda i: tasks[i]["group"] != "risk")
+            futures = {i: executor.submit(run_check_task, pool, tasks[i], explain_threshold, relations)
+                       for i in submit_order}
+            results = []
+            for i in range(len(tasks)):
+                results.extend(futures[i].result())
+            return results
+    finally:
+        try:
+            release_intermediates(pool, relations)
+        finally:
+            pool.closeall()
+
+def cache_variant(window=None) -> str:
+    # Kết quả theo cửa sổ ngày được cache riêng với kết quả trên toàn bảng
+    return f"{window[0]}..{window[1]}" if window else "all"
+
+def cached_result(result: Dict[str, Any], cached_at: datetime) -> Dict[str, Any]:
+    result.update({"cached": True, "cached_at": cached_at.isoformat(), "duration_seconds": 0.0,
+                   "rows_scanned": 0, "rows_scanned_by_table": {}, "queries": [], "worker": "cache"})
+    return result
+
+def inspect_constraints() -> constraint_catalog.Enforced:
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            enforced = constraint_catalog.enforced_constraints(cur, NOT_NULL_CHECKS, UNIQUE_CHECKS, FOREIGN_KEY_CHECKS)
+        conn.commit()
+    finally:
+        conn.close()
+    return enforced
+
+def reuse_cached_results(tasks: List[Dict[str, Any]], window=None, refresh: bool = False):
+    """Splits tasks into cache hits and tasks to run.
+
+    Returns (tasks to run, cached results, {task name: fingerprint} to store
+    once those tasks have run). A task is a hit when the fingerprints of all
+    its `sources` equal the ones stored with its cached results; `refresh`
+    ignores stored results.
+    """
+    cacheable = [task for task in tasks if task.get("sources")]
+    if not cacheable:
+        return tasks, [], {}
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            result_cache.ensure_cache_table(cur)
+            fingerprints = result_cache.table_fingerprints(cur, [table for task in cacheable for table in task["sources"]])
+            cached = {} if refresh else result_cache.load_cached(cur, [task["name"] for task in cacheable], cache_variant(window))
+        conn.commit()
+    finally:
+        conn.close()
+
+    to_run, hits, pending = [], [], {}
+    for task in tasks:
+        if not task.get("sources"):
+            to_run.append(task)
+            continue
+        # Dấu vân tay lấy trước khi chạy: bảng đổi trong lúc chạy thì lần sau sẽ tính lại
+        fingerprint = result_cache.task_fingerprint(fingerprints, task["sources"])
+        entry = cached.get(task["name"])
+        if (entry and entry["fingerprint"] == fingerprint
+                and [result["check_name"] for result in entry["results"]] == task["check_names"]):
+            hits.extend(cached_result(result, entry["cached_at"]) for result in entry["results"])
+        else:
+            to_run.append(task)
+            pending[task["name"]] = fingerprint
+    return to_run, hits, pending
+
+def store_cached_results(results: List[Dict[str, Any]], pending: Dict[str, Any], window=None):
+    """Caches the results of the tasks in `pending`, unless one of their checks errored."""
+    by_task = {}
+    for result in results:
+        by_task.setdefault(result.get("task"), []).append(
+            {key: value for key, value in result.items() if key not in ("queries", "explain")})
+    entries = {name: {"fingerprint": fingerprint, "results": by_task[name]}
+               for name, fingerprint in pending.items()
+               if name in by_task and all(r.get("status") != "ERROR" for r in by_task[name])}
+    if not entries:
+        return
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            result_cache.save_cached(cur, cache_variant(window), entries)
+        conn.commit()
+    finally:
+        conn.close()
+
+def escalate_estimates(results: List[Dict[str, Any]], workers: int, explain_threshold: float = None,
+                       window=None, shared_intermediates: bool = True) -> List[Dict[str, Any]]:
+    """Re-runs exactly every task holding an estimated check whose interval includes zero.
+
+    Checks that share such a task (e.g. the other NULL columns of its table)
+    get exact results too; the others keep their estimates.
+    """
+    names = set(sampled_checks.checks_to_escalate(results))
+    if not names:
+        return results
+    tasks = [task for task in build_check_tasks(window=window) if names & set(task["check_names"])]
+    print(f"\nEscalating {len(names)} inconclusive estimates to {len(tasks)} exact task(s)...")
+    exact = {}
+    for result in run_checks_concurrently(tasks, workers, explain_threshold, window, shared_intermediates):
+        result['escalated'] = result['check_name'] in names
+        exact[result['check_name']] = result
+    return [exact.get(result['check_name'], result) for result in results]
+
+def log_timestamp() -> str:
+    # Có cả micro giây: các nhóm check của DAG chạy song song và có thể kết thúc trong cùng một giây
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+def write_log_file(results: List[Dict[str, Any]], window=None, log_dir: str = LOG_DIR):
     os.makedirs(log_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file_path = os.path.join(log_dir, f"audit_log_{timestamp}.txt")
+    log_file_path = os.path.join(log_dir, f"audit_log_{log_timestamp()}.txt")
 
     passed_checks = [r for r in results if r.get('status') == 'PASS']
     failed_checks = [r for r in results if r.get('status') != 'PASS']
@@ -45,6 +528,8 @@ def write_log_file(results: List[Dict[str, Any]]):
         f.write(f"Total Checks Executed: {len(results)}\n")
         f.write(f"Passed: {passed_count}\n")
         f.write(f"Failed/Warnings: {failed_count}\n")
+        if window:
+            f.write(f"Date window (partitioned tables): {window[0]} to {window[1]} (exclusive)\n")
         f.write("\n" + "="*80 + "\n\n")
         
         if failed_checks:
@@ -54,10 +539,26 @@ def write_log_file(results: List[Dict[str, Any]]):
                 f.write(f"Status:     {result.get('status', 'ERROR')}\n")
                 f.write(f"Message:    {result.get('message', 'An error occurred.')}\n")
                 if 'failed_count' in result:
-                    f.write(f"Violations: {result.get('failed_count')}\n")
-                if 'failed_records' in result:
-                    records_to_show = result['failed_records'][:5]
-                    f.write(f"Examples:   {records_to_show}\n")
+                    f.write(f"Violations: {'~' if result.get('estimated') else ''}{result.get('failed_count')}\n")
+                if result.get('estimated'):
+                    low, high = result['confidence_interval']
+                    sample = result['sample']
+                    f.write(f"Estimate:   {sampled_checks.CONFIDENCE_LABEL} CI {low}-{high} from a {sample['percent']:g}% sample "
+                            f"({sample['rows']:,} rows in {sample['blocks']:,} blocks)\n")
+                elif result.get('escalated'):
+                    f.write("Sampling:   inconclusive estimate, re-run exactly\n")
+                if result.get('cached'):
+                    f.write(f"Cache:      result of {result['cached_at']} reused (source tables unchanged)\n")
+                if result.get('failed_records'):
+                    records = result['failed_records']
+                    f.write(f"Examples:   {records} (first {len(records)} of {result.get('failed_count', len(records))})\n")
+                if 'scanned_range' in result:
+                    low, high = result['scanned_range']
+                    f.write(f"Range:      IDs ({low}, {high}] (incremental)\n")
+                if 'duration_seconds' in result:
+                    f.write(f"Duration:   {result['duration_seconds']:.3f}s ({result.get('worker')})\n")
+                if 'rows_scanned' in result:
+                    f.write(f"Scanned:    {result['rows_scanned']:,} rows {result.get('rows_scanned_by_table', {})}\n")
                 f.write("-" * 40 + "\n")
             f.write("\n")
 
@@ -67,16 +568,33 @@ def write_log_file(results: List[Dict[str, Any]]):
                 f.write(f"Check Name: {result.get('check_name', 'N/A')}\n")
                 f.write(f"Status:     {result.get('status')}\n")
                 f.write(f"Message:    {result.get('message')}\n")
+                if result.get('estimated'):
+                    f.write(f"Estimate:   {sampled_checks.CONFIDENCE_LABEL} CI {result['confidence_interval'][0]}-"
+                            f"{result['confidence_interval'][1]} from a {result['sample']['percent']:g}% sample\n")
+                elif result.get('escalated'):
+                    f.write("Sampling:   inconclusive estimate, re-run exactly\n")
+                if result.get('cached'):
+                    f.write(f"Cache:      result of {result['cached_at']} reused (source tables unchanged)\n")
+                if result.get('constraint_enforced'):
+                    f.write(f"Constraint: {result['constraint_enforced']} (not scanned)\n")
+                if 'scanned_range' in result:
+                    low, high = result['scanned_range']
+                    f.write(f"Range:      IDs ({low}, {high}] (incremental)\n")
+                if 'duration_seconds' in result:
+                    f.write(f"Duration:   {result['duration_seconds']:.3f}s ({result.get('worker')})\n")
+                if 'rows_scanned' in result:
+                    f.write(f"Scanned:    {result['rows_scanned']:,} rows {result.get('rows_scanned_by_table', {})}\n")
                 f.write("-" * 40 + "\n")
             
     print(f"Detailed audit log saved to: {log_file_path}")
+    return log_file_path
 
 def print_summary_table(results: List[Dict[str, Any]]):
     print("\n" + "="*100)
     print("AUDIT SUMMARY TABLE".center(100))
     print("="*100)
     
-    header = f"| {'STATUS':<8} | {'CHECK NAME':<50} | {'MESSAGE':<30} |"
+    header = f"| {'STATUS':<9} | {'CHECK NAME':<49} | {'MESSAGE':<30} |"
     print(header)
     print("-" * 100)
 
@@ -96,83 +614,260 @@ def print_summary_table(results: List[Dict[str, Any]]):
         if len(message) > 28:
             message = message[:25] + "..."
 
-        row = f"| {status:<8} | {check_name:<50} | {message:<30} |"
+        # Kết quả ước lượng từ mẫu được đánh dấu "~", kết quả lấy từ cache được đánh dấu "="
+        # "+" là PASS do ràng buộc của schema bảo đảm, không quét dữ liệu
+        label = f"~{status}" if result.get('estimated') else (f"={status}" if result.get('cached') else status)
+        if result.get('constraint_enforced'):
+            label = f"+{status}"
+        row = f"| {label:<9} | {check_name:<49} | {message:<30} |"
         print(row)
 
     print("="*100)
     print(f"AUDIT COMPLETE: {passed_count} checks PASSED, {failed_count} checks FAILED/WARNING.")
+    estimated = sum(1 for r in results if r.get('estimated'))
+    if estimated:
+        print(f"~ {estimated} results are ESTIMATED from a TABLESAMPLE sample; confidence intervals are in the log.")
+    enforced = sum(1 for r in results if r.get('constraint_enforced'))
+    if enforced:
+        print(f"+ {enforced} checks are PASS (constraint-enforced): guaranteed by valid schema constraints, not scanned.")
+    cached = sum(1 for r in results if r.get('cached'))
+    if cached:
+        print(f"= {cached} results were REUSED from the result cache: their source tables are unchanged since they were computed.")
     print("="*100)
+    print_slowest_checks(results, SLOWEST_CHECKS_SHOWN)
 
 
-def main():
-    print(f"--- Data Quality Audit Started at {datetime.now()} ---")
-    conn = None
-    all_results = []
+def audit_mode(args) -> str:
+    if args.sample_percent:
+        return f"sampled {args.sample_percent:g}%"
+    return "full rebuild" if args.full_rebuild else ("incremental" if args.incremental else "full")
+
 
+def save_report(results: List[Dict[str, Any]], started_at: datetime, run_info: Dict[str, Any], log_dir: str = LOG_DIR):
+    """Prints the summary, then writes the text log, the JSON report and the history entry of one audit run."""
+    print_summary_table(results)
+    log_file_path = write_log_file(results, run_info["window"], log_dir)
+    write_json_report(results, os.path.splitext(log_file_path)[0] + ".json", run_info)
     try:
-        conn = psycopg2.connect(**CONN_PARAMS)
-        cur = conn.cursor()
-        print("Database connection successful.")
-
-        print("\nRunning configuration-driven checks...")
-
-        # Null checks
-        for table, columns in NOT_NULL_CHECKS.items():
-            for column in columns:
-                check_name = f"check_null_{table}_{column}"
-                result = check_null_values(cur, table, column)
-                result['check_name'] = check_name
-                all_results.append(result)
-
-        # Uniqueness checks
-        for table, columns in UNIQUE_CHECKS.items():
-            for column in columns:
-                check_name = f"check_unique_{table}_{column}"
-                result = check_uniqueness(cur, table, column)
-                result['check_name'] = check_name
-                all_results.append(result)
-        
-        # Foreign key checks
-        for fk_check in FOREIGN_KEY_CHECKS:
-            check_name = f"check_fk_{fk_check['table']}_{fk_check['fk_column']}"
-            result = check_foreign_key_integrity(cur, **fk_check)
-            result['check_name'] = check_name
-            all_results.append(result)
+        audit_history.record_run(results, audit_history.run_id_from_path(log_file_path), started_at,
+                                 run_info["mode"], run_info["wall_seconds"], os.path.basename(log_file_path))
+        print(f"Audit history updated: {audit_history.HISTORY_DB}")
+    except sqlite3.Error as e:
+        # Lịch sử chỉ phục vụ dashboard, không làm hỏng lần audit
+        print(f"Could not update audit history: {e}")
 
-        print("\nRunning custom format and integrity checks...")
-        
-        doc_format_result = check_document_format(cur)
-        doc_format_result['check_name'] = "check_document_format"
-        all_results.append(doc_format_result)
 
-        # Execute risk-based checks ---
-        print("\nRunning risk-based checks...")
+def write_group_report(results: List[Dict[str, Any]], run_info: Dict[str, Any], log_dir: str = LOG_DIR) -> str:
+    """Saves the results of a --group run for merge_group_reports(); the audit log and history are left to the merge."""
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, f"audit_group_{'_'.join(run_info['groups'])}_{log_timestamp()}.json")
+    write_json_report(results, path, run_info)
+    return path
+
+
+def merge_group_reports(paths: List[str], log_dir: str = LOG_DIR) -> bool:
+    """Combines the reports of separately run check groups into one audit log, JSON report and history entry.
+
+    Missing reports (a failed or skipped group) are reported and left out;
+    returns False unless every report was merged.
+    """
+    reports = []
+    for path in paths:
+        if not os.path.isfile(path):
+            print(f"-> Missing group report '{path}' (group failed or was skipped)")
+            continue
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        print(f"-> {', '.join(report['groups'])}: {len(report['checks'])} checks in {report['wall_seconds']}s from {path}")
+        reports.append(report)
+    if not reports:
+        print("No group reports to merge.")
+        return False
+
+    started_at = min(datetime.fromisoformat(report["started_at"]) for report in reports)
+    results = [result for report in reports for result in report["checks"]]
+    save_report(results, started_at, {
+        "started_at": started_at.isoformat(),
+        # Các nhóm chạy song song: thời gian của lần audit là của nhóm chậm nhất
+        "wall_seconds": max(report["wall_seconds"] for report in reports),
+        "workers": sum(report["workers"] for report in reports),
+        "mode": reports[0]["mode"],
+        "explain_threshold_seconds": reports[0]["explain_threshold_seconds"],
+        "window": reports[0]["window"],
+        "groups": [group for report in reports for group in report["groups"]],
+        "cache_hits": sum(report.get("cache_hits", 0) for report in reports),
+        "constraint_enforced": sum(report.get("constraint_enforced", 0) for report in reports),
+    }, log_dir)
+    return len(reports) == len(paths)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run data quality and risk checks against the banking database.")
+    parser.add_argument('--workers', type=int, default=AUDIT_WORKERS,
+                        help="checks run in parallel, each on its own pooled connection (default: %(default)s)")
+    parser.add_argument('--explain-slower-than', type=float, metavar='SECONDS',
+                        default=float(EXPLAIN_THRESHOLD) if EXPLAIN_THRESHOLD else None,
+                        help="capture EXPLAIN (ANALYZE, BUFFERS) for checks at least this slow (re-runs their queries)")
+    parser.add_argument('--no-shared-intermediates', dest='shared_intermediates', action='store_false',
+                        help="let every check compute its intermediate relations inline instead of once per run")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only scan rows of append-only tables added since the last run, merging with cached totals")
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help="with --incremental: discard stored watermarks and recount everything")
+    parser.add_argument('--sample-percent', type=float, metavar='P', default=None,
+                        help="estimate NULL, format and risk checks from TABLESAMPLE SYSTEM (P) with confidence intervals")
+    parser.add_argument('--sample-seed', type=int, default=None, help="REPEATABLE seed for --sample-percent")
+    parser.add_argument('--no-escalate', dest='escalate', action='store_false',
+                        help="with --sample-percent: keep estimates whose interval includes zero instead of re-running them exactly")
+    parser.add_argument('--since', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help="only check Transactions/AuthLogs rows created on or after this date (prunes partitions)")
+    parser.add_argument('--until', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help="only check Transactions/AuthLogs rows created before this date")
+    parser.add_argument('--last-days', type=int, metavar='N',
+                        help="shorthand for --since today-N --until tomorrow")
+    parser.add_argument('--scan-enforced', action='store_true',
+                        help="also scan the data for checks already guaranteed by valid NOT NULL/UNIQUE/FK constraints")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="run every check instead of reusing results whose source tables are unchanged")
+    parser.add_argument('--refresh-cache', action='store_true',
+                        help="run every cacheable check and overwrite its cached result")
+    parser.add_argument('--group', dest='groups', action='append', choices=CHECK_GROUPS,
+                        help="only run this check group (repeatable); writes a group report and prints its path last, "
+                             "for --merge-reports")
+    parser.add_argument('--log-dir', default=LOG_DIR,
+                        help="directory for audit logs and reports (default: $AUDIT_LOG_DIR or %(default)s)")
+    parser.add_argument('--merge-reports', nargs='+', metavar='REPORT',
+                        help="merge group reports into one audit log, JSON report and history entry, then exit")
+    parser.add_argument('--prepare-state', action='store_true',
+                        help="create the audit state and cache tables, then exit; run once before parallel --group runs")
+    args = parser.parse_args(argv)
+    if args.merge_reports and args.groups:
+        parser.error("--merge-reports cannot be combined with --group")
+    if args.prepare_state and (args.merge_reports or args.groups):
+        parser.error("--prepare-state cannot be combined with --merge-reports or --group")
+    if args.full_rebuild:
+        args.incremental = True
+    if args.last_days is not None:
+        args.since = date.today() - timedelta(days=args.last_days)
+        args.until = date.today() + timedelta(days=1)
+    if args.sample_percent is not None:
+        if args.incremental:
+            parser.error("--sample-percent cannot be combined with --incremental")
+        if not 0 < args.sample_percent <= 100:
+            parser.error("--sample-percent must be in (0, 100]")
+    args.window = None
+    if args.since or args.until:
+        if args.incremental:
+            parser.error("a date window cannot be combined with --incremental")
+        args.window = (args.since or date.min, args.until or date.max)
+    return args
+
+def prepare_audit_state():
+    # CREATE TABLE IF NOT EXISTS chạy song song có thể lỗi trùng pg_type: tạo một lần trước khi chia nhóm
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            audit_state.ensure_state_table(cur)
+            result_cache.ensure_cache_table(cur)
+            ensure_refresh_state_table(cur)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def prepare_daily_spend():
+    # Quy tắc >20M ở chế độ full đọc từ bảng tổng hợp, cần làm mới nếu có giao dịch mới
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            if refresh_daily_spend_if_stale(cur):
+                print(f"\nRefreshed {DAILY_SPEND_VIEW} in {time.perf_counter() - started:.2f}s.")
+        conn.commit()
+    finally:
+        conn.close()
 
-        risk_checks_functions = [
-            (check_high_value_txn_strong_auth, "risk_high_value_txn_strong_auth"),
-            (check_untrusted_device_transactions, "risk_untrusted_device_transactions"),
-            (check_daily_total_over_20m_auth, "risk_daily_total_over_20m_auth")
-        ]
 
-        for func, name in risk_checks_functions:
-            result = func(cur)
-            result['check_name'] = name
-            all_results.append(result)
+def main(argv=None) -> bool:
+    args = parse_args(argv)
+    if args.merge_reports:
+        return merge_group_reports(args.merge_reports, args.log_dir)
+    if args.prepare_state:
+        prepare_audit_state()
+        print(f"Audit state tables ready: {audit_state.STATE_TABLE}, {result_cache.CACHE_TABLE}, {REFRESH_STATE_TABLE}")
+        return True
+    started_at = datetime.now()
+    print(f"--- Data Quality Audit Started at {started_at} ---")
+    all_results = []
+    elapsed = 0.0
+
+    try:
+        if args.incremental:
+            prepare_audit_state()
+            mode = "full rebuild" if args.full_rebuild else "incremental"
+            print(f"\nAudit mode: {mode} (state table: {audit_state.STATE_TABLE})")
+        elif not args.groups or "risk" in args.groups:
+            prepare_daily_spend()
+        if args.window:
+            print(f"\nDate window for partitioned tables: {args.window[0]} to {args.window[1]} (exclusive)")
+        if args.sample_percent:
+            print(f"\nSampled mode: TABLESAMPLE SYSTEM ({args.sample_percent:g}), "
+                  f"{'escalating inconclusive estimates' if args.escalate else 'no escalation'}")
+        enforced = None if args.scan_enforced else inspect_constraints()
+        tasks = build_check_tasks(args.incremental, args.full_rebuild, args.window, args.sample_percent,
+                                  args.sample_seed, enforced)
+        if args.groups:
+            tasks = [task for task in tasks if task["group"] in args.groups]
+            print(f"\nCheck groups: {', '.join(args.groups)}")
+        report_order = {name: i for i, name in enumerate(name for task in tasks for name in task["check_names"])}
+        enforced_results = [result for task in tasks if task.get("enforced_by") for result in task["run"](None)]
+        tasks = [task for task in tasks if not task.get("enforced_by")]
+        if enforced is not None:
+            print(f"\nSchema constraints: {len(enforced_results)} checks guaranteed by valid constraints, not scanned.")
+        cached_results, pending = [], {}
+        if args.cache:
+            tasks, cached_results, pending = reuse_cached_results(tasks, args.window, args.refresh_cache)
+            print(f"\nResult cache ({result_cache.CACHE_TABLE}): {len(cached_results)} checks reused, "
+                  f"{len(pending)} cacheable task(s) to run{' (refresh forced)' if args.refresh_cache else ''}.")
+        print(f"\nRunning {len(tasks)} check tasks on {args.workers} worker(s)...")
+        started = time.perf_counter()
+        all_results = run_checks_concurrently(tasks, args.workers, args.explain_slower_than,
+                                              args.window, args.shared_intermediates)
+        if pending:
+            store_cached_results(all_results, pending, args.window)
+        all_results = sorted(enforced_results + cached_results + all_results, key=lambda r: report_order.get(r["check_name"], len(report_order)))
+        if args.sample_percent and args.escalate:
+            all_results = escalate_estimates(all_results, args.workers, args.explain_slower_than,
+                                             args.window, args.shared_intermediates)
+        elapsed = time.perf_counter() - started
+        print(f"All checks finished in {elapsed:.2f}s.")
 
     except psycopg2.Error as e:
         print(f"\n DATABASE ERROR: {e}")
-    finally:
-        if conn:
-            conn.close()
-            print("\nDatabase connection closed.")
 
     # --- 4. Print and save results ---
-    if all_results:
+    if not all_results:
+        print("No checks were executed.")
+        return False
+    run_info = {
+        "started_at": started_at.isoformat(),
+        "wall_seconds": round(elapsed, 4),
+        "workers": args.workers,
+        "mode": audit_mode(args),
+        "explain_threshold_seconds": args.explain_slower_than,
+        "window": list(args.window) if args.window else None,
+        "cache_hits": sum(1 for r in all_results if r.get("cached")),
+        "constraint_enforced": sum(1 for r in all_results if r.get("constraint_enforced")),
+    }
+    if args.groups:
+        run_info["groups"] = args.groups
         print_summary_table(all_results)
-        write_log_file(all_results)
+        # Dòng cuối của stdout là đường dẫn báo cáo (XCom của BashOperator)
+        print(write_group_report(all_results, run_info, args.log_dir))
     else:
-        print("No checks were executed.")
+        save_report(all_results, started_at, run_info, args.log_dir)
+    return True
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(0 if main() else 1)
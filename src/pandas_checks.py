@@ -0,0 +1,321 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+import data_quality_standards as dqs
+from data_quality_standards import (
+    FOREIGN_KEY_CHECKS,
+    NOT_NULL_CHECKS,
+    PRIMARY_KEYS,
+    UNIQUE_CHECKS,
+    daily_total_over_20m_result,
+    document_format_result,
+    foreign_key_result,
+    high_value_txn_strong_auth_result,
+    null_check_result,
+    uniqueness_result,
+    untrusted_device_result,
+)
+from monitoring_audit import (
+    RISK_CHECKS,
+    build_check_tasks,
+    plan_column_checks,
+    prepare_daily_spend,
+    print_summary_table,
+    run_checks_concurrently,
+    write_log_file,
+)
+from parquet_snapshot import export_snapshot, read_snapshot_table
+from risk_rules import STRONG_AUTH_METHODS
+
+# Backend pandas cho các check trong data_quality_standards, chạy trên snapshot Parquet
+# thay vì database chính. Thông điệp kết quả dùng chung các hàm *_result với backend SQL.
+
+# Các trường phải trùng khớp giữa hai backend (mẫu failed_records thì không: SQL lấy mẫu không theo thứ tự)
+PARITY_FIELDS = ('status', 'message', 'failed_count', 'details')
+
+HIGH_VALUE_AMOUNT_CENTS = 10_000_000 * 100
+DAILY_TOTAL_LIMIT_CENTS = 20_000_000 * 100
+INVALID_FORMAT_PATTERNS = {
+    'CCCD': r'\d{12}',
+    'Passport': r'[A-Z]\d{7}',
+}
+
+
+def snapshot_reader(snapshot_dir: str) -> Callable[[str, List[str]], pd.DataFrame]:
+    """Returns `read(table, columns)`, which loads each column from Parquet at most once."""
+    cache: Dict[str, pd.DataFrame] = {}
+
+    def read(table: str, columns: List[str]) -> pd.DataFrame:
+        frame = cache.get(table)
+        missing = [c for c in columns if frame is None or c not in frame.columns]
+        if missing:
+            loaded = read_snapshot_table(snapshot_dir, table, missing)
+            frame = loaded if frame is None else pd.concat([frame, loaded], axis=1)
+            cache[table] = frame
+        return frame[list(columns)]
+    return read
+
+
+def cents(amounts: pd.Series) -> pd.Series:
+    # DECIMAL(18,2) được đọc dưới dạng float64; so sánh ngưỡng và cộng dồn bằng số nguyên (xu) để khớp SQL
+    return (amounts * 100).round().astype('int64')
+
+
+def local_day(timestamps: pd.Series) -> pd.Series:
+    """created_at::date in the snapshot's session time zone."""
+    return timestamps.dt.tz_localize(None).dt.normalize()
+
+
+def sample_keys(frame: pd.DataFrame, key_columns: List[str]) -> List[Any]:
+    """First FAILED_RECORDS_LIMIT keys in key order, shaped like the SQL backend's samples."""
+    limit = dqs.FAILED_RECORDS_LIMIT
+    if limit <= 0 or frame.empty:
+        return []
+    keys = frame[key_columns].sort_values(key_columns).head(limit)
+    rows = [[value.date().isoformat() if isinstance(value, pd.Timestamp) else _plain(value) for value in row]
+            for row in keys.itertuples(index=False)]
+    return [row[0] if len(row) == 1 else row for row in rows]
+
+
+def _plain(value):
+    # numpy scalar -> kiểu Python, NaN -> None để kết quả ghi ra JSON giống backend SQL
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    value = value.item() if hasattr(value, 'item') else value
+    return None if isinstance(value, float) and value != value else value
+
+
+def with_sample(result: Dict[str, Any], violations: pd.DataFrame, key_columns: List[str]) -> Dict[str, Any]:
+    if result.get("failed_count"):
+        result["failed_records"] = sample_keys(violations, key_columns)
+    return result
+
+
+def check_null_values_batch(read, table: str, columns: List[str]) -> Dict[str, Dict[str, Any]]:
+    keys = PRIMARY_KEYS[table]
+    frame = read(table, list(dict.fromkeys(keys + columns)))
+    nulls = frame[columns].isna()
+    counts = nulls.sum()
+    return {
+        column: with_sample(null_check_result(table, column, int(counts[column])), frame[nulls[column]], keys)
+        for column in columns
+    }
+
+
+def check_uniqueness(read, table: str, column: str) -> Dict[str, Any]:
+    keys = PRIMARY_KEYS[table]
+    frame = read(table, list(dict.fromkeys(keys + [column])))
+    # GROUP BY của SQL gom các NULL vào cùng một nhóm
+    counts = frame[column].value_counts(dropna=False)
+    duplicated = counts[counts > 1]
+    result = uniqueness_result(table, column, len(duplicated))
+    if result.get("failed_count") and dqs.FAILED_RECORDS_LIMIT > 0:
+        rows = frame[frame[column].isin(duplicated.index)].sort_values(keys)
+        samples = []
+        for value, group in rows.groupby(column, sort=True, dropna=False):
+            samples.append([_plain(value), [_plain(k) for k in group[keys[0]].head(dqs.DUPLICATE_KEYS_SHOWN)]])
+            if len(samples) >= dqs.FAILED_RECORDS_LIMIT:
+                break
+        result["failed_records"] = samples
+    return result
+
+
+def check_foreign_key_integrity(read, table: str, fk_column: str, parent_table: str, pk_column: str) -> Dict[str, Any]:
+    keys = PRIMARY_KEYS[table]
+    child = read(table, list(dict.fromkeys(keys + [fk_column])))
+    parent_keys = read(parent_table, [pk_column])[pk_column]
+    orphaned = child[child[fk_column].notna() & ~child[fk_column].isin(parent_keys)]
+    result = foreign_key_result(table, fk_column, parent_table, pk_column, len(orphaned))
+    return with_sample(result, orphaned, keys)
+
+
+def check_document_format(read) -> Dict[str, Any]:
+    docs = read('customeridentitydocuments', ['document_id', 'document_type', 'document_number'])
+    invalid = pd.Series(False, index=docs.index)
+    for doc_type, pattern in INVALID_FORMAT_PATTERNS.items():
+        # NULL !~ pattern là NULL trong SQL, tức không bị tính là sai định dạng
+        matches = docs['document_number'].str.fullmatch(pattern, na=True).astype(bool)
+        invalid |= (docs['document_type'] == doc_type) & ~matches
+    return with_sample(document_format_result(int(invalid.sum())), docs[invalid], ['document_id'])
+
+
+def _strongly_authed_transactions(read) -> pd.Series:
+    auth = read('authlogs', ['transaction_id', 'auth_method', 'result'])
+    strong = auth[(auth['result'] == 'success') & auth['auth_method'].isin(STRONG_AUTH_METHODS)]
+    return strong['transaction_id'].dropna().unique()
+
+
+def _completed_transactions(read) -> pd.DataFrame:
+    txns = read('transactions', ['transaction_id', 'source_account_id', 'amount', 'status', 'created_at'])
+    return txns[txns['status'] == 'completed']
+
+
+def check_high_value_txn_strong_auth(read) -> Dict[str, Any]:
+    completed = _completed_transactions(read)
+    high_value = completed[cents(completed['amount']) > HIGH_VALUE_AMOUNT_CENTS]
+    violations = high_value[~high_value['transaction_id'].isin(_strongly_authed_transactions(read))]
+    return with_sample(high_value_txn_strong_auth_result(len(violations)), violations, ['transaction_id'])
+
+
+def check_untrusted_device_transactions(read) -> Dict[str, Any]:
+    txns = read('transactions', ['transaction_id', 'source_account_id', 'device_id', 'status'])
+    accounts = read('accounts', ['account_id', 'customer_id'])
+    links = read('customerdevicelinks', ['customer_id', 'device_id', 'trust_status'])
+    unverified = links[links['trust_status'] == 'unverified'][['customer_id', 'device_id']]
+    matched = (txns.merge(accounts, left_on='source_account_id', right_on='account_id')
+                   .merge(unverified, on=['customer_id', 'device_id'])
+                   .drop_duplicates('transaction_id'))
+    successful = int((matched['status'] == 'completed').sum())
+    return with_sample(untrusted_device_result(len(matched), successful), matched, ['transaction_id'])
+
+
+def check_daily_total_over_20m_auth(read) -> Dict[str, Any]:
+    completed = _completed_transactions(read)
+    accounts = read('accounts', ['account_id', 'customer_id'])
+    daily = completed.merge(accounts, left_on='source_account_id', right_on='account_id')
+    daily = pd.DataFrame({
+        'customer_id': daily['customer_id'],
+        'spend_date': local_day(daily['created_at']),
+        'amount_cents': cents(daily['amount']),
+        'strong_auth': daily['transaction_id'].isin(_strongly_authed_transactions(read)),
+    })
+    per_day = daily.groupby(['customer_id', 'spend_date']).agg(
+        total_cents=('amount_cents', 'sum'), strong_auth=('strong_auth', 'any'),
+    ).reset_index()
+    violations = per_day[(per_day['total_cents'] > DAILY_TOTAL_LIMIT_CENTS) & ~per_day['strong_auth']]
+    return with_sample(daily_total_over_20m_result(len(violations)), violations, ['customer_id', 'spend_date'])
+
+
+PANDAS_RISK_CHECKS = {
+    "risk_high_value_txn_strong_auth": check_high_value_txn_strong_auth,
+    "risk_untrusted_device_transactions": check_untrusted_device_transactions,
+    "risk_daily_total_over_20m_auth": check_daily_total_over_20m_auth,
+}
+
+
+def _timed(task: str, check_names: List[str], run) -> List[Dict[str, Any]]:
+    started = time.perf_counter()
+    results = run()
+    elapsed = round(time.perf_counter() - started, 4)
+    for result, check_name in zip(results, check_names):
+        result['check_name'] = check_name
+        result['duration_seconds'] = elapsed
+        result['task'] = task
+        result['worker'] = 'pandas'
+    return results
+
+
+def run_pandas_checks(snapshot_dir: str) -> List[Dict[str, Any]]:
+    """Evaluates every registered check on a snapshot, in the same order and with the same names as the SQL audit."""
+    read = snapshot_reader(snapshot_dir)
+    results = []
+    for planned in plan_column_checks(NOT_NULL_CHECKS, UNIQUE_CHECKS):
+        table, columns, names = planned["table"], planned["columns"], planned["check_names"]
+        task = f"{planned['kind']}:{table}"
+        if planned["kind"] == "null":
+            results.extend(_timed(task, names, lambda: list(check_null_values_batch(read, table, columns).values())))
+        else:
+            results.extend(_timed(task, names, lambda: [check_uniqueness(read, table, column) for column in columns]))
+    for fk_check in FOREIGN_KEY_CHECKS:
+        check_name = f"check_fk_{fk_check['table']}_{fk_check['fk_column']}"
+        results.extend(_timed(check_name, [check_name], lambda: [check_foreign_key_integrity(read, **fk_check)]))
+    results.extend(_timed("check_document_format", ["check_document_format"], lambda: [check_document_format(read)]))
+    for _, check_name in RISK_CHECKS:
+        results.extend(_timed(check_name, [check_name], lambda: [PANDAS_RISK_CHECKS[check_name](read)]))
+    return results
+
+
+def compare_results(sql_results: List[Dict[str, Any]], pandas_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One entry per check whose parity fields differ (or that only one backend produced)."""
+    by_name = {r['check_name']: r for r in pandas_results}
+    mismatches = []
+    for sql_result in sql_results:
+        pandas_result = by_name.pop(sql_result['check_name'], None)
+        if pandas_result is None:
+            mismatches.append({'check_name': sql_result['check_name'], 'field': 'missing', 'sql': 'present', 'pandas': None})
+            continue
+        for field in PARITY_FIELDS:
+            if sql_result.get(field) != pandas_result.get(field):
+                mismatches.append({'check_name': sql_result['check_name'], 'field': field,
+                                   'sql': sql_result.get(field), 'pandas': pandas_result.get(field)})
+    for check_name in by_name:
+        mismatches.append({'check_name': check_name, 'field': 'missing', 'sql': None, 'pandas': 'present'})
+    return mismatches
+
+
+def audit(args):
+    print(f"--- Snapshot Audit Started at {datetime.now()} ({args.snapshot}) ---")
+    started = time.perf_counter()
+    results = run_pandas_checks(args.snapshot)
+    print(f"All checks finished in {time.perf_counter() - started:.2f}s.")
+    print_summary_table(results)
+    write_log_file(results)
+    return 0
+
+
+def parity(args):
+    """Exports a fresh snapshot (unless --snapshot is given), runs both backends and compares them.
+
+    Run it while nothing writes to the database: the SQL checks read the
+    live tables, the pandas checks read the snapshot.
+    """
+    snapshot_dir = args.snapshot
+    prepare_daily_spend()
+    if snapshot_dir is None:
+        snapshot_dir = args.output
+        export_snapshot(snapshot_dir)
+    print("\nRunning the SQL checks...")
+    started = time.perf_counter()
+    sql_results = run_checks_concurrently(build_check_tasks(), args.workers)
+    sql_seconds = time.perf_counter() - started
+    print("Running the pandas checks...")
+    started = time.perf_counter()
+    pandas_results = run_pandas_checks(snapshot_dir)
+    pandas_seconds = time.perf_counter() - started
+
+    errors = [r['check_name'] for r in sql_results if r.get('status') == 'ERROR']
+    mismatches = compare_results(sql_results, pandas_results)
+    print(f"\n{len(sql_results)} checks: SQL {sql_seconds:.2f}s, pandas {pandas_seconds:.2f}s.")
+    if errors:
+        print(f"SQL checks failed to run: {', '.join(errors)}")
+    if mismatches:
+        print(f"| {'CHECK NAME':<50} | {'FIELD':<12} | {'SQL':<30} | {'PANDAS':<30} |")
+        print("-" * 134)
+        for m in mismatches:
+            print(f"| {m['check_name']:<50} | {m['field']:<12} | {str(m['sql'])[:30]:<30} | {str(m['pandas'])[:30]:<30} |")
+        print(f"\nPARITY FAILED: {len(mismatches)} difference(s).")
+        return 1
+    print("PARITY OK: both backends report identical results.")
+    return 1 if errors else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the data quality checks with pandas over a Parquet snapshot.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    audit_parser = sub.add_parser('audit', help="run every check on a snapshot and write the usual audit log")
+    audit_parser.add_argument('--snapshot', required=True, help="directory written by parquet_snapshot.py")
+    audit_parser.set_defaults(func=audit)
+
+    parity_parser = sub.add_parser('parity', help="compare the pandas backend with the SQL backend")
+    parity_parser.add_argument('--snapshot', default=None, help="use an existing snapshot instead of exporting one")
+    parity_parser.add_argument('--output', default=os.path.join('snapshots', 'parity'),
+                               help="where to export the snapshot when --snapshot is not given")
+    parity_parser.add_argument('--workers', type=int, default=4, help="workers for the SQL checks")
+    parity_parser.set_defaults(func=parity)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from monitoring_audit import CONN_PARAMS
+
+# Xuất snapshot các bảng ra Parquet để chạy audit ngoài database chính (xem pandas_checks.py)
+
+SNAPSHOT_TABLES = [
+    'customers', 'customeridentitydocuments', 'biometricdata', 'accounts', 'devices', 'customerdevicelinks',
+    'transactionlimits', 'dailylimittrackers', 'transactions', 'authlogs', 'risktags',
+]
+MANIFEST_FILE = "manifest.json"
+DEFAULT_CHUNK_SIZE = 100000
+
+
+def arrow_type(data_type: str, precision: Optional[int], scale: Optional[int]) -> pa.DataType:
+    """Arrow type for a PostgreSQL column; enums and other text-like types become strings."""
+    if data_type == 'bigint':
+        return pa.int64()
+    if data_type == 'integer':
+        return pa.int32()
+    if data_type == 'numeric':
+        # numeric không giới hạn độ chính xác không có kiểu decimal cố định tương ứng
+        return pa.decimal128(precision, scale or 0) if precision else pa.float64()
+    if data_type == 'boolean':
+        return pa.bool_()
+    if data_type == 'date':
+        return pa.date32()
+    if data_type == 'timestamp with time zone':
+        return pa.timestamp('us', tz='UTC')
+    if data_type == 'timestamp without time zone':
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def table_schema(cur, table: str) -> pa.Schema:
+    cur.execute("""
+        SELECT column_name, data_type, numeric_precision, numeric_scale
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        ORDER BY ordinal_position;
+    """, (table,))
+    return pa.schema([pa.field(name, arrow_type(data_type, precision, scale))
+                      for name, data_type, precision, scale in cur.fetchall()])
+
+
+def export_table(conn, table: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Streams one table into a Parquet file, one row group per chunk."""
+    with conn.cursor() as cur:
+        schema = table_schema(cur, table)
+    rows_written = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        # Con trỏ phía server: chỉ giữ một chunk trong bộ nhớ
+        with conn.cursor(name=f"snapshot_{table}") as cur:
+            cur.itersize = chunk_size
+            cur.execute(f"SELECT {', '.join(schema.names)} FROM {table};")
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                rows_written += len(rows)
+        if rows_written == 0:
+            writer.write_table(schema.empty_table())
+    return rows_written
+
+
+def export_snapshot(output_dir: str, tables: List[str] = SNAPSHOT_TABLES,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Exports every table from one REPEATABLE READ transaction, so the files are mutually consistent."""
+    os.makedirs(output_dir, exist_ok=True)
+    conn = psycopg2.connect(**CONN_PARAMS)
+    conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    manifest = {'exported_at': datetime.now().isoformat(timespec='seconds'), 'tables': {}}
+    try:
+        with conn.cursor() as cur:
+            # Các check theo ngày (created_at::date) phụ thuộc múi giờ của phiên
+            cur.execute("SHOW TimeZone;")
+            manifest['timezone'] = cur.fetchone()[0]
+            cur.execute("SELECT current_database();")
+            manifest['database'] = cur.fetchone()[0]
+        for table in tables:
+            started = time.perf_counter()
+            path = os.path.join(output_dir, f"{table}.parquet")
+            rows = export_table(conn, table, path, chunk_size)
+            elapsed = time.perf_counter() - started
+            manifest['tables'][table] = {'rows': rows, 'file': os.path.basename(path)}
+            print(f"-> {table}: {rows:,} rows in {elapsed:.2f}s")
+        conn.commit()
+    finally:
+        conn.close()
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(snapshot_dir: str) -> Dict[str, Any]:
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_snapshot_table(snapshot_dir: str, table: str, columns: Optional[List[str]] = None):
+    """Reads (some columns of) one table as a DataFrame.
+
+    Decimals become float64 and timestamps are converted to the exporting
+    session's time zone, matching what created_at::date means in SQL.
+    """
+    arrow_table = pq.read_table(os.path.join(snapshot_dir, f"{table}.parquet"), columns=columns)
+    timezone = load_manifest(snapshot_dir).get('timezone', 'UTC')
+    fields = []
+    for field in arrow_table.schema:
+        if pa.types.is_decimal(field.type):
+            field = field.with_type(pa.float64())
+        fields.append(field)
+    frame = arrow_table.cast(pa.schema(fields)).to_pandas()
+    for field in arrow_table.schema:
+        if pa.types.is_timestamp(field.type) and field.type.tz is not None:
+            frame[field.name] = frame[field.name].dt.tz_convert(timezone)
+    return frame
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the banking tables to a Parquet snapshot.")
+    parser.add_argument('--output', required=True, help="snapshot directory")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows per fetch and Parquet row group")
+    parser.add_argument('--tables', default=",".join(SNAPSHOT_TABLES), help="comma separated tables to export")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tables = [table.strip() for table in args.tables.split(',') if table.strip()]
+    print(f"Exporting {len(tables)} tables to {args.output}...")
+    manifest = export_snapshot(args.output, tables, args.chunk_size)
+    total = sum(entry['rows'] for entry in manifest['tables'].values())
+    print(f"Snapshot written: {total:,} rows (time zone {manifest['timezone']}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import re
+from datetime import date
+from typing import List, Tuple
+
+import psycopg2
+
+import audit_state
+from daily_spend import refresh_daily_spend
+from data_quality_standards import PARTITIONED_TABLES
+from monitoring_audit import CONN_PARAMS
+
+# Quản lý phân vùng theo tháng của Transactions/AuthLogs: tạo trước, liệt kê, tách/lưu trữ
+ARCHIVE_SCHEMA = "archive"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def ensure_partitions(cur, months_back: int, months_ahead: int):
+    this_month = date.today().replace(day=1)
+    start, end = add_months(this_month, -months_back), add_months(this_month, months_ahead)
+    for table in PARTITIONED_TABLES:
+        cur.execute("SELECT create_monthly_partitions(%s, %s, %s);", (table, start, end))
+        print(f"{table}: {cur.fetchone()[0]} partition(s) created for {start:%Y-%m}..{end:%Y-%m}.")
+
+
+def monthly_partitions(cur, table: str) -> List[Tuple[str, date, int]]:
+    """(partition, month, estimated rows) for every attached monthly partition of `table`."""
+    cur.execute("""
+        SELECT c.relname, GREATEST(c.reltuples, 0)::bigint
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+        ORDER BY c.relname;
+    """, (table,))
+    pattern = re.compile(rf"^{table}_(\d{{4}})_(\d{{2}})$")
+    partitions = []
+    for name, rows in cur.fetchall():
+        match = pattern.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1), rows))
+    return partitions
+
+
+def list_partitions(cur):
+    print(f"| {'TABLE':<14} | {'PARTITION':<24} | {'MONTH':<7} | {'EST. ROWS':>12} |")
+    print("-" * 70)
+    for table in PARTITIONED_TABLES:
+        for name, month, rows in monthly_partitions(cur, table):
+            print(f"| {table:<14} | {name:<24} | {month:%Y-%m} | {rows:>12,} |")
+
+
+def archive_dependent_rows(cur, table: str, partition: str, archive_schema: str, drop: bool,
+                           kept_from: date = None) -> int:
+    """Moves (or deletes) the `table` rows pointing at a detached Transactions partition.
+
+    RiskTags.transaction_id and AuthLogs.transaction_id are not constraints,
+    so without this the rows would be reported as orphans. Auth logs are
+    written seconds after their transaction and can land in the next month;
+    `kept_from` limits the move to those still-attached rows, the rest leave
+    with their own partition.
+    """
+    kept_sql, params = (" AND r.created_at >= %s", (kept_from,)) if kept_from else ("", ())
+    moved_sql = f"""
+        DELETE FROM {table} r USING {partition} t
+        WHERE r.transaction_id = t.transaction_id{kept_sql}
+    """
+    if drop:
+        cur.execute(moved_sql, params or None)
+        return cur.rowcount
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {archive_schema}.{table} (LIKE public.{table});")
+    cur.execute(f"""
+        WITH moved AS ({moved_sql} RETURNING r.*)
+        INSERT INTO {archive_schema}.{table} SELECT * FROM moved;
+    """, params or None)
+    return cur.rowcount
+
+
+def detach_partitions(cur, before: date, archive_schema: str = ARCHIVE_SCHEMA, drop: bool = False,
+                      dry_run: bool = False) -> List[str]:
+    """Detaches every monthly partition older than `before`, then archives or drops it.
+
+    Uses DETACH PARTITION ... CONCURRENTLY, so the connection must be in
+    autocommit mode; the partitions themselves are never bulk-deleted. Cached
+    incremental audit totals and the daily spend rollup still include the
+    detached rows, so the audit state is reset and the rollup refreshed.
+    """
+    detached = []
+    if not drop and not dry_run:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {archive_schema};")
+    for table in PARTITIONED_TABLES:
+        for name, month, rows in monthly_partitions(cur, table):
+            if month >= before:
+                continue
+            action = "drop" if drop else f"move to {archive_schema}"
+            print(f"{'[dry run] ' if dry_run else ''}Detaching {name} (~{rows:,} rows) and {action}...")
+            if dry_run:
+                continue
+            cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name} CONCURRENTLY;")
+            if table == 'transactions':
+                risk_tags = archive_dependent_rows(cur, 'risktags', name, archive_schema, drop)
+                # AuthLogs chưa tách tới lượt; chỉ chuyển các log đã rơi sang tháng được giữ lại
+                auth_logs = archive_dependent_rows(cur, 'authlogs', name, archive_schema, drop, kept_from=before)
+                print(f"-> {'Deleted' if drop else 'Archived'} {risk_tags:,} risk tags and "
+                      f"{auth_logs:,} later auth logs of {name}.")
+            if drop:
+                cur.execute(f"DROP TABLE {name};")
+            else:
+                cur.execute(f"ALTER TABLE {name} SET SCHEMA {archive_schema};")
+            detached.append(name)
+    if detached:
+        audit_state.reset_state(cur)
+        # Bảng tổng hợp theo ngày vẫn còn chứa các giao dịch đã tách
+        refresh_daily_spend(cur)
+    return detached
+
+
+def parse_month(value: str) -> date:
+    try:
+        return date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got '{value}'")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of Transactions and AuthLogs.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ensure = sub.add_parser('ensure', help="create missing monthly partitions around the current month")
+    ensure.add_argument('--months-back', type=int, default=1)
+    ensure.add_argument('--months-ahead', type=int, default=3)
+
+    sub.add_parser('list', help="list monthly partitions with estimated row counts")
+
+    detach = sub.add_parser('detach', help="detach partitions older than a month and archive or drop them")
+    detach.add_argument('--before', type=parse_month, required=True, metavar='YYYY-MM',
+                        help="detach partitions for months strictly before this one")
+    detach.add_argument('--archive-schema', default=ARCHIVE_SCHEMA, help="schema detached partitions are moved to")
+    detach.add_argument('--drop', action='store_true', help="drop detached partitions instead of archiving them")
+    detach.add_argument('--dry-run', action='store_true', help="only print what would be detached")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    conn = psycopg2.connect(**CONN_PARAMS)
+    # DETACH ... CONCURRENTLY không chạy được trong transaction block
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            if args.command == 'ensure':
+                ensure_partitions(cur, args.months_back, args.months_ahead)
+            elif args.command == 'list':
+                list_partitions(cur)
+            else:
+                detached = detach_partitions(cur, args.before, args.archive_schema, args.drop, args.dry_run)
+                print(f"{len(detached)} partition(s) detached.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import json
+from functools import partial
+from typing import Any, Dict, List
+
+from psycopg2.extras import Json
+
+# Cache kết quả check: dùng lại kết quả lần trước khi các bảng nguồn không đổi.
+# Dấu vân tay của một bảng = bộ đếm insert/update/delete trong pg_stat_user_tables cộng với relfilenode
+# (TRUNCATE và REFRESH MATERIALIZED VIEW đổi relfilenode mà không tăng bộ đếm), gộp trên mọi phân vùng.
+CACHE_TABLE = "audit_result_cache"
+
+Fingerprint = Dict[str, List[Any]]
+
+
+def ensure_cache_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CACHE_TABLE} (
+            task_name VARCHAR(150) NOT NULL,
+            variant VARCHAR(100) NOT NULL,
+            fingerprint JSONB NOT NULL,
+            results JSONB NOT NULL,
+            cached_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (task_name, variant)
+        );
+    """)
+
+
+def table_fingerprints(cur, tables: List[str]) -> Dict[str, List[Any]]:
+    """Returns {table: [inserts, updates, deletes, relfilenodes]} summed over the table's partition tree.
+
+    Counters of another session only become visible once it has reported
+    its statistics (at the latest when its connection closes), so the
+    audit should not overlap a running load.
+    """
+    cur.execute("""
+        SELECT t.name,
+               COALESCE(SUM(s.n_tup_ins), 0),
+               COALESCE(SUM(s.n_tup_upd), 0),
+               COALESCE(SUM(s.n_tup_del), 0),
+               string_agg(c.relfilenode::text, ',' ORDER BY c.oid)
+        FROM unnest(%s::text[]) AS t(name)
+        CROSS JOIN LATERAL (
+            -- Bảng thường là chính nó, bảng phân vùng là các phân vùng lá
+            SELECT t.name::regclass AS relid WHERE (SELECT relkind FROM pg_class WHERE oid = t.name::regclass) <> 'p'
+            UNION ALL
+            SELECT relid FROM pg_partition_tree(t.name::regclass) WHERE isleaf
+        ) p
+        JOIN pg_class c ON c.oid = p.relid
+        LEFT JOIN pg_stat_user_tables s ON s.relid = p.relid
+        GROUP BY t.name;
+    """, (sorted(set(tables)),))
+    return {name: [int(ins), int(upd), int(dels), filenodes] for name, ins, upd, dels, filenodes in cur.fetchall()}
+
+
+def task_fingerprint(fingerprints: Dict[str, List[Any]], sources: List[str]) -> Fingerprint:
+    return {table: fingerprints.get(table) for table in sorted(sources)}
+
+
+def load_cached(cur, task_names: List[str], variant: str) -> Dict[str, Dict[str, Any]]:
+    cur.execute(
+        f"SELECT task_name, fingerprint, results, cached_at FROM {CACHE_TABLE} WHERE variant = %s AND task_name = ANY(%s);",
+        (variant, list(task_names)),
+    )
+    return {name: {"fingerprint": fingerprint, "results": results, "cached_at": cached_at}
+            for name, fingerprint, results, cached_at in cur.fetchall()}
+
+
+def save_cached(cur, variant: str, entries: Dict[str, Dict[str, Any]]):
+    """Stores {task_name: {"fingerprint", "results"}}, replacing older entries of the same variant."""
+    # Mẫu bản ghi vi phạm có thể chứa date/Decimal
+    dumps = partial(json.dumps, default=str)
+    for task_name, entry in entries.items():
+        cur.execute(f"""
+            INSERT INTO {CACHE_TABLE} (task_name, variant, fingerprint, results, cached_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (task_name, variant) DO UPDATE
+            SET fingerprint = EXCLUDED.fingerprint,
+                results = EXCLUDED.results,
+                cached_at = EXCLUDED.cached_at;
+        """, (task_name, variant, Json(entry["fingerprint"], dumps=dumps), Json(entry["results"], dumps=dumps)))
+
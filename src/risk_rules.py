@@ -0,0 +1,91 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple
+
+# Quy tắc dùng chung cho việc sinh dữ liệu và đánh giá rủi ro theo luồng
+
+# Giờ bất thường và ranh giới ngày tính theo giờ Việt Nam. Mọi kết nối đặt session time zone này
+# (xem CONN_PARAMS) để EXTRACT(HOUR)/::date trong SQL khớp với Python; datetime naive được coi là giờ này.
+BUSINESS_TIMEZONE = 'Asia/Ho_Chi_Minh'
+# Việt Nam không có giờ mùa hè nên độ lệch cố định
+BUSINESS_TZINFO = timezone(timedelta(hours=7), BUSINESS_TIMEZONE)
+
+STRONG_AUTH_METHODS = ('sms_otp', 'soft_otp', 'biometric_faceid')
+STRONG_AUTH_CATEGORIES = ('C', 'D')
+UNUSUAL_HOURS = range(0, 6)
+FAILED_AUTH_THRESHOLD = 3
+
+TAG_UNVERIFIED_DEVICE = 'UNVERIFIED_DEVICE'
+TAG_MULTIPLE_FAILED_AUTHENTICATIONS = 'MULTIPLE_FAILED_AUTHENTICATIONS'
+TAG_UNUSUAL_TRANSACTION_TIME = 'UNUSUAL_TRANSACTION_TIME'
+TAG_NEW_DEVICE_SUCCESSFUL_TRANSACTION = 'NEW_DEVICE_SUCCESSFUL_TRANSACTION'
+
+TrackerKey = Tuple[int, object, str]
+
+
+def transaction_type_group(transaction_type: str) -> str:
+    if transaction_type == 'P2P_TRANSFER':
+        return 'NHOM_I.3'
+    if transaction_type == 'BILL_PAYMENT':
+        return 'NHOM_I.2'
+    return 'NHOM_I.1'
+
+
+def business_time(value: datetime) -> datetime:
+    """Naive wall-clock time in BUSINESS_TIMEZONE; a naive `value` is assumed to be in it already."""
+    return value.astimezone(BUSINESS_TZINFO).replace(tzinfo=None) if value.tzinfo else value
+
+
+def auth_log_rows(customer_id: int, device_id: int, txn_id: int, status: str, reg_cat: str,
+                  created_at: datetime, rng=random) -> List[tuple]:
+    """Auth log rows (customer_id, device_id, transaction_id, auth_method, result, created_at) for one transaction."""
+    result = 'success' if status == 'completed' else 'failure'
+
+    if reg_cat in ('A', 'B'):
+        auth_method = rng.choice(['sms_otp', 'device_biometric'])
+        return [(customer_id, device_id, txn_id, auth_method, result, created_at + timedelta(seconds=2))]
+    if reg_cat == 'C':
+        return [(customer_id, device_id, txn_id, 'biometric_faceid', result, created_at + timedelta(seconds=2))]
+    if reg_cat == 'D':
+        return [
+            (customer_id, device_id, txn_id, 'biometric_faceid', result, created_at + timedelta(seconds=2)),
+            (customer_id, device_id, txn_id, 'soft_otp', result, created_at + timedelta(seconds=4)),
+        ]
+    return []
+
+
+def transaction_risk_tags(device_unverified: bool, status: str, created_at: datetime) -> List[str]:
+    tags = []
+    if device_unverified:
+        tags.append(TAG_UNVERIFIED_DEVICE)
+    if business_time(created_at).hour in UNUSUAL_HOURS:
+        tags.append(TAG_UNUSUAL_TRANSACTION_TIME)
+    if device_unverified and status == 'completed':
+        tags.append(TAG_NEW_DEVICE_SUCCESSFUL_TRANSACTION)
+    return tags
+
+
+def failed_auth_risk_tags(failure_count: int) -> List[str]:
+    return [TAG_MULTIPLE_FAILED_AUTHENTICATIONS] if failure_count >= FAILED_AUTH_THRESHOLD else []
+
+
+def add_to_daily_totals(totals: Dict[TrackerKey, Dict[str, float]], customer_id: int, created_at: datetime,
+                        transaction_type: str, amount: float, reg_cat: str):
+    """Adds one completed transaction to the T/Tksth aggregator.
+
+    Transactions of the same customer must be added in created_at order:
+    Tksth restarts from zero after every transaction that required strong auth.
+    """
+    key = (customer_id, business_time(created_at).date(), transaction_type_group(transaction_type))
+    entry = totals.setdefault(key, {'T': 0.0, 'Tksth': 0.0})
+    amount = round(amount, 2)
+    entry['T'] += amount
+    entry['Tksth'] += amount
+    if reg_cat in STRONG_AUTH_CATEGORIES:
+        entry['Tksth'] = 0.0
+
+
+def daily_limit_tracker_rows(totals: Dict[TrackerKey, Dict[str, float]]) -> Iterable[tuple]:
+    """Rows (customer_id, transaction_type_group, total_daily_amount, running_total_amount, tracking_date)."""
+    for (customer_id, tracking_date, group), values in totals.items():
+        yield (customer_id, group, round(values['T'], 2), round(values['Tksth'], 2), tracking_date)
@@ -0,0 +1,419 @@
+import argparse
+import json
+import os
+import select
+import sys
+import time
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import psycopg2
+
+from bulk_loader import load_chunk
+from monitoring_audit import CONN_PARAMS
+from risk_rules import (
+    FAILED_AUTH_THRESHOLD,
+    add_to_daily_totals,
+    failed_auth_risk_tags,
+    transaction_risk_tags,
+)
+
+# Engine rủi ro theo luồng: xử lý từng sự kiện giao dịch/xác thực ngay khi đến,
+# dùng chung quy tắc với generator (risk_rules), giữ trạng thái gọn theo khách hàng
+
+STREAM_CHANNEL = "risk_events"
+TRIGGERS_SQL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'risk_stream_triggers.sql')
+RISK_TAG_COLUMNS = ['customer_id', 'transaction_id', 'tag_type', 'description']
+
+# Auth log đến vài giây sau giao dịch; bộ đếm thất bại quá thời hạn này (theo thời gian sự kiện) bị xoá
+AUTH_COUNTER_TTL = timedelta(minutes=10)
+# Giữ tổng T/Tksth của hôm nay và hôm qua (cho các sự kiện đến muộn)
+DAILY_TOTAL_DAYS_KEPT = 2
+DEFAULT_BATCH_SIZE = 1000
+REPORT_EVERY_SECONDS = 5.0
+
+
+def new_stream_state() -> Dict[str, Any]:
+    return {
+        # customer_id -> {device_id chưa xác minh}; chỉ giữ thiết bị unverified
+        'unverified_devices': {},
+        # transaction_id -> [số lần xác thực thất bại, thời điểm sự kiện đầu tiên], theo thứ tự đến
+        'failed_auths': OrderedDict(),
+        # (customer_id, ngày, nhóm giao dịch) -> {'T', 'Tksth'}
+        'daily_totals': {},
+        'watermark': None,
+    }
+
+
+def load_device_index(cur, state: Dict[str, Any]) -> int:
+    cur.execute("SELECT customer_id, device_id FROM CustomerDeviceLinks WHERE trust_status = 'unverified';")
+    count = 0
+    for customer_id, device_id in cur:
+        state['unverified_devices'].setdefault(customer_id, set()).add(device_id)
+        count += 1
+    return count
+
+
+def apply_device_link(state: Dict[str, Any], event: Dict[str, Any]):
+    customer_id, device_id = event['customer_id'], event['device_id']
+    devices = state['unverified_devices']
+    if event['trust_status'] == 'unverified':
+        devices.setdefault(customer_id, set()).add(device_id)
+    elif device_id in devices.get(customer_id, ()):
+        devices[customer_id].discard(device_id)
+        if not devices[customer_id]:
+            del devices[customer_id]
+
+
+def advance_watermark(state: Dict[str, Any], event_time: datetime):
+    """Moves event time forward and drops state that can no longer change."""
+    previous = state['watermark']
+    if previous is not None and event_time <= previous:
+        return
+    state['watermark'] = event_time
+
+    failed_auths = state['failed_auths']
+    while failed_auths:
+        _, (_, first_seen) = next(iter(failed_auths.items()))
+        if first_seen >= event_time - AUTH_COUNTER_TTL:
+            break
+        failed_auths.popitem(last=False)
+
+    if previous is None or event_time.date() != previous.date():
+        oldest_kept = event_time.date() - timedelta(days=DAILY_TOTAL_DAYS_KEPT - 1)
+        totals = state['daily_totals']
+        for key in [key for key in totals if key[1] < oldest_kept]:
+            del totals[key]
+
+
+def _tag(event: Dict[str, Any], tag_type: str) -> Dict[str, Any]:
+    return {
+        'customer_id': event['customer_id'],
+        'transaction_id': event['transaction_id'],
+        'tag_type': tag_type,
+        'event_time': event['created_at'],
+    }
+
+
+def handle_transaction(state: Dict[str, Any], event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    customer_id = event['customer_id']
+    device_unverified = event['device_id'] in state['unverified_devices'].get(customer_id, ())
+    tags = transaction_risk_tags(device_unverified, event['status'], event['created_at'])
+    if event['status'] == 'completed':
+        add_to_daily_totals(state['daily_totals'], customer_id, event['created_at'], event['transaction_type'],
+                            float(event['amount']), event.get('regulation_category'))
+    return [_tag(event, tag) for tag in tags]
+
+
+def handle_auth(state: Dict[str, Any], event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if event['result'] != 'failure' or event.get('transaction_id') is None:
+        return []
+    counter = state['failed_auths'].setdefault(event['transaction_id'], [0, event['created_at']])
+    counter[0] += 1
+    # Chỉ phát thẻ đúng một lần, khi vừa chạm ngưỡng
+    if counter[0] != FAILED_AUTH_THRESHOLD:
+        return []
+    return [_tag(event, tag) for tag in failed_auth_risk_tags(counter[0])]
+
+
+def parse_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    if isinstance(event.get('created_at'), str):
+        event['created_at'] = datetime.fromisoformat(event['created_at'])
+    return event
+
+
+def handle_event(state: Dict[str, Any], event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Applies one event to the state and returns the risk tags it triggers, if any."""
+    event = parse_event(event)
+    kind = event['type']
+    if kind == 'device_link':
+        apply_device_link(state, event)
+        return []
+    advance_watermark(state, event['created_at'])
+    if kind == 'transaction':
+        return handle_transaction(state, event)
+    if kind == 'auth':
+        return handle_auth(state, event)
+    raise ValueError(f"unknown event type '{kind}'")
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def state_summary(state: Dict[str, Any]) -> Dict[str, int]:
+    return {
+        'customers_with_unverified_devices': len(state['unverified_devices']),
+        'open_failed_auth_counters': len(state['failed_auths']),
+        'daily_total_keys': len(state['daily_totals']),
+        'bytes': deep_sizeof(state),
+    }
+
+
+def new_stream_stats() -> Dict[str, Any]:
+    return {'events': 0, 'events_by_type': Counter(), 'tags': Counter(), 'started': time.perf_counter(),
+            'latency_total': 0.0, 'latency_max': 0.0}
+
+
+def process_batch(state, stats, events: Iterable[Dict[str, Any]], received: float) -> List[Dict[str, Any]]:
+    """Handles a micro-batch; latency is measured from when the batch was received to each event's tags."""
+    tags = []
+    for event in events:
+        event_tags = handle_event(state, event)
+        latency = time.perf_counter() - received
+        stats['events'] += 1
+        stats['events_by_type'][event['type']] += 1
+        stats['latency_total'] += latency
+        stats['latency_max'] = max(stats['latency_max'], latency)
+        for tag in event_tags:
+            stats['tags'][tag['tag_type']] += 1
+        tags.extend(event_tags)
+    return tags
+
+
+def print_stream_stats(state, stats, final: bool = False):
+    elapsed = time.perf_counter() - stats['started']
+    events = stats['events']
+    rate = events / elapsed if elapsed > 0 else 0.0
+    avg_ms = stats['latency_total'] / events * 1000 if events else 0.0
+    summary = state_summary(state)
+    print(f"{'Finished: ' if final else ''}{events:,} events in {elapsed:.1f}s ({rate:,.0f} events/s), "
+          f"{sum(stats['tags'].values()):,} tags, latency avg {avg_ms:.3f} ms / max {stats['latency_max'] * 1000:.3f} ms, "
+          f"state {summary['bytes'] / 1024:,.1f} KB")
+    if final:
+        print(f"Events by type: {dict(stats['events_by_type'])}")
+        print(f"Tags by type: {dict(stats['tags'])}")
+        print(f"State: {summary['customers_with_unverified_devices']:,} customers with unverified devices, "
+              f"{summary['open_failed_auth_counters']:,} open failed-auth counters, "
+              f"{summary['daily_total_keys']:,} daily T/Tksth keys")
+
+
+def open_tag_output(path: Optional[str]):
+    if path == '-':
+        return sys.stdout
+    return open(path, 'w', encoding='utf-8') if path else None
+
+
+def close_tag_output(output):
+    if output is not None and output is not sys.stdout:
+        output.close()
+
+
+def write_tags(tags: List[Dict[str, Any]], output=None, conn=None):
+    """Writes emitted tags as JSONL to `output` and/or inserts them into RiskTags through `conn`."""
+    if not tags:
+        return
+    if output is not None:
+        for tag in tags:
+            output.write(json.dumps(tag, default=str) + "\n")
+        output.flush()
+    if conn is not None:
+        with conn.cursor() as cur:
+            load_chunk(cur, 'RiskTags', RISK_TAG_COLUMNS,
+                       [(t['customer_id'], t['transaction_id'], t['tag_type'], None) for t in tags])
+        conn.commit()
+
+
+def iter_jsonl_batches(path: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    with open(path, encoding='utf-8') as f:
+        batch = []
+        for line in f:
+            line = line.strip()
+            if line:
+                batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def replay(args):
+    state, stats = new_stream_state(), new_stream_stats()
+    conn = psycopg2.connect(**CONN_PARAMS) if args.load_devices or args.write_db else None
+    try:
+        if args.load_devices:
+            with conn.cursor() as cur:
+                print(f"Loaded {load_device_index(cur, state):,} unverified device links.")
+            conn.commit()
+        output = open_tag_output(args.tags_output)
+        try:
+            last_report = time.perf_counter()
+            for batch in iter_jsonl_batches(args.file, args.batch_size):
+                write_tags(process_batch(state, stats, batch, time.perf_counter()), output,
+                           conn if args.write_db else None)
+                if time.perf_counter() - last_report >= args.report_every:
+                    print_stream_stats(state, stats)
+                    last_report = time.perf_counter()
+        finally:
+            close_tag_output(output)
+    finally:
+        if conn:
+            conn.close()
+    print_stream_stats(state, stats, final=True)
+
+
+def listen(args):
+    """Consumes NOTIFY payloads from the risk_stream triggers; each wake-up drains one micro-batch."""
+    state, stats = new_stream_state(), new_stream_stats()
+    conn = psycopg2.connect(**CONN_PARAMS)
+    conn.autocommit = True
+    sink_conn = psycopg2.connect(**CONN_PARAMS) if args.write_db else None
+    output = open_tag_output(args.tags_output)
+    try:
+        with conn.cursor() as cur:
+            print(f"Loaded {load_device_index(cur, state):,} unverified device links.")
+            cur.execute(f"LISTEN {STREAM_CHANNEL};")
+        print(f"Listening on channel '{STREAM_CHANNEL}' (Ctrl+C to stop)...")
+        deadline = time.perf_counter() + args.duration if args.duration else None
+        last_report = time.perf_counter()
+        while deadline is None or time.perf_counter() < deadline:
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            received = time.perf_counter()
+            events = [json.loads(notify.payload) for notify in conn.notifies]
+            conn.notifies.clear()
+            write_tags(process_batch(state, stats, events, received), output, sink_conn)
+            if time.perf_counter() - last_report >= args.report_every:
+                print_stream_stats(state, stats)
+                last_report = time.perf_counter()
+            if args.max_events and stats['events'] >= args.max_events:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_tag_output(output)
+        conn.close()
+        if sink_conn:
+            sink_conn.close()
+    print_stream_stats(state, stats, final=True)
+
+
+def export_events(args):
+    """Writes device links, transactions and auth logs as a created_at-ordered JSONL replay file."""
+    conn = psycopg2.connect(**CONN_PARAMS)
+    written = 0
+    since_sql, params = (" AND created_at >= %(since)s", {'since': args.since}) if args.since else ("", {})
+    try:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            with conn.cursor() as cur:
+                cur.execute("SELECT customer_id, device_id FROM CustomerDeviceLinks WHERE trust_status = 'unverified';")
+                for customer_id, device_id in cur:
+                    f.write(json.dumps({'type': 'device_link', 'customer_id': customer_id, 'device_id': device_id,
+                                        'trust_status': 'unverified'}) + "\n")
+                    written += 1
+            # Con trỏ phía server: không giữ toàn bộ sự kiện trong bộ nhớ
+            with conn.cursor(name="risk_stream_export") as cur:
+                cur.itersize = 10000
+                cur.execute(f"""
+                    SELECT * FROM (
+                        SELECT 0 AS seq, t.transaction_id, a.customer_id, t.device_id, t.created_at,
+                               t.transaction_type, t.amount, t.status::text, t.regulation_category::text,
+                               NULL AS auth_method, NULL AS result
+                        FROM Transactions t
+                        JOIN Accounts a ON a.account_id = t.source_account_id
+                        WHERE TRUE{since_sql.replace('created_at', 't.created_at')}
+                        UNION ALL
+                        SELECT 1, transaction_id, customer_id, device_id, created_at,
+                               NULL, NULL, NULL, NULL, auth_method::text, result::text
+                        FROM AuthLogs
+                        WHERE TRUE{since_sql}
+                    ) events
+                    ORDER BY created_at, seq, transaction_id;
+                """, params or None)
+                for seq, txn_id, customer_id, device_id, created_at, txn_type, amount, status, reg_cat, method, result in cur:
+                    event = {'type': 'transaction' if seq == 0 else 'auth', 'transaction_id': txn_id,
+                             'customer_id': customer_id, 'device_id': device_id,
+                             # Giờ địa phương của phiên, giống payload của trigger
+                             'created_at': created_at.replace(tzinfo=None).isoformat(timespec='microseconds')}
+                    if seq == 0:
+                        event.update(transaction_type=txn_type, amount=float(amount), status=status,
+                                     regulation_category=reg_cat)
+                    else:
+                        event.update(auth_method=method, result=result)
+                    f.write(json.dumps(event) + "\n")
+                    written += 1
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Wrote {written:,} events to {args.output}")
+
+
+def install_triggers(args):
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with open(TRIGGERS_SQL, encoding='utf-8') as f, conn.cursor() as cur:
+            cur.execute(f.read())
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Installed NOTIFY triggers on Transactions, AuthLogs and CustomerDeviceLinks (channel '{STREAM_CHANNEL}').")
+
+
+def uninstall_triggers(args):
+    conn = psycopg2.connect(**CONN_PARAMS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DROP TRIGGER IF EXISTS trg_risk_stream_transactions ON Transactions;
+                DROP TRIGGER IF EXISTS trg_risk_stream_authlogs ON AuthLogs;
+                DROP TRIGGER IF EXISTS trg_risk_stream_device_links ON CustomerDeviceLinks;
+                DROP FUNCTION IF EXISTS notify_risk_event();
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+    print("Removed the risk stream NOTIFY triggers.")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate risk rules on a stream of transaction and auth events.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_sink_args(p):
+        p.add_argument('--tags-output', default=None, metavar='PATH', help="write emitted tags as JSONL ('-' for stdout)")
+        p.add_argument('--write-db', action='store_true', help="insert emitted tags into RiskTags")
+        p.add_argument('--report-every', type=float, default=REPORT_EVERY_SECONDS, help="seconds between progress lines")
+
+    replay_parser = sub.add_parser('replay', help="replay events from a JSONL file")
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="events per micro-batch")
+    replay_parser.add_argument('--load-devices', action='store_true',
+                               help="seed the device trust index from CustomerDeviceLinks instead of device_link events")
+    add_sink_args(replay_parser)
+    replay_parser.set_defaults(func=replay)
+
+    listen_parser = sub.add_parser('listen', help=f"consume events from LISTEN {STREAM_CHANNEL} (needs install-triggers)")
+    listen_parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    listen_parser.add_argument('--max-events', type=int, default=None, help="stop after this many events")
+    add_sink_args(listen_parser)
+    listen_parser.set_defaults(func=listen)
+
+    export_parser = sub.add_parser('export', help="export existing rows as a JSONL replay file")
+    export_parser.add_argument('--output', required=True)
+    export_parser.add_argument('--since', type=date.fromisoformat, default=None, metavar='YYYY-MM-DD')
+    export_parser.set_defaults(func=export_events)
+
+    sub.add_parser('install-triggers', help="install the NOTIFY triggers").set_defaults(func=install_triggers)
+    sub.add_parser('uninstall-triggers', help="remove the NOTIFY triggers").set_defaults(func=uninstall_triggers)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
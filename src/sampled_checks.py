@@ -0,0 +1,178 @@
+import math
+from typing import Any, Dict, List, Optional
+
+from data_quality_standards import (
+    STRONG_AUTH_METHODS_SQL,
+    DateWindow,
+    _window_filter,
+    null_check_result,
+    document_format_result,
+    high_value_txn_strong_auth_result,
+    untrusted_device_result,
+    daily_total_over_20m_result,
+)
+
+# Chế độ audit ước lượng: đếm vi phạm trên TABLESAMPLE SYSTEM(p) rồi ngoại suy kèm khoảng tin cậy.
+# SYSTEM chọn từng block dữ liệu độc lập với xác suất p, nên block (không phải dòng) là đơn vị mẫu.
+CONFIDENCE_Z = 1.96
+CONFIDENCE_LABEL = "95%"
+
+
+def estimate_total(block_sum: int, block_sum_sq: int, fraction: float) -> Dict[str, Any]:
+    """Horvitz-Thompson estimate of a total from Bernoulli-sampled blocks, with a normal-approximation interval.
+
+    Each block is kept with probability `fraction`, so total = sum / p and
+    Var = (1 - p) / p^2 * sum(v_i^2) over the sampled blocks. With no
+    violations in the sample, the upper bound uses the rule of three.
+    """
+    estimate = block_sum / fraction
+    if block_sum == 0:
+        return {"estimate": 0, "low": 0, "high": math.ceil(3 / fraction), "observed": 0}
+    stderr = math.sqrt((1 - fraction) * block_sum_sq) / fraction
+    return {
+        "estimate": int(round(estimate)),
+        "low": max(0, int(math.floor(estimate - CONFIDENCE_Z * stderr))),
+        "high": int(math.ceil(estimate + CONFIDENCE_Z * stderr)),
+        "observed": block_sum,
+    }
+
+
+def sample_block_counts(cur, table: str, expressions: List[str], percent: float, seed: Optional[int] = None,
+                        where_sql: str = "", params: tuple = (), expression_params: tuple = ()) -> Dict[str, Any]:
+    """Sums each integer expression per sampled block, then returns per expression (sum, sum of squares).
+
+    `expression_params` fill placeholders inside `expressions`, `params` those of `where_sql`.
+    """
+    repeatable = f" REPEATABLE ({int(seed)})" if seed is not None else ""
+    per_block = ", ".join(f"SUM({expression}) AS v{i}" for i, expression in enumerate(expressions))
+    totals = ", ".join(f"COALESCE(SUM(v{i}), 0), COALESCE(SUM(v{i} * v{i}), 0)" for i in range(len(expressions)))
+    # Block = (phân vùng, số trang trong ctid); các phân vùng có số trang trùng nhau nên cần tableoid
+    cur.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(sampled_rows), 0), {totals}
+        FROM (
+            SELECT t.tableoid, (t.ctid::text::point)[0] AS block, COUNT(*) AS sampled_rows, {per_block}
+            FROM {table} t TABLESAMPLE SYSTEM (%s){repeatable}
+            WHERE TRUE{where_sql}
+            GROUP BY 1, 2
+        ) blocks;
+    """, tuple(expression_params) + (percent,) + tuple(params))
+    row = cur.fetchone()
+    return {
+        "blocks": row[0],
+        "rows": int(row[1]),
+        # SUM(bigint) trả về numeric (Decimal)
+        "sums": [(int(row[2 + 2 * i]), int(row[3 + 2 * i])) for i in range(len(expressions))],
+    }
+
+
+def interval_crosses_zero(interval: Dict[str, Any]) -> bool:
+    """True when the sample saw violations but the interval still reaches zero.
+
+    A sample without violations is a PASS bounded above by the rule of three.
+    """
+    return interval["observed"] > 0 and interval["low"] <= 0
+
+
+def estimated_result(result: Dict[str, Any], interval: Dict[str, Any], percent: float, sample: Dict[str, Any]) -> Dict[str, Any]:
+    result["estimated"] = True
+    result["message"] += f" [estimated from {percent:g}% sample, {CONFIDENCE_LABEL} CI {interval['low']}-{interval['high']}]"
+    result["confidence_interval"] = [interval["low"], interval["high"]]
+    result["sample"] = {"percent": percent, "blocks": sample["blocks"], "rows": sample["rows"],
+                        "observed_violations": interval["observed"]}
+    # Mẫu có vi phạm nhưng khoảng vẫn chứa 0: chưa đủ để kết luận có vi phạm hay không
+    result["escalate"] = interval_crosses_zero(interval)
+    return result
+
+
+def sampled_null_values_batch(cur, table: str, columns: List[str], percent: float, seed: Optional[int] = None,
+                              window: DateWindow = None) -> Dict[str, Dict[str, Any]]:
+    window_sql, params = _window_filter(table, window, alias="t.")
+    sample = sample_block_counts(cur, table, [f"({column} IS NULL)::int" for column in columns],
+                                 percent, seed, window_sql, params)
+    results = {}
+    for column, (block_sum, block_sum_sq) in zip(columns, sample["sums"]):
+        interval = estimate_total(block_sum, block_sum_sq, percent / 100)
+        results[column] = estimated_result(null_check_result(table, column, interval["estimate"]), interval, percent, sample)
+    return results
+
+
+def sampled_document_format(cur, percent: float, seed: Optional[int] = None) -> Dict[str, Any]:
+    invalid = r"""(
+        (t.document_type = 'CCCD' AND t.document_number !~ '^\d{12}$') OR
+        (t.document_type = 'Passport' AND t.document_number !~ '^[A-Z]\d{7}$')
+    )::int"""
+    sample = sample_block_counts(cur, 'customeridentitydocuments', [invalid], percent, seed)
+    interval = estimate_total(*sample["sums"][0], percent / 100)
+    return estimated_result(document_format_result(interval["estimate"]), interval, percent, sample)
+
+
+def sampled_high_value_txn_strong_auth(cur, percent: float, seed: Optional[int] = None,
+                                       window: DateWindow = None) -> Dict[str, Any]:
+    window_sql, params = _window_filter('transactions', window, alias="t.")
+    # Chỉ Transactions được lấy mẫu; việc tra AuthLogs vẫn chính xác (qua index idx_authlogs_strong_success_txn)
+    violation = f"""(
+        t.amount > 10000000 AND t.status = 'completed'
+        AND NOT EXISTS (
+            SELECT 1 FROM AuthLogs al
+            WHERE al.transaction_id = t.transaction_id
+              AND al.result = 'success'
+              AND al.auth_method IN {STRONG_AUTH_METHODS_SQL}
+        )
+    )::int"""
+    sample = sample_block_counts(cur, 'transactions', [violation], percent, seed, window_sql, params)
+    interval = estimate_total(*sample["sums"][0], percent / 100)
+    return estimated_result(high_value_txn_strong_auth_result(interval["estimate"]), interval, percent, sample)
+
+
+def sampled_untrusted_device_transactions(cur, percent: float, seed: Optional[int] = None,
+                                          window: DateWindow = None) -> Dict[str, Any]:
+    window_sql, params = _window_filter('transactions', window, alias="t.")
+    # EXISTS đếm mỗi giao dịch một lần, kể cả khi liên kết (customer_id, device_id) bị trùng
+    untrusted = """EXISTS (
+        SELECT 1
+        FROM Accounts a
+        JOIN CustomerDeviceLinks cdl ON cdl.customer_id = a.customer_id
+        WHERE a.account_id = t.source_account_id
+          AND cdl.device_id = t.device_id
+          AND cdl.trust_status = 'unverified'
+    )"""
+    sample = sample_block_counts(
+        cur, 'transactions', [f"({untrusted})::int", f"({untrusted} AND t.status = 'completed')::int"],
+        percent, seed, window_sql, params,
+    )
+    interval = estimate_total(*sample["sums"][0], percent / 100)
+    successful = estimate_total(*sample["sums"][1], percent / 100)
+    result = untrusted_device_result(interval["estimate"], successful["estimate"])
+    return estimated_result(result, interval, percent, sample)
+
+
+def sampled_daily_total_over_20m_auth(cur, percent: float, seed: Optional[int] = None,
+                                      window: DateWindow = None) -> Dict[str, Any]:
+    """Samples customers (a customer's days cannot be split) and counts their violating days exactly from the rollup."""
+    window_sql, params = (" AND d.spend_date >= %s AND d.spend_date < %s", tuple(window)) if window else ("", ())
+    violating_days = f"""(
+        SELECT COUNT(*)
+        FROM (
+            SELECT d.spend_date
+            FROM daily_customer_spend d
+            WHERE d.customer_id = t.customer_id{window_sql}
+            GROUP BY d.spend_date
+            HAVING SUM(d.total_amount) > 20000000 AND NOT bool_or(d.has_strong_auth)
+        ) days
+    )"""
+    sample = sample_block_counts(cur, 'customers', [violating_days], percent, seed, expression_params=params)
+    interval = estimate_total(*sample["sums"][0], percent / 100)
+    return estimated_result(daily_total_over_20m_result(interval["estimate"]), interval, percent, sample)
+
+
+# Risk check -> phiên bản lấy mẫu
+SAMPLED_RISK_CHECKS = {
+    "risk_high_value_txn_strong_auth": sampled_high_value_txn_strong_auth,
+    "risk_untrusted_device_transactions": sampled_untrusted_device_transactions,
+    "risk_daily_total_over_20m_auth": sampled_daily_total_over_20m_auth,
+}
+
+
+def checks_to_escalate(results: List[Dict[str, Any]]) -> List[str]:
+    """Estimated checks that saw violations but whose interval includes zero: the sample cannot tell whether they are real."""
+    return [r["check_name"] for r in results if r.get("estimated") and r.get("escalate")]
@@ -0,0 +1,111 @@
+import hashlib
+import math
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from faker import Faker
+
+# Nguồn giá trị giả lập cho generate_data.py.
+# - Tên, địa chỉ, username: sinh bằng Faker một lần thành pool cố định rồi lấy mẫu theo lô.
+# - Giá trị UNIQUE (điện thoại, số tài khoản, CCCD/hộ chiếu): hoán vị affine của ID,
+#   không cần tập đã dùng nên chi phí mỗi dòng không đổi dù có 100M khách hàng.
+
+NAME_POOL_SIZE = 5000
+ADDRESS_POOL_SIZE = 5000
+USER_NAME_POOL_SIZE = 5000
+# Pool chỉ là "từ vựng", dùng seed cố định để mọi shard có cùng pool; phần lấy mẫu theo seed của shard
+POOL_SEED = 20250801
+
+NAME_PREFIXES = ('Quý ông ', 'Quý cô ', 'Quý bà ', 'Anh ', 'Chị ', 'Cô ', 'Bác ', 'Ông ', 'Bà ')
+MOBILE_PREFIXES = "35789"
+
+# Không gian giá trị và tham số hoán vị i -> (a * i + b) mod n (a nguyên tố cùng nhau với n)
+PERMUTATIONS = {
+    'phone': {'space': len(MOBILE_PREFIXES) * 10**8, 'multiplier': 387_420_489, 'offset': 91_234_567},
+    'account': {'space': 10**10, 'multiplier': 7_919_000_003, 'offset': 1_234_567_891},
+    'cccd': {'space': 10**9, 'multiplier': 738_292_201, 'offset': 12_345_679},
+    'passport': {'space': 26 * 10**7, 'multiplier': 179_424_673, 'offset': 4_999_999},
+}
+
+for _name, _spec in PERMUTATIONS.items():
+    assert math.gcd(_spec['multiplier'], _spec['space']) == 1, f"{_name} multiplier is not a bijection"
+
+_POOLS: Dict[str, List[Any]] = {}
+
+
+def permute(kind: str, index: int) -> int:
+    """Bijective scramble of `index` within the value space of `kind`: distinct indexes never collide."""
+    spec = PERMUTATIONS[kind]
+    if not 0 <= index < spec['space']:
+        raise ValueError(f"{kind} index {index} is outside its value space of {spec['space']:,}")
+    return (index * spec['multiplier'] + spec['offset']) % spec['space']
+
+
+def _clean_name(full_name: str) -> str:
+    for prefix in NAME_PREFIXES:
+        if full_name.startswith(prefix):
+            full_name = full_name[len(prefix):]
+    return full_name.strip()
+
+
+def get_pools() -> Dict[str, List[Any]]:
+    """Builds the Faker-backed pools on first use (once per process)."""
+    if not _POOLS:
+        fake = Faker('vi_VN')
+        fake.seed_instance(POOL_SEED)
+        _POOLS['names'] = [_clean_name(fake.name()) for _ in range(NAME_POOL_SIZE)]
+        _POOLS['addresses'] = [fake.address() for _ in range(ADDRESS_POOL_SIZE)]
+        _POOLS['user_names'] = [fake.user_name() for _ in range(USER_NAME_POOL_SIZE)]
+        _POOLS['email_domains'] = sorted({fake.free_email_domain() for _ in range(200)})
+    return _POOLS
+
+
+def sample_names(count: int) -> List[str]:
+    return random.choices(get_pools()['names'], k=count)
+
+
+def sample_addresses(count: int) -> List[str]:
+    return random.choices(get_pools()['addresses'], k=count)
+
+
+def random_date(start: date, end: date) -> date:
+    """Uniform date in [start, end]."""
+    return start + timedelta(days=random.randint(0, (end - start).days))
+
+
+def sample_dates(start: date, end: date, count: int) -> List[date]:
+    return [random_date(start, end) for _ in range(count)]
+
+
+def sample_birth_dates(today: date, count: int, minimum_age: int = 18, maximum_age: int = 70) -> List[date]:
+    return sample_dates(today - timedelta(days=365 * (maximum_age + 1) - 1),
+                        today - timedelta(days=365 * minimum_age), count)
+
+
+def secret_hash() -> str:
+    # Băm của một bí mật ngẫu nhiên, thay cho việc sinh mật khẩu bằng Faker rồi băm
+    return hashlib.sha256(random.getrandbits(96).to_bytes(12, 'big')).hexdigest()
+
+
+def phone_number_for(customer_id: int) -> str:
+    value = permute('phone', customer_id)
+    return f"+84{MOBILE_PREFIXES[value // 10**8]}{value % 10**8:08d}"
+
+
+def email_for(customer_id: int) -> str:
+    pools = get_pools()
+    # Hậu tố là customer_id nên email không trùng dù username lặp lại
+    return f"{random.choice(pools['user_names'])}.{customer_id}@{random.choice(pools['email_domains'])}"
+
+
+def account_number_for(account_id: int) -> str:
+    return f"102{permute('account', account_id):010d}"
+
+
+def document_number_for(customer_id: int, doc_type: str) -> str:
+    if doc_type == 'CCCD':
+        # Mã tỉnh ngẫu nhiên + 9 chữ số hoán vị từ ID: vẫn duy nhất vì phần sau đã duy nhất
+        return f"{random.randint(1, 96):03d}{permute('cccd', customer_id):09d}"
+    value = permute('passport', customer_id)
+    return f"{chr(ord('A') + value // 10**7)}{value % 10**7:07d}"
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Cùng phân phối với vòng lặp trong generate_data.iter_transaction_rows
+STATUSES = np.array(['completed', 'pending', 'failed'], dtype=object)
+STATUS_WEIGHTS = [0.90, 0.05, 0.05]
+TRANSACTION_TYPES = np.array(['P2P_TRANSFER', 'BILL_PAYMENT'], dtype=object)
+P2P_SHARE = 0.8
+UNVERIFIED_DEVICE_RATE = 0.02
+UNVERIFIED_COMPLETED_SHARE = 0.4
+DESTINATION_RATE = 0.8
+
+HIGH_TIER_RATE = 0.02
+MID_TIER_RATE = 0.10
+CATEGORY_D_THRESHOLD = 1_500_000_000
+CATEGORY_C_THRESHOLD = 10_000_000
+
+CustomerDevices = Callable[[int], Tuple[List[int], Optional[int]]]
+
+
+def _synthesise_batch(batch, all_active_account_ids: np.ndarray, first_txn_id: int,
+                      txn_per_account: Tuple[int, int], window_start: np.datetime64,
+                      window_us: int, rng: np.random.Generator) -> Tuple[int, Iterator[tuple]]:
+    account_ids, limits, device_offsets, device_counts, unverified = [], [], [], [], []
+    verified_flat: List[int] = []
+    for account_list, limit, verified_devices, unverified_device in batch:
+        offset = len(verified_flat)
+        verified_flat.extend(verified_devices)
+        for account_id in account_list:
+            account_ids.append(account_id)
+            limits.append(limit)
+            device_offsets.append(offset)
+            device_counts.append(len(verified_devices))
+            unverified.append(unverified_device if unverified_device is not None else -1)
+
+    min_txn, max_txn = txn_per_account
+    per_account = rng.integers(min_txn, max_txn + 1, size=len(account_ids))
+    # Chỉ số tài khoản cho từng dòng giao dịch, giữ thứ tự theo tài khoản như vòng lặp gốc
+    row_account = np.repeat(np.arange(len(account_ids)), per_account)
+    n = row_account.size
+
+    limit = np.asarray(limits, dtype=np.float64)[row_account]
+    amount = rng.uniform(50000, limit * 0.5)
+    tier = rng.random(n)
+    amount = np.where(tier < HIGH_TIER_RATE, rng.uniform(1_500_000_001, 2_000_000_000, n),
+                      np.where(tier < MID_TIER_RATE, rng.uniform(10_000_001, 1_500_000_000, n), amount))
+
+    status = STATUSES[rng.choice(len(STATUSES), size=n, p=STATUS_WEIGHTS)]
+    category = np.where(amount > CATEGORY_D_THRESHOLD, 'D', np.where(amount > CATEGORY_C_THRESHOLD, 'C', 'B')).astype(object)
+
+    offsets = np.asarray(device_offsets, dtype=np.int64)[row_account]
+    counts = np.asarray(device_counts, dtype=np.int64)[row_account]
+    device = np.asarray(verified_flat, dtype=np.int64)[offsets + (rng.random(n) * counts).astype(np.int64)]
+    unverified_device = np.asarray(unverified, dtype=np.int64)[row_account]
+    use_unverified = (unverified_device >= 0) & (rng.random(n) < UNVERIFIED_DEVICE_RATE)
+    device = np.where(use_unverified, unverified_device, device)
+    status = np.where(use_unverified,
+                      np.where(rng.random(n) < UNVERIFIED_COMPLETED_SHARE, 'completed', 'failed').astype(object),
+                      status)
+
+    destination = all_active_account_ids[rng.integers(0, all_active_account_ids.size, n)].astype(object)
+    destination[rng.random(n) >= DESTINATION_RATE] = None
+    transaction_type = np.where(rng.random(n) < P2P_SHARE, TRANSACTION_TYPES[0], TRANSACTION_TYPES[1]).astype(object)
+    created_at = window_start + rng.integers(0, window_us, n).astype('timedelta64[us]')
+
+    return n, zip(
+        range(first_txn_id, first_txn_id + n),
+        np.asarray(account_ids, dtype=np.int64)[row_account].tolist(),
+        destination.tolist(),
+        device.tolist(),
+        transaction_type.tolist(),
+        amount.tolist(),
+        status.tolist(),
+        category.tolist(),
+        created_at.tolist(),
+    )
+
+
+def iter_transaction_rows_numpy(customer_accounts_map: Dict[int, Sequence[int]], limits: Dict[int, Dict[str, float]],
+                                customer_devices: CustomerDevices, first_txn_id: int,
+                                txn_per_account: Tuple[int, int], days: int, as_of: datetime,
+                                seed: Optional[int] = None, batch_rows: int = 50000) -> Iterator[tuple]:
+    """Vectorised counterpart of generate_data.iter_transaction_rows.
+
+    Accounts are grouped into batches of roughly `batch_rows` transactions and
+    every column of a batch is drawn with one NumPy call. Rows are yielded in
+    the same column order and with the same ID sequence as the Python engine.
+    """
+    rng = np.random.default_rng(seed)
+    all_active_account_ids = np.fromiter(
+        (aid for account_ids in customer_accounts_map.values() for aid in account_ids), dtype=np.int64
+    )
+    window_start = np.datetime64(as_of - timedelta(days=days), 'us')
+    window_us = max(int(days * 86400 * 1_000_000), 1)
+    max_txn = txn_per_account[1]
+
+    txn_id = first_txn_id
+    batch, batch_accounts = [], 0
+    for customer_id, account_ids in customer_accounts_map.items():
+        verified_devices, unverified_device = customer_devices(customer_id)
+        if not verified_devices:
+            continue
+        limit = float(limits.get(customer_id, {}).get('PER_TRANSACTION', 100000000.0))
+        batch.append((account_ids, limit, verified_devices, unverified_device))
+        batch_accounts += len(account_ids)
+
+        if batch_accounts * max_txn >= batch_rows:
+            count, rows = _synthesise_batch(batch, all_active_account_ids, txn_id, txn_per_account, window_start, window_us, rng)
+            yield from rows
+            txn_id += count
+            batch, batch_accounts = [], 0
+
+    if batch:
+        _, rows = _synthesise_batch(batch, all_active_account_ids, txn_id, txn_per_account, window_start, window_us, rng)
+        yield from rows
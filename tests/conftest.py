@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Các module trong src/ được import theo tên phẳng (giống khi chạy `python src/...`)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
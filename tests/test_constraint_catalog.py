@@ -0,0 +1,48 @@
+from constraint_catalog import constraint_enforced_result, enforced_constraints
+
+
+class CatalogCursor:
+    """Returns the queued catalog rows in query order: NOT NULL, unique, foreign keys."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+def test_only_configured_checks_backed_by_a_constraint_are_enforced():
+    cur = CatalogCursor(
+        [('customers', 'customer_id'), ('customers', 'email'), ('accounts', 'customer_id')],
+        [('customers', 'customer_id', 'PRIMARY KEY customers_pkey'), ('customers', 'phone', 'unique index ix_phone')],
+        [('accounts', 'customer_id', 'customers', 'customer_id', 'FOREIGN KEY accounts_customer_id_fkey'),
+         ('accounts', 'branch_id', 'branches', 'branch_id', 'FOREIGN KEY accounts_branch_id_fkey')],
+    )
+    enforced = enforced_constraints(
+        cur,
+        not_null_checks={'customers': ['email', 'full_name']},
+        unique_checks={'customers': ['customer_id', 'email']},
+        fk_checks=[
+            {'table': 'accounts', 'fk_column': 'customer_id', 'parent_table': 'customers', 'pk_column': 'customer_id'},
+            {'table': 'transactions', 'fk_column': 'account_id', 'parent_table': 'accounts', 'pk_column': 'account_id'},
+        ],
+    )
+    assert enforced == {
+        "null": {('customers', 'email'): 'NOT NULL'},
+        "unique": {('customers', 'customer_id'): 'PRIMARY KEY customers_pkey'},
+        "fk": {('accounts', 'customer_id', 'customers', 'customer_id'): 'FOREIGN KEY accounts_customer_id_fkey'},
+    }
+    # NOT NULL được đọc cho cả bảng có check unique (unique chỉ tin được khi cột NOT NULL)
+    assert cur.queries[0][1] == (['customers'],)
+    assert sorted(cur.queries[2][1][0]) == ['accounts', 'transactions']
+
+
+def test_enforced_result_passes_without_scanning():
+    result = constraint_enforced_result("Column customers.email", "NOT NULL")
+    assert result["status"] == "PASS"
+    assert result["constraint_enforced"] == "NOT NULL"
+    assert "not scanned" in result["message"]
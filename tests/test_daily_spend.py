@@ -0,0 +1,35 @@
+from daily_spend import daily_spend_is_stale
+
+FINGERPRINT = {'accounts': [10, 0, 0, '16390'], 'authlogs': [40, 0, 0, '16420'], 'transactions': [30, 2, 0, '16410']}
+
+
+class FakeCursor:
+    """Trả về trạng thái đã lưu, rồi dấu vân tay hiện tại của các bảng nguồn."""
+
+    def __init__(self, stored, current):
+        self.stored = stored
+        self.current = current
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return None if self.stored is None else (self.stored,)
+
+    def fetchall(self):
+        return [(name, *values) for name, values in self.current.items()]
+
+
+def test_never_refreshed_view_is_stale():
+    assert daily_spend_is_stale(FakeCursor(None, FINGERPRINT))
+
+
+def test_unchanged_sources_are_fresh():
+    assert not daily_spend_is_stale(FakeCursor(FINGERPRINT, FINGERPRINT))
+
+
+def test_late_auth_log_or_status_update_makes_view_stale():
+    late_auth_log = dict(FINGERPRINT, authlogs=[41, 0, 0, '16420'])
+    assert daily_spend_is_stale(FakeCursor(FINGERPRINT, late_auth_log))
+    status_update = dict(FINGERPRINT, transactions=[30, 3, 0, '16410'])
+    assert daily_spend_is_stale(FakeCursor(FINGERPRINT, status_update))
@@ -0,0 +1,21 @@
+from data_quality_standards import NOT_NULL_CHECKS, UNIQUE_CHECKS
+from monitoring_audit import plan_column_checks
+
+
+def test_plan_batches_columns_per_table_and_kind():
+    plan = plan_column_checks({'customers': ['email', 'status']}, {'customers': ['phone_number', 'email']})
+    assert plan == [
+        {"kind": "null", "table": "customers", "columns": ['email', 'status'],
+         "check_names": ['check_null_customers_email', 'check_null_customers_status']},
+        {"kind": "unique", "table": "customers", "columns": ['phone_number', 'email'],
+         "check_names": ['check_unique_customers_phone_number', 'check_unique_customers_email']},
+    ]
+
+
+def test_plan_covers_every_configured_check_once():
+    plan = plan_column_checks(NOT_NULL_CHECKS, UNIQUE_CHECKS)
+    assert len(plan) == len(NOT_NULL_CHECKS) + len(UNIQUE_CHECKS)
+    names = [name for planned in plan for name in planned["check_names"]]
+    expected = sum(len(c) for c in NOT_NULL_CHECKS.values()) + sum(len(c) for c in UNIQUE_CHECKS.values())
+    assert len(names) == len(set(names)) == expected
+
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from pandas_checks import check_null_values_batch, check_uniqueness, check_untrusted_device_transactions, compare_results
+
+CUSTOMERS = pd.DataFrame({
+    'customer_id': [3, 1, 2, 4],
+    'email': ['a@x.vn', None, 'a@x.vn', None],
+    'phone_number': ['+84300000001', '+84300000002', '+84300000003', '+84300000004'],
+})
+
+
+def read(table, columns):
+    assert table == 'customers'
+    return CUSTOMERS[columns]
+
+
+def test_null_counts_and_samples_match_sql_shape():
+    results = check_null_values_batch(read, 'customers', ['email', 'phone_number'])
+    assert results['phone_number'] == {"status": "PASS", "message": "[customers.phone_number] No NULL values found."}
+    assert results['email']['failed_count'] == 2
+    assert results['email']['failed_records'] == [1, 4]
+
+
+def test_uniqueness_counts_nulls_as_one_group_like_group_by():
+    result = check_uniqueness(read, 'customers', 'email')
+    assert result['failed_count'] == 2
+    assert check_uniqueness(read, 'customers', 'phone_number')['status'] == 'PASS'
+
+
+def test_parity_ignores_samples_and_timings():
+    sql = [{'check_name': 'a', 'status': 'FAIL', 'message': 'm', 'failed_count': 2, 'failed_records': [1, 2],
+            'duration_seconds': 1.5}]
+    pandas = [{'check_name': 'a', 'status': 'FAIL', 'message': 'm', 'failed_count': 2, 'failed_records': [2, 1],
+               'duration_seconds': 0.1}]
+    assert compare_results(sql, pandas) == []
+
+
+def test_parity_reports_differences_and_missing_checks():
+    sql = [{'check_name': 'a', 'status': 'FAIL', 'message': 'm', 'failed_count': 2},
+           {'check_name': 'b', 'status': 'PASS', 'message': 'ok'}]
+    pandas = [{'check_name': 'a', 'status': 'FAIL', 'message': 'm', 'failed_count': 3},
+              {'check_name': 'c', 'status': 'PASS', 'message': 'ok'}]
+    assert compare_results(sql, pandas) == [
+        {'check_name': 'a', 'field': 'failed_count', 'sql': 2, 'pandas': 3},
+        {'check_name': 'b', 'field': 'missing', 'sql': 'present', 'pandas': None},
+        {'check_name': 'c', 'field': 'missing', 'sql': None, 'pandas': 'present'},
+    ]
+
+
+def test_duplicate_device_links_do_not_multiply_untrusted_transactions():
+    tables = {
+        'transactions': pd.DataFrame({'transaction_id': [10, 11, 12], 'source_account_id': [1, 1, 1],
+                                      'device_id': [7, 7, 8], 'status': ['completed', 'failed', 'completed']}),
+        'accounts': pd.DataFrame({'account_id': [1], 'customer_id': [5]}),
+        # Liên kết (5, 7) bị trùng khi khoá chính không được áp dụng
+        'customerdevicelinks': pd.DataFrame({'customer_id': [5, 5, 5], 'device_id': [7, 7, 8],
+                                             'trust_status': ['unverified', 'unverified', 'verified']}),
+    }
+    result = check_untrusted_device_transactions(lambda table, columns: tables[table][columns])
+    assert result['failed_count'] == 2
+    assert sorted(result['failed_records']) == [10, 11]
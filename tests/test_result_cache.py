@@ -0,0 +1,28 @@
+import json
+
+from result_cache import task_fingerprint
+
+
+def test_fingerprint_depends_only_on_the_task_sources():
+    fingerprints = {'accounts': [10, 0, 0, '16390'], 'customers': [5, 1, 0, '16384'], 'devices': [3, 0, 0, '16400']}
+    fingerprint = task_fingerprint(fingerprints, ['customers', 'accounts'])
+    assert fingerprint == {'accounts': [10, 0, 0, '16390'], 'customers': [5, 1, 0, '16384']}
+    # Kết quả cache được lưu dưới dạng JSONB: dấu vân tay đọc lại phải bằng dấu vân tay tính mới
+    assert json.loads(json.dumps(fingerprint)) == task_fingerprint(fingerprints, ['accounts', 'customers'])
+
+    fingerprints['devices'] = [4, 0, 0, '16400']
+    assert task_fingerprint(fingerprints, ['customers', 'accounts']) == fingerprint
+    fingerprints['customers'] = [5, 1, 0, '16500']
+    assert task_fingerprint(fingerprints, ['customers', 'accounts']) != fingerprint
+
+
+def test_fingerprint_of_an_unknown_table_never_matches_a_stored_one():
+    assert task_fingerprint({}, ['customers']) == {'customers': None}
+
+
+def test_daily_total_check_is_keyed_on_the_view_sources_too():
+    from daily_spend import DAILY_SPEND_SOURCES, DAILY_SPEND_VIEW
+    from data_quality_standards import CHECK_SOURCE_TABLES
+
+    sources = CHECK_SOURCE_TABLES['risk_daily_total_over_20m_auth']
+    assert set(sources) == {DAILY_SPEND_VIEW, *DAILY_SPEND_SOURCES}
@@ -0,0 +1,68 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from risk_rules import (
+    TAG_MULTIPLE_FAILED_AUTHENTICATIONS,
+    TAG_NEW_DEVICE_SUCCESSFUL_TRANSACTION,
+    TAG_UNUSUAL_TRANSACTION_TIME,
+    TAG_UNVERIFIED_DEVICE,
+    add_to_daily_totals,
+    auth_log_rows,
+    daily_limit_tracker_rows,
+    failed_auth_risk_tags,
+    transaction_risk_tags,
+    transaction_type_group,
+)
+
+NOON = datetime(2025, 8, 1, 12, 0)
+
+
+def test_transaction_tags():
+    assert transaction_risk_tags(False, 'completed', NOON) == []
+    assert transaction_risk_tags(True, 'failed', NOON) == [TAG_UNVERIFIED_DEVICE]
+    assert transaction_risk_tags(True, 'completed', NOON) == [TAG_UNVERIFIED_DEVICE, TAG_NEW_DEVICE_SUCCESSFUL_TRANSACTION]
+
+
+def test_unusual_hours_use_business_time_zone():
+    assert transaction_risk_tags(False, 'completed', datetime(2025, 8, 1, 5, 59)) == [TAG_UNUSUAL_TRANSACTION_TIME]
+    assert transaction_risk_tags(False, 'completed', datetime(2025, 8, 1, 6, 0)) == []
+    # 20:00 UTC là 03:00 giờ Việt Nam
+    utc_evening = datetime(2025, 8, 1, 20, 0, tzinfo=timezone.utc)
+    assert transaction_risk_tags(False, 'completed', utc_evening) == [TAG_UNUSUAL_TRANSACTION_TIME]
+
+
+def test_failed_auth_threshold():
+    assert failed_auth_risk_tags(2) == []
+    assert failed_auth_risk_tags(3) == [TAG_MULTIPLE_FAILED_AUTHENTICATIONS]
+
+
+def test_auth_log_rows_per_category():
+    rng = random.Random(1)
+    rows = auth_log_rows(1, 2, 3, 'completed', 'A', NOON, rng)
+    assert len(rows) == 1 and rows[0][3] in ('sms_otp', 'device_biometric') and rows[0][4] == 'success'
+    assert [r[3] for r in auth_log_rows(1, 2, 3, 'failed', 'C', NOON, rng)] == ['biometric_faceid']
+    rows = auth_log_rows(1, 2, 3, 'failed', 'D', NOON, rng)
+    assert [(r[3], r[4], r[5]) for r in rows] == [
+        ('biometric_faceid', 'failure', NOON + timedelta(seconds=2)),
+        ('soft_otp', 'failure', NOON + timedelta(seconds=4)),
+    ]
+    assert auth_log_rows(1, 2, 3, 'completed', None, NOON, rng) == []
+
+
+def test_daily_totals_reset_after_strong_auth():
+    totals = {}
+    add_to_daily_totals(totals, 1, NOON, 'P2P_TRANSFER', 100.005, 'A')
+    add_to_daily_totals(totals, 1, NOON, 'P2P_TRANSFER', 200, 'C')
+    add_to_daily_totals(totals, 1, NOON, 'P2P_TRANSFER', 50, 'B')
+    add_to_daily_totals(totals, 1, NOON, 'BILL_PAYMENT', 10, 'A')
+    assert sorted(daily_limit_tracker_rows(totals)) == [
+        (1, 'NHOM_I.2', 10.0, 10.0, NOON.date()),
+        (1, 'NHOM_I.3', 350.0, 50.0, NOON.date()),
+    ]
+
+
+def test_daily_totals_group_by_business_day():
+    totals = {}
+    # 18:00 UTC ngày 1 đã là ngày 2 theo giờ Việt Nam
+    add_to_daily_totals(totals, 1, datetime(2025, 8, 1, 18, 0, tzinfo=timezone.utc), 'QR_PAYMENT', 5, 'A')
+    assert list(totals) == [(1, datetime(2025, 8, 2).date(), transaction_type_group('QR_PAYMENT'))]
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from risk_rules import (
+    FAILED_AUTH_THRESHOLD,
+    TAG_MULTIPLE_FAILED_AUTHENTICATIONS,
+    TAG_NEW_DEVICE_SUCCESSFUL_TRANSACTION,
+    TAG_UNVERIFIED_DEVICE,
+)
+from risk_stream import AUTH_COUNTER_TTL, handle_event, new_stream_state
+
+NOON = datetime(2025, 8, 1, 12, 0)
+
+
+def link(customer_id, device_id, trust_status):
+    return {'type': 'device_link', 'customer_id': customer_id, 'device_id': device_id, 'trust_status': trust_status}
+
+
+def transaction(txn_id, created_at, device_id=7, status='completed', amount='100.00', category='A'):
+    return {'type': 'transaction', 'customer_id': 1, 'device_id': device_id, 'transaction_id': txn_id,
+            'status': status, 'transaction_type': 'P2P_TRANSFER', 'amount': amount,
+            'regulation_category': category, 'created_at': created_at}
+
+
+def failed_auth(txn_id, created_at):
+    return {'type': 'auth', 'customer_id': 1, 'transaction_id': txn_id, 'result': 'failure', 'created_at': created_at}
+
+
+def tag_types(tags):
+    return [tag['tag_type'] for tag in tags]
+
+
+def test_device_link_changes_drive_unverified_device_tags():
+    state = new_stream_state()
+    handle_event(state, link(1, 7, 'unverified'))
+    assert tag_types(handle_event(state, transaction(1, NOON))) == [TAG_UNVERIFIED_DEVICE, TAG_NEW_DEVICE_SUCCESSFUL_TRANSACTION]
+    handle_event(state, link(1, 7, 'verified'))
+    assert state['unverified_devices'] == {}
+    assert handle_event(state, transaction(2, NOON)) == []
+
+
+def test_failed_auth_tag_is_emitted_once_at_the_threshold():
+    state = new_stream_state()
+    tags = [handle_event(state, failed_auth(5, NOON + timedelta(seconds=i))) for i in range(FAILED_AUTH_THRESHOLD + 2)]
+    assert [tag_types(t) for t in tags] == [[]] * (FAILED_AUTH_THRESHOLD - 1) + [[TAG_MULTIPLE_FAILED_AUTHENTICATIONS], [], []]
+    assert tags[FAILED_AUTH_THRESHOLD - 1][0]['transaction_id'] == 5
+
+
+def test_successful_auth_and_auth_without_transaction_are_ignored():
+    state = new_stream_state()
+    assert handle_event(state, dict(failed_auth(5, NOON), result='success')) == []
+    assert handle_event(state, dict(failed_auth(None, NOON))) == []
+    assert not state['failed_auths']
+
+
+def test_watermark_evicts_old_failed_auth_counters_and_daily_totals():
+    state = new_stream_state()
+    handle_event(state, transaction(1, NOON))
+    handle_event(state, failed_auth(1, NOON))
+    handle_event(state, failed_auth(2, NOON + AUTH_COUNTER_TTL))
+    assert list(state['failed_auths']) == [1, 2]
+    handle_event(state, failed_auth(3, NOON + AUTH_COUNTER_TTL + timedelta(seconds=1)))
+    assert list(state['failed_auths']) == [2, 3]
+
+    handle_event(state, transaction(4, NOON + timedelta(days=1)))
+    assert len(state['daily_totals']) == 2
+    handle_event(state, transaction(5, NOON + timedelta(days=2)))
+    assert sorted(key[1] for key in state['daily_totals']) == [(NOON + timedelta(days=1)).date(), (NOON + timedelta(days=2)).date()]
+
+
+def test_daily_totals_reset_after_strong_auth_and_skip_failed_transactions():
+    state = new_stream_state()
+    handle_event(state, transaction(1, NOON, amount='100.00'))
+    handle_event(state, transaction(2, NOON, amount='500.00', status='failed'))
+    handle_event(state, transaction(3, NOON, amount='40.00', category='C'))
+    handle_event(state, transaction(4, NOON.isoformat(), amount='10.00'))
+    assert state['daily_totals'] == {(1, NOON.date(), 'NHOM_I.3'): {'T': 150.0, 'Tksth': 10.0}}
+
+
+def test_unknown_event_type_raises():
+    with pytest.raises(ValueError):
+        handle_event(new_stream_state(), {'type': 'login', 'created_at': NOON})
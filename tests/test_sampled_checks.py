@@ -0,0 +1,39 @@
+import math
+
+from sampled_checks import checks_to_escalate, estimate_total, estimated_result, interval_crosses_zero
+
+
+def test_zero_sample_is_bounded_by_rule_of_three():
+    interval = estimate_total(0, 0, 0.01)
+    assert interval == {"estimate": 0, "low": 0, "high": math.ceil(3 / 0.01), "observed": 0}
+    assert not interval_crosses_zero(interval)
+
+
+def test_estimate_scales_by_sampling_fraction():
+    interval = estimate_total(50, 50, 0.1)
+    assert interval["estimate"] == 500
+    assert interval["observed"] == 50
+    stderr = math.sqrt(0.9 * 50) / 0.1
+    assert interval["low"] == math.floor(500 - 1.96 * stderr)
+    assert interval["high"] == math.ceil(500 + 1.96 * stderr)
+    assert not interval_crosses_zero(interval)
+
+
+def test_full_sample_has_no_variance():
+    assert estimate_total(7, 49, 1.0) == {"estimate": 7, "low": 7, "high": 7, "observed": 7}
+
+
+def test_few_clustered_violations_cross_zero():
+    # Một block chứa cả 3 vi phạm: phương sai lớn, cận dưới chạm 0
+    interval = estimate_total(3, 9, 0.01)
+    assert interval["low"] == 0
+    assert interval_crosses_zero(interval)
+
+
+def test_only_uncertain_estimated_checks_escalate():
+    sample = {"blocks": 10, "rows": 1000}
+    clean = estimated_result({"check_name": "clean", "message": "x"}, estimate_total(0, 0, 0.01), 1, sample)
+    unsure = estimated_result({"check_name": "unsure", "message": "x"}, estimate_total(3, 9, 0.01), 1, sample)
+    exact = {"check_name": "exact", "message": "x", "escalate": True}
+    assert clean["confidence_interval"] == [0, 300]
+    assert checks_to_escalate([clean, unsure, exact]) == ["unsure"]
@@ -0,0 +1,35 @@
+import re
+
+import pytest
+
+from value_pools import PERMUTATIONS, account_number_for, document_number_for, permute, phone_number_for
+
+
+@pytest.mark.parametrize("kind", sorted(PERMUTATIONS))
+def test_permute_is_injective_and_in_range(kind):
+    space = PERMUTATIONS[kind]['space']
+    indexes = list(range(10_000)) + list(range(space - 1_000, space))
+    values = [permute(kind, i) for i in indexes]
+    assert len(set(values)) == len(values)
+    assert all(0 <= v < space for v in values)
+
+
+@pytest.mark.parametrize("kind", sorted(PERMUTATIONS))
+def test_permute_rejects_indexes_outside_the_space(kind):
+    with pytest.raises(ValueError):
+        permute(kind, PERMUTATIONS[kind]['space'])
+    with pytest.raises(ValueError):
+        permute(kind, -1)
+
+
+def test_value_formats():
+    assert re.fullmatch(r"\+84[35789]\d{8}", phone_number_for(42))
+    assert re.fullmatch(r"102\d{10}", account_number_for(42))
+    assert re.fullmatch(r"\d{12}", document_number_for(42, 'CCCD'))
+    assert re.fullmatch(r"[A-Z]\d{7}", document_number_for(42, 'Passport'))
+
+
+def test_values_follow_ids_without_collisions():
+    assert len({phone_number_for(i) for i in range(1, 5_001)}) == 5_000
+    assert len({account_number_for(i) for i in range(1, 5_001)}) == 5_000
+    assert len({document_number_for(i, 'Passport') for i in range(1, 5_001)}) == 5_000